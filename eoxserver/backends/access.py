@@ -31,8 +31,10 @@ from os import makedirs, path
 import hashlib
 import logging
 
-from eoxserver.backends.cache import get_cache_context
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.backends.cache import get_cache_context, get_persistent_cache
 from eoxserver.backends.component import BackendComponent, env
+from eoxserver.backends.config import CacheConfigReader
 
 
 logger = logging.getLogger(__name__)
@@ -47,7 +49,10 @@ def generate_hash(location, format, hash_impl="sha1"):
 
 def connect(data_item, cache=None):
     """ return a connection string, either for a local (cached) data or something 
-        residing on a server of some kind
+        residing on a server of some kind. Raster data items are read in place
+        through a GDAL virtual file system path if their storage or package 
+        supports it and streaming is enabled, unless they are already in the 
+        persistent cache.
     """
 
     backend = BackendComponent(env)
@@ -58,11 +63,79 @@ def connect(data_item, cache=None):
         component = backend.get_connected_storage_component(storage.storage_type)
 
     if not storage or not component:
+        if data_item.semantic.startswith("bands") and is_streaming_enabled():
+            # a local copy, e.g: of a prefetched data item, is preferred
+            cache_path = lookup_persistent(data_item)
+            if cache_path:
+                return cache_path
+
+            vsi_path = get_vsi_path(data_item, cache)
+            if vsi_path:
+                return vsi_path
+
         return retrieve(data_item, cache)
 
     return component.connect(storage.url, data_item.location)
 
 
+def lookup_persistent(data_item):
+    """ Returns the path of the data item in the persistent cache or `None`, if
+        no persistent cache is configured or the data item is not cached.
+    """
+    persistent_cache = get_persistent_cache()
+    if persistent_cache is None:
+        return None
+
+    return persistent_cache.lookup(
+        generate_hash(data_item.location, data_item.format)
+    )
+
+
+def is_streaming_enabled():
+    """ Returns whether data items shall be read in place, if possible.
+    """
+    return CacheConfigReader(get_eoxserver_config()).streaming
+
+
+def is_virtual_path(path):
+    """ Returns whether the given path refers to the GDAL virtual file system.
+    """
+    return path.startswith("/vsi")
+
+
+def get_vsi_path(data_item, cache=None):
+    """ Returns a GDAL virtual file system path to read the data item in place
+        or `None`, if its storage or package does not support streaming or
+        the file cannot be read in place (e.g: on storages requiring a login).
+        Packages that cannot be streamed themselves are retrieved, so that 
+        only their members are read in place.
+    """
+
+    backend = BackendComponent(env)
+
+    if data_item.package is not None:
+        package = data_item.package
+        component = backend.get_package_component(package.format)
+        if component is None or not component.streaming:
+            return None
+
+        package_path = get_vsi_path(package, cache)
+        if package_path is None:
+            package_path = path.abspath(retrieve(package, cache))
+
+        return component.get_vsi_path(package_path, data_item.location)
+
+    storage = data_item.storage
+    if storage is None:
+        return None
+
+    component = backend.get_file_storage_component(storage.storage_type)
+    if component is None or not component.streaming:
+        return None
+
+    return component.get_vsi_path(storage.url, data_item.location)
+
+
 
 def retrieve(data_item, cache=None):
     """ 
@@ -71,6 +144,10 @@ def retrieve(data_item, cache=None):
     backend = BackendComponent(env)
 
     if cache is None:
+        persistent_cache = get_persistent_cache()
+        if persistent_cache is not None:
+            return _retrieve_persistent(backend, data_item, persistent_cache)
+
         cache = get_cache_context()
 
     # compute a cache path where the file *would* be cached
@@ -99,6 +176,33 @@ def retrieve(data_item, cache=None):
 
 
 
+def _retrieve_persistent(backend, data_item, cache):
+    """ Helper function to retrieve a file via the persistent cache.
+    """
+    if data_item.package is None and not data_item.storage:
+        return data_item.location
+
+    item_id = generate_hash(data_item.location, data_item.format)
+    logger.debug("Retrieving %s (ID: %s)" % (data_item, item_id))
+
+    def fill(path):
+        if data_item.package is None:
+            storage = data_item.storage
+            logger.debug("Accessing storage %s." % storage)
+            component = backend.get_file_storage_component(
+                storage.storage_type
+            )
+            return component.retrieve(storage.url, data_item.location, path)
+
+        package = data_item.package
+        logger.debug("Accessing package %s." % package)
+        package_location = retrieve(package)
+        component = backend.get_package_component(package.format)
+        return component.extract(package_location, data_item.location, path)
+
+    return cache.retrieve(item_id, fill)
+
+
 def _retrieve_from_storage(backend, data_item, storage, item_id, path, cache):
     """ Helper function to retrieve a file from a storage.
     """
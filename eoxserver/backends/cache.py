@@ -34,6 +34,12 @@ import tempfile
 import errno
 import logging
 import threading
+import time
+import fcntl
+import sqlite3
+import atexit
+import Queue
+from contextlib import contextmanager
 
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.backends.config import CacheConfigReader
@@ -41,10 +47,22 @@ from eoxserver.backends.config import CacheConfigReader
 
 logger = logging.getLogger(__name__)
 
+# suffixes of files stored next to cached files (e.g: package indices) that are
+# removed along with them
+SIDECAR_SUFFIXES = (".index",)
+
 
 # global instance of the cache context
 cache_context_storage = threading.local()
 
+# process wide instance of the persistent cache
+_persistent_cache = None
+_persistent_cache_lock = threading.Lock()
+
+# process wide instance of the cache reaper
+_cache_reaper = None
+_cache_reaper_lock = threading.Lock()
+
 
 class CacheException(Exception):
     pass
@@ -75,6 +93,23 @@ def shutdown_cache_session():
     set_cache_context(None)
 
 
+def detach_cache_session():
+    """ Detach the cache context from this session without cleaning it up and
+        return it, or `None` if the session was not initialized. The caller is
+        responsible for the cleanup, e.g: via :func:`schedule_cleanup`.
+    """
+    cache_context = getattr(cache_context_storage, "cache_context", None)
+    set_cache_context(None)
+    return cache_context
+
+
+def schedule_cleanup(cache_context):
+    """ Hand the cleanup of the given cache context to the background 
+        :class:`CacheReaper` of this process.
+    """
+    get_cache_reaper().schedule(cache_context)
+
+
 def set_cache_context(cache_context):
     """ Sets the cache context for this session. Raises an exception if there 
         was already a cache context associated.
@@ -88,6 +123,47 @@ def set_cache_context(cache_context):
     cache_context_storage.cache_context = cache_context
 
 
+def get_persistent_cache(config=None):
+    """ Get the process wide :class:`PersistentCache`. Returns `None` if no 
+        persistent cache is configured, i.e: if either the `directory` or the 
+        `max_size` option of the `backends` section is not set.
+    """
+    global _persistent_cache
+
+    with _persistent_cache_lock:
+        if _persistent_cache is None:
+            if not config:
+                config = CacheConfigReader(get_eoxserver_config())
+
+            if not config.directory or not config.max_size:
+                return None
+
+            _persistent_cache = PersistentCache(
+                config.directory, config.max_size, config.eviction_policy
+            )
+
+        return _persistent_cache
+
+
+def get_cache_reaper(config=None):
+    """ Get the process wide :class:`CacheReaper`, enforcing the 
+        `retention_time` of the `backends` section.
+    """
+    global _cache_reaper
+
+    with _cache_reaper_lock:
+        if _cache_reaper is None:
+            if not config:
+                config = CacheConfigReader(get_eoxserver_config())
+
+            _cache_reaper = CacheReaper(
+                config.directory, config.retention_time
+            )
+            atexit.register(_cache_reaper.flush)
+
+        return _cache_reaper
+
+
 def get_cache_context():
     """ Get the thread local cache context for this session. Raises an exception
         if the session was not initialized.
@@ -116,6 +192,7 @@ class CacheContext(object):
         self._retention_time = retention_time
         self._level = 0
         self._mappings = {}
+        self._locks = {}
 
         self._managed = managed
 
@@ -159,16 +236,46 @@ class CacheContext(object):
         return relative_path
 
 
+    def add_lock(self, key, lock_file):
+        """ Keep the given locked file open until the cleanup of this context,
+            to mark the :class:`PersistentCache` entry `key` as in use. Returns
+            `False` if a lock for the key is already kept, in which case the
+            given one is not.
+        """
+        if key in self._locks:
+            return False
+        self._locks[key] = lock_file
+        return True
+
+
+    def release_lock(self, key):
+        """ Release the lock of the persistent cache entry `key`, if kept.
+        """
+        lock_file = self._locks.pop(key, None)
+        if lock_file is not None:
+            lock_file.close()
+
+
     def cleanup(self):
         """ Perform cache cleanup.
         """
+        for key in self._locks.keys():
+            self.release_lock(key)
+
         if self._retention_time and not self._temporary_dir:
             # no cleanup required
             return
 
         elif not self._temporary_dir:
-            for path in self._cached_objects:
-                os.remove(path)
+            for cache_path in self._cached_objects:
+                relative_path = self.relative_path(cache_path)
+                for filename in (relative_path,) + tuple(
+                        relative_path + suffix for suffix in SIDECAR_SUFFIXES):
+                    try:
+                        os.remove(filename)
+                    except OSError, e:
+                        if e.errno != errno.ENOENT:
+                            raise
             self._cached_objects.clear()
 
         else:
@@ -205,3 +312,497 @@ class CacheContext(object):
         self._level -= 1
         if self._level == 0 and not self._managed:
             self.cleanup()
+
+
+class PersistentCache(object):
+    """ Size bounded cache for retrieved files that outlives single requests and
+        is shared between all threads and processes using the same cache 
+        directory.
+
+        Entries are identified by a key (usually the result of
+        :func:`eoxserver.backends.access.generate_hash`) and book-kept in an 
+        SQLite index within the cache directory. Files are filled to a 
+        temporary path and renamed when complete, so that partially transferred
+        files are never visible. Concurrent fills of the same key are 
+        serialized by a file lock, so that only one worker downloads the file 
+        whereas the others wait for it. When the total size exceeds 
+        `max_size` bytes, entries are evicted either by the least recent 
+        (``LRU``) or the least frequent (``LFU``) access.
+
+        Entries looked up or retrieved within a cache session are in use until
+        the session's :class:`CacheContext` is cleaned up: the context keeps a
+        shared lock on the key, and entries whose lock cannot be acquired are
+        not evicted.
+    """
+
+    INDEX_FILENAME = ".index.sqlite"
+    LOCK_DIRECTORY = ".locks"
+    EVICTION_POLICIES = ("LRU", "LFU")
+    COUNTERS = ("hits", "misses", "evictions")
+
+    def __init__(self, cache_directory, max_size, eviction_policy="LRU"):
+        eviction_policy = (eviction_policy or "LRU").upper()
+        if eviction_policy not in self.EVICTION_POLICIES:
+            raise CacheException(
+                "Invalid eviction policy '%s'." % eviction_policy
+            )
+
+        self._cache_directory = cache_directory
+        self._max_size = max_size
+        self._eviction_policy = eviction_policy
+        self._local = threading.local()
+
+        try:
+            os.makedirs(path.join(cache_directory, self.LOCK_DIRECTORY))
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        with self._transaction() as index:
+            index.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                "last_access REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            index.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)"
+            )
+            index.executemany(
+                "INSERT OR IGNORE INTO counters (name) VALUES (?)",
+                [(name,) for name in self.COUNTERS]
+            )
+
+
+    @property
+    def cache_directory(self):
+        """ Returns the configured cache directory.
+        """
+        return self._cache_directory
+
+
+    @property
+    def max_size(self):
+        """ Returns the maximum size of all cached files in bytes.
+        """
+        return self._max_size
+
+
+    def relative_path(self, key):
+        """ Returns the path of the file for the given key.
+        """
+        return path.join(self._cache_directory, key)
+
+
+    def lookup(self, key):
+        """ Returns the path of the cached file for the given key or `None` if
+            the key is not cached. A successful lookup counts as a cache hit 
+            and marks the entry as in use for the current cache session.
+        """
+        lock_file = self._try_lock(key, fcntl.LOCK_SH)
+        if lock_file is None:
+            # the entry is currently filled or evicted
+            return None
+
+        cache_path = self._lookup(key)
+        if cache_path is None:
+            lock_file.close()
+        else:
+            self._keep_lock(key, lock_file)
+        return cache_path
+
+
+    def _lookup(self, key):
+        cache_path = self.relative_path(key)
+        with self._transaction() as index:
+            row = index.execute(
+                "SELECT 1 FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if not path.exists(cache_path):
+                # the file was removed behind our back
+                index.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+
+            index.execute(
+                "UPDATE entries SET hits = hits + 1, last_access = ? "
+                "WHERE key = ?", (time.time(), key)
+            )
+            self._increment(index, "hits")
+
+        return cache_path
+
+
+    def retrieve(self, key, fill):
+        """ Returns the path of the cached file for the given key. If the file 
+            is not yet cached, the callable `fill` is invoked with a temporary
+            path where the file shall be stored. If `fill` returns a path 
+            different from the temporary one, the file is considered to be 
+            accessible without a transfer and this path is returned without 
+            caching. Workers requesting a key that is currently filled wait for
+            the fill to complete.
+        """
+        cache_path = self.lookup(key)
+        if cache_path:
+            return cache_path
+
+        # a lock still kept for a vanished entry would block the fill
+        cache_context = getattr(cache_context_storage, "cache_context", None)
+        if cache_context is not None:
+            cache_context.release_lock(key)
+
+        with self._file_lock(key) as lock_file:
+            # another worker may have filled the entry while we were waiting
+            cache_path = self._lookup(key)
+            if cache_path:
+                self._keep_shared_lock(key, lock_file)
+                return cache_path
+
+            cache_path = self.relative_path(key)
+            tmp_path = "%s.%d.%d.tmp" % (
+                cache_path, os.getpid(), threading.current_thread().ident
+            )
+
+            try:
+                actual_path = fill(tmp_path)
+                if actual_path and actual_path != tmp_path:
+                    return actual_path
+
+                size = path.getsize(tmp_path)
+                os.rename(tmp_path, cache_path)
+            finally:
+                if path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            with self._transaction() as index:
+                index.execute(
+                    "INSERT OR REPLACE INTO entries (key, size, last_access, "
+                    "hits) VALUES (?, ?, ?, 0)", (key, size, time.time())
+                )
+                self._increment(index, "misses")
+
+            self._keep_shared_lock(key, lock_file)
+
+        logger.debug("Cached %s (%d bytes)." % (key, size))
+        self.evict(keep=(key,))
+        return cache_path
+
+
+    def evict(self, max_size=None, keep=()):
+        """ Evicts entries until the total size of the cache is below the 
+            `max_size` (defaulting to the configured one). Entries with keys in
+            `keep` or currently in use are not evicted, even if the cache 
+            remains larger than `max_size`. Returns the list of evicted keys.
+        """
+        if max_size is None:
+            max_size = self._max_size
+
+        if self._eviction_policy == "LFU":
+            order = "hits, last_access"
+        else:
+            order = "last_access"
+
+        evicted = []
+        with self._transaction() as index:
+            total, = index.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            if total <= max_size:
+                return evicted
+
+            rows = index.execute(
+                "SELECT key, size FROM entries ORDER BY %s" % order
+            ).fetchall()
+            for key, size in rows:
+                if total <= max_size:
+                    break
+                if key in keep or not self._remove_unused(index, key):
+                    continue
+
+                total -= size
+                evicted.append(key)
+
+            self._increment(index, "evictions", len(evicted))
+
+        logger.debug("Evicted %d cached files." % len(evicted))
+        return evicted
+
+
+    def expire(self, retention_time):
+        """ Evicts all entries that were not accessed within the last 
+            `retention_time` seconds and are not in use. Returns the list of 
+            evicted keys.
+        """
+        with self._transaction() as index:
+            evicted = [
+                key for key, in index.execute(
+                    "SELECT key FROM entries WHERE last_access < ?", 
+                    (time.time() - retention_time,)
+                ).fetchall()
+                if self._remove_unused(index, key)
+            ]
+
+            self._increment(index, "evictions", len(evicted))
+
+        if evicted:
+            logger.debug("Expired %d cached files." % len(evicted))
+        return evicted
+
+
+    def statistics(self):
+        """ Returns a dictionary with the hit, miss and eviction counters, as 
+            well as the current number and total size of cached files.
+        """
+        with self._transaction() as index:
+            statistics = dict(
+                index.execute("SELECT name, value FROM counters").fetchall()
+            )
+            count, size = index.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+
+        statistics.update(count=count, size=size, max_size=self._max_size)
+        return statistics
+
+
+    def contains(self, key):
+        """ Check whether or not the key is contained in this cache. This does 
+            not count as a cache hit.
+        """
+        with self._transaction() as index:
+            row = index.execute(
+                "SELECT 1 FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        return row is not None and path.exists(self.relative_path(key))
+
+    def __contains__(self, key):
+        """ Alias for method `contains`.
+        """
+        return self.contains(key)
+
+
+    def _remove(self, index, key):
+        index.execute("DELETE FROM entries WHERE key = ?", (key,))
+        # remove the file while still holding the index lock, to not interfere
+        # with a concurrent fill of the same key
+        cache_path = self.relative_path(key)
+        for filename in (cache_path,) + tuple(
+                cache_path + suffix for suffix in SIDECAR_SUFFIXES):
+            try:
+                os.remove(filename)
+            except OSError, e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+
+    def _remove_unused(self, index, key):
+        """ Removes the entry, unless it is currently filled or in use. 
+            Returns whether the entry was removed.
+        """
+        lock_file = self._try_lock(key, fcntl.LOCK_EX)
+        if lock_file is None:
+            return False
+        try:
+            self._remove(index, key)
+        finally:
+            lock_file.close()
+        return True
+
+
+    def _increment(self, index, name, value=1):
+        index.execute(
+            "UPDATE counters SET value = value + ? WHERE name = ?", 
+            (value, name)
+        )
+
+
+    def _connection(self):
+        """ Returns the index connection of the current thread and process.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                path.join(self._cache_directory, self.INDEX_FILENAME),
+                timeout=60, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+    @contextmanager
+    def _transaction(self):
+        """ Context manager for an exclusive transaction on the index. 
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except:
+            connection.execute("ROLLBACK")
+            raise
+        else:
+            connection.execute("COMMIT")
+
+
+    def _lock_path(self, key):
+        return path.join(
+            self._cache_directory, self.LOCK_DIRECTORY, key + ".lock"
+        )
+
+
+    @contextmanager
+    def _file_lock(self, key):
+        """ Context manager for an exclusive lock on the given key, shared 
+            between threads and processes. Yields the locked file.
+        """
+        with open(self._lock_path(key), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield lock_file
+
+
+    def _try_lock(self, key, operation):
+        """ Returns the lock file of the given key locked with the `flock` 
+            `operation` or `None`, if the lock is held elsewhere. Locks are 
+            per open file, so this also applies to other threads of this 
+            process. Closing the returned file releases the lock.
+        """
+        lock_file = open(self._lock_path(key), "a")
+        try:
+            fcntl.flock(lock_file, operation | fcntl.LOCK_NB)
+        except IOError, e:
+            lock_file.close()
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                return None
+            raise
+        return lock_file
+
+
+    def _keep_shared_lock(self, key, lock_file):
+        """ Converts the exclusive lock of the given (open) lock file to a 
+            shared one and keeps it for the current cache session. 
+        """
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        # the duplicate refers to the same lock, so it outlives the original
+        self._keep_lock(key, os.fdopen(os.dup(lock_file.fileno()), "a"))
+
+
+    def _keep_lock(self, key, lock_file):
+        """ Hands the locked file to the current cache context, which releases
+            it on cleanup. Without a cache session, the lock is released 
+            immediately.
+        """
+        cache_context = getattr(cache_context_storage, "cache_context", None)
+        if cache_context is None or not cache_context.add_lock(key, lock_file):
+            lock_file.close()
+
+
+class CacheReaper(object):
+    """ Background thread cleaning up finished cache contexts, so that requests
+        do not wait for the removal of their cached files. If a 
+        `retention_time` (in seconds) is configured for a `cache_directory`, 
+        the thread also removes all files that were cached for longer than 
+        that every `interval` seconds. For a persistent cache, entries that 
+        were not accessed within the retention time are evicted instead, and
+        entries that were in use when the cache exceeded its maximum size are
+        evicted once they are released.
+    """
+
+    def __init__(self, cache_directory=None, retention_time=None, interval=60):
+        self._cache_directory = cache_directory
+        self._retention_time = retention_time
+        self._interval = interval
+        self._queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._last_expiry = time.time()
+
+    def schedule(self, cache_context):
+        """ Schedules the cleanup of the given cache context.
+        """
+        self._ensure_running()
+        self._queue.put(cache_context)
+
+    def flush(self):
+        """ Cleans up all pending cache contexts in the calling thread.
+        """
+        while True:
+            try:
+                cache_context = self._queue.get_nowait()
+            except Queue.Empty:
+                return
+            self._cleanup(cache_context)
+
+    def expire(self):
+        """ Removes the files of the cache directory that exceeded the 
+            retention time. Returns the number of removed files.
+        """
+        if not self._cache_directory:
+            return 0
+
+        persistent_cache = get_persistent_cache()
+        if persistent_cache is not None:
+            evicted = persistent_cache.evict()
+            if self._retention_time:
+                evicted.extend(persistent_cache.expire(self._retention_time))
+            return len(evicted)
+
+        if not self._retention_time:
+            return 0
+
+        limit = time.time() - self._retention_time
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(self._cache_directory):
+            for filename in filenames:
+                filename = path.join(dirpath, filename)
+                try:
+                    if path.getmtime(filename) < limit:
+                        os.remove(filename)
+                        count += 1
+                except OSError:
+                    # removed concurrently
+                    pass
+
+        if count:
+            logger.debug("Expired %d cached files." % count)
+        return count
+
+    def _ensure_running(self):
+        with self._lock:
+            # threads do not survive a fork, so start a new one in the child
+            if self._thread is None or self._pid != os.getpid():
+                self._thread = threading.Thread(
+                    target=self._run, name="CacheReaper"
+                )
+                self._thread.daemon = True
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._cleanup(self._queue.get(timeout=self._interval))
+            except Queue.Empty:
+                pass
+
+            if time.time() - self._last_expiry >= self._interval:
+                self._last_expiry = time.time()
+                try:
+                    self.expire()
+                except Exception:
+                    logger.exception("Failed to expire cached files.")
+
+    def _cleanup(self, cache_context):
+        try:
+            cache_context.cleanup()
+        except Exception:
+            logger.exception(
+                "Failed to clean up the cache directory %s." 
+                % cache_context.cache_directory
+            )
+
@@ -31,5 +31,15 @@ from eoxserver.core.decoders import config
 
 class CacheConfigReader(config.Reader):
     config.section("backends")
-    retention_time = config.Option() # TODO
+    retention_time = config.Option(type=int)
     directory = config.Option()
+    max_size = config.Option(type=int)
+    eviction_policy = config.Option(default="LRU")
+    streaming = config.Option(type=bool, default=False)
+
+
+class ConnectionPoolConfigReader(config.Reader):
+    config.section("backends")
+    pool_size = config.Option(type=int, default=4)
+    pool_idle_timeout = config.Option(type=float, default=60.0)
+    retrieve_retries = config.Option(type=int, default=3)
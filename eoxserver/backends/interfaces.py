@@ -40,9 +40,13 @@ class AbstractStorageInterface(object):
 
 class FileStorageInterface(AbstractStorageInterface):
     """ Interface for storages that provide access to files and allow the 
-        retrieval of those.
+        retrieval of those. Storages whose files can be read in place through
+        the GDAL virtual file system set `streaming` to `True` and implement
+        `get_vsi_path`.
     """
 
+    streaming = False
+
     def retrieve(self, url, location, path):
         """ Retrieve a remote file from the storage specified by the given `url` 
             and location and store it to the given `path`. Storages that don't
@@ -55,6 +59,12 @@ class FileStorageInterface(AbstractStorageInterface):
             at the specified URL and given location.
         """
 
+    def get_vsi_path(self, url, location):
+        """ Return a GDAL virtual file system path (e.g: ``/vsicurl/``) to 
+            read the file specified by the given `url` and `location` without
+            retrieving it first, or `None` if the file has to be retrieved.
+        """
+
 
 class ConnectedStorageInterface(AbstractStorageInterface):
     """ Interface for storages that do not store "files" but provide access to
@@ -68,6 +78,12 @@ class ConnectedStorageInterface(AbstractStorageInterface):
 
 
 class PackageInterface(object):
+    """ Interface for package formats. Packages whose members can be read in
+        place through the GDAL virtual file system set `streaming` to `True` 
+        and implement `get_vsi_path`.
+    """
+
+    streaming = False
 
     @property
     def name(self):
@@ -83,3 +99,10 @@ class PackageInterface(object):
         """ Return a list of item locations under the specified location in the 
             given package.
         """
+
+    def get_vsi_path(self, package_filename, location):
+        """ Return a GDAL virtual file system path (e.g: ``/vsitar/``) to read
+            the item at `location` in place. The `package_filename` may itself
+            be a virtual file system path. Returns `None` if the package 
+            cannot be read in place.
+        """
@@ -29,27 +29,41 @@
 
 import logging
 
-from eoxserver.backends.cache import setup_cache_session, shutdown_cache_session
+from eoxserver.backends.cache import (
+    setup_cache_session, detach_cache_session, schedule_cleanup
+)
 
 
 logger = logging.getLogger(__name__)
 
 class BackendsCacheMiddleware(object):
-    """ A request middleware f
+    """ A request middleware that sets up a cache session for each request. 
+        The cleanup of the cached files is deferred until the response was 
+        sent and its iterator closed, as a streamed response may still read
+        them. The cleanup itself is performed by a background thread.
     """
     def process_request(self, request):
         setup_cache_session()
 
     def process_response(self, request, response):
-        shutdown_cache_session()
-        return response
+        cache_context = detach_cache_session()
+        if cache_context is None:
+            return response
+
+        close = response.close
+
+        def close_and_cleanup():
+            try:
+                close()
+            finally:
+                schedule_cleanup(cache_context)
 
-    def process_template_response(self, request, response):
-        shutdown_cache_session()
+        # the WSGI server closes the response after it was sent completely
+        response.close = close_and_cleanup
         return response
 
     def process_exception(self, request, exception):
-        shutdown_cache_session()
+        cache_context = detach_cache_session()
+        if cache_context is not None:
+            schedule_cleanup(cache_context)
         return None
-
-
@@ -0,0 +1,196 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Member indices of package files. An index maps the names of the members of
+    a package to their data offset, their (compressed) size and their 
+    compression, so that a member can be read with a single seek instead of 
+    scanning the package. Indices are built once per package file and kept in
+    memory. For packages retrieved to a cache directory, they are also stored 
+    next to the package, so that they are removed along with it.
+"""
+
+import os
+import json
+import zlib
+import logging
+import threading
+from zipfile import ZIP_STORED, ZIP_DEFLATED
+
+from eoxserver.backends.cache import (
+    CacheException, SIDECAR_SUFFIXES, get_cache_context, get_persistent_cache
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_SUFFIX = SIDECAR_SUFFIXES[0]
+
+# maximum number of indices kept in memory
+MAX_CACHED_INDICES = 64
+
+CHUNK_SIZE = 1048576
+
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def get_member_index(package_filename, build):
+    """ Returns the member index of a local package file as a dict mapping 
+        member names to tuples of (offset, size, compression). The index is 
+        taken from memory or from the index file next to a cached package, as
+        long as the package was not modified since. Otherwise it is built by calling
+        ``build(package_filename)``, which may return `None` if the package 
+        cannot be indexed (e.g: a compressed TAR). `None` is also returned for
+        packages that are not local files.
+    """
+    try:
+        stat = os.stat(package_filename)
+    except OSError:
+        return None
+    stamp = [stat.st_size, stat.st_mtime]
+
+    with _indices_lock:
+        cached = _indices.get(package_filename)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    cached = _is_cached(package_filename)
+    members = _read_index(package_filename, stamp) if cached else None
+    if members is None:
+        members = build(package_filename)
+        if members is None:
+            return None
+        if cached:
+            _write_index(package_filename, stamp, members)
+
+    with _indices_lock:
+        if len(_indices) >= MAX_CACHED_INDICES:
+            _indices.pop(next(iter(_indices)))
+        _indices[package_filename] = (stamp, members)
+
+    return members
+
+
+def copy_member(package_filename, member, path):
+    """ Copies an indexed member of the package to the given path, 
+        decompressing it if necessary.
+    """
+    offset, size, compression = member
+    if compression == ZIP_DEFLATED:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    elif compression == ZIP_STORED:
+        decompressor = None
+    else:
+        raise ValueError("Unsupported compression %r." % compression)
+
+    with open(package_filename, "rb") as package_file:
+        package_file.seek(offset)
+        with open(path, "wb") as out_file:
+            remaining = size
+            while remaining > 0:
+                data = package_file.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    raise IOError(
+                        "Unexpected end of package '%s'." % package_filename
+                    )
+                remaining -= len(data)
+                if decompressor:
+                    data = decompressor.decompress(data)
+                out_file.write(data)
+
+            if decompressor:
+                out_file.write(decompressor.flush())
+
+
+def get_subfile_path(package_filename, member):
+    """ Returns a ``/vsisubfile/`` path for GDAL to read an uncompressed 
+        member in place, or `None` if the member is compressed.
+    """
+    offset, size, compression = member
+    if compression != ZIP_STORED:
+        return None
+    return "/vsisubfile/%d_%d,%s" % (offset, size, package_filename)
+
+
+def _is_cached(package_filename):
+    """ Checks whether the package file resides in the persistent cache or in
+        the cache context of the current session. Index files are not written
+        next to other packages, e.g. source archives on read-only or shared 
+        file systems.
+    """
+    directories = []
+    persistent_cache = get_persistent_cache()
+    if persistent_cache is not None:
+        directories.append(persistent_cache.cache_directory)
+    try:
+        directories.append(get_cache_context().cache_directory)
+    except CacheException:
+        pass
+
+    package_filename = os.path.realpath(package_filename)
+    return any(
+        package_filename.startswith(
+            os.path.join(os.path.realpath(directory), "")
+        ) for directory in directories
+    )
+
+
+def _read_index(package_filename, stamp):
+    try:
+        with open(package_filename + INDEX_SUFFIX) as index_file:
+            index = json.load(index_file)
+    except (IOError, ValueError):
+        return None
+
+    if index.get("stamp") != stamp:
+        return None
+
+    return dict(
+        (name, tuple(member)) for name, member in index["members"].items()
+    )
+
+
+def _write_index(package_filename, stamp, members):
+    index_filename = package_filename + INDEX_SUFFIX
+    tmp_filename = "%s.%d.%d.tmp" % (
+        index_filename, os.getpid(), threading.current_thread().ident
+    )
+    try:
+        with open(tmp_filename, "w") as index_file:
+            json.dump({"stamp": stamp, "members": members}, index_file)
+        os.rename(tmp_filename, index_filename)
+    except (IOError, OSError), e:
+        # the index is still kept in memory
+        logger.debug(
+            "Could not store the index of '%s': %s" % (package_filename, e)
+        )
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
@@ -0,0 +1,84 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+from zipfile import ZipFile, BadZipfile
+
+from eoxserver.contrib import gdal
+from eoxserver.backends.access import is_virtual_path
+from eoxserver.backends.packages.index import get_member_index
+from eoxserver.backends.packages.zip import ZIPPackage, build_index
+
+
+class SAFEPackage(ZIPPackage):
+    """ Implementation of the package interface for zipped SAFE products (e.g:
+        of Sentinel missions). Locations are relative to the ``.SAFE`` root 
+        directory of the product, so that they do not depend on the product
+        name.
+    """
+
+    name = "SAFE"
+
+    extensions = (".zip",)
+
+    def extract(self, package_filename, location, path):
+        return super(SAFEPackage, self).extract(
+            package_filename, self.resolve(package_filename, location), path
+        )
+
+
+    def get_vsi_path(self, package_filename, location):
+        return super(SAFEPackage, self).get_vsi_path(
+            package_filename, self.resolve(package_filename, location)
+        )
+
+
+    def resolve(self, package_filename, location):
+        """ Returns the member name of the given location within the ``.SAFE``
+            root directory. Locations that already include the root directory
+            and packages that cannot be read are left as they are. Packages on
+            the GDAL virtual file system (e.g: when streamed) are listed 
+            through ``/vsizip/``.
+        """
+        if is_virtual_path(package_filename):
+            members = gdal.ReadDir("/vsizip/%s" % package_filename) or ()
+        else:
+            members = get_member_index(package_filename, build_index)
+            if members is None:
+                try:
+                    members = ZipFile(package_filename).namelist()
+                except (IOError, BadZipfile):
+                    return location
+
+        for name in members:
+            root = name.split("/", 1)[0]
+            if root.upper().endswith(".SAFE"):
+                if location.startswith(root + "/"):
+                    return location
+                return "%s/%s" % (root, location)
+
+        return location
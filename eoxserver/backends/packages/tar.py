@@ -27,9 +27,16 @@
 #-------------------------------------------------------------------------------
 
 
+import shutil
+import tarfile
 from tarfile import TarFile
+from zipfile import ZIP_STORED
+
 from eoxserver.core import Component, implements
 from eoxserver.backends.interfaces import PackageInterface
+from eoxserver.backends.packages.index import (
+    get_member_index, copy_member, get_subfile_path
+)
 
 
 class TARPackage(Component):
@@ -38,11 +45,55 @@ class TARPackage(Component):
 
     name = "TAR"
 
+    streaming = True
+
+    # GDAL recognizes the archive in a /vsitar/ path by its extension
+    extensions = (".tar", ".tgz", ".tar.gz")
+
     def extract(self, package_filename, location, path):
-        tarfile = TarFile(package_filename, "r")
-        tarfile.extract(location, path)
+        """ Extracts the member at `location` to the given `path`. Members of 
+            uncompressed archives are read directly via the member index.
+        """
+        members = get_member_index(package_filename, build_index)
+        if members and location in members:
+            copy_member(package_filename, members[location], path)
+            return
+
+        with tarfile.open(package_filename, "r") as tar:
+            member_file = tar.extractfile(location)
+            with open(path, "wb") as out_file:
+                shutil.copyfileobj(member_file, out_file)
+
+
+    def get_vsi_path(self, package_filename, location):
+        members = get_member_index(package_filename, build_index)
+        if members and location in members:
+            # spare GDAL scanning the archive
+            return get_subfile_path(package_filename, members[location])
+
+        if not package_filename.lower().endswith(self.extensions):
+            return None
+        return "/vsitar/%s/%s" % (package_filename, location)
 
     
     def list_files(self, package_filename):
         tarfile = TarFile(package_filename, "r")
         # TODO: get list
+
+
+def build_index(package_filename):
+    """ Builds the member index of an uncompressed TAR file by scanning its 
+        headers once. Returns `None` for compressed archives, which cannot be
+        read at an offset.
+    """
+    try:
+        tar = tarfile.open(package_filename, "r:")
+    except tarfile.ReadError:
+        return None
+
+    with tar:
+        return dict(
+            (member.name, (member.offset_data, member.size, ZIP_STORED))
+            for member in tar
+            if member.isfile() and not member.issparse()
+        )
@@ -28,10 +28,14 @@
 
 
 import shutil
-from zipfile import ZipFile
+import struct
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
 
 from eoxserver.core import Component, implements
 from eoxserver.backends.interfaces import PackageInterface
+from eoxserver.backends.packages.index import (
+    get_member_index, copy_member, get_subfile_path
+)
 
 
 class ZIPPackage(Component):
@@ -42,13 +46,66 @@ class ZIPPackage(Component):
 
     name = "ZIP"
 
+    streaming = True
+
+    # GDAL recognizes the archive in a /vsizip/ path by its extension
+    extensions = (".zip", ".kmz")
+
     def extract(self, package_filename, location, path):
+        """ Extracts the member at `location` to the given `path`, reading it
+            directly via the member index, if possible.
+        """
+        members = get_member_index(package_filename, build_index)
+        if members and location in members:
+            copy_member(package_filename, members[location], path)
+            return
+
         zipfile = ZipFile(package_filename, "r")
         infile = zipfile.open(location)
         with open(path, "wb") as outfile:
             shutil.copyfileobj(infile, outfile)
 
+
+    def get_vsi_path(self, package_filename, location):
+        members = get_member_index(package_filename, build_index)
+        if members and location in members:
+            subfile_path = get_subfile_path(
+                package_filename, members[location]
+            )
+            if subfile_path:
+                return subfile_path
+
+        if not package_filename.lower().endswith(self.extensions):
+            return None
+        return "/vsizip/%s/%s" % (package_filename, location)
+
     
     def list_files(self, package_filename):
         zipfile = ZipFile(package_filename, "r")
         # TODO: get list
+
+
+def build_index(package_filename):
+    """ Builds the member index of a ZIP file from its central directory and 
+        the local headers of its members. Encrypted members and members with 
+        compressions other than deflate are not indexed.
+    """
+    members = {}
+    with open(package_filename, "rb") as package_file:
+        for info in ZipFile(package_file).infolist():
+            if info.flag_bits & 0x1 or info.filename.endswith("/"):
+                continue
+            if info.compress_type not in (ZIP_STORED, ZIP_DEFLATED):
+                continue
+
+            # the data starts after the local header, whose extra field may 
+            # differ from the one in the central directory
+            package_file.seek(info.header_offset)
+            header = package_file.read(30)
+            name_length, extra_length = struct.unpack("<HH", header[26:30])
+            offset = info.header_offset + 30 + name_length + extra_length
+            members[info.filename] = (
+                offset, info.compress_size, info.compress_type
+            )
+
+    return members
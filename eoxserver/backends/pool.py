@@ -0,0 +1,275 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Process wide pool of open connections to remote storages and helpers for
+    resumable and rate limited transfers.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.backends.config import ConnectionPoolConfigReader
+
+
+logger = logging.getLogger(__name__)
+
+
+# process wide instance of the connection pool
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+# the bandwidth limiter of the current thread
+_bandwidth_storage = threading.local()
+
+
+def get_connection_pool(config=None):
+    """ Get the process wide :class:`ConnectionPool`, configured by the
+        `pool_size` and `pool_idle_timeout` options of the `backends` section.
+    """
+    global _connection_pool
+
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            if not config:
+                config = ConnectionPoolConfigReader(get_eoxserver_config())
+
+            _connection_pool = ConnectionPool(
+                config.pool_size, config.pool_idle_timeout
+            )
+
+        return _connection_pool
+
+
+class ConnectionPool(object):
+    """ Pool of idle connections, keyed by a tuple like 
+        ``(scheme, host, port, user)``. Connections are handed out by the
+        :meth:`connection` context manager and are put back into the pool when
+        the block exits normally. Connections whose block raised an exception
+        are closed, as their state is unknown.
+
+        At most `max_size` idle connections are kept per key, and connections
+        that were idle for longer than `idle_timeout` seconds are closed. As 
+        sockets must not be shared between processes, idle connections that
+        were inherited by a forked process are dropped.
+    """
+
+    def __init__(self, max_size=4, idle_timeout=60.0):
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @contextmanager
+    def connection(self, key, connect, check=None, close=None):
+        """ Context manager yielding an idle connection for the given `key`,
+            or a new one created by the `connect` callable. Idle connections
+            are only reused when the optional `check` callable returns `True`
+            for them. `close` is used to close surplus or broken connections
+            and defaults to calling their ``close()`` method.
+        """
+        close = close or _close
+        conn = self._acquire(key, check, close)
+        if conn is None:
+            conn = connect()
+
+        try:
+            yield conn
+        except:
+            _safe_close(conn, close)
+            raise
+
+        self._release(key, conn, close)
+
+    def clear(self):
+        """ Closes all idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for connections in idle.values():
+            for conn, close, released in connections:
+                _safe_close(conn, close)
+
+    def _acquire(self, key, check, close):
+        while True:
+            with self._lock:
+                self._check_pid()
+                connections = self._idle.get(key)
+                if not connections:
+                    return None
+                conn, _, released = connections.pop()
+
+            if time.time() - released > self._idle_timeout:
+                _safe_close(conn, close)
+                continue
+
+            try:
+                if check is None or check(conn):
+                    return conn
+            except Exception:
+                pass
+
+            logger.debug("Discarding stale connection for %s." % (key,))
+            _safe_close(conn, close)
+
+    def _release(self, key, conn, close):
+        now = time.time()
+        expired = []
+        with self._lock:
+            self._check_pid()
+            connections = self._idle.setdefault(key, [])
+            connections.append((conn, close, now))
+
+            # close the least recently used connections exceeding the bound
+            # and the ones that timed out in the meantime
+            while len(connections) > self._max_size:
+                expired.append(connections.pop(0))
+            while connections and now - connections[0][2] > self._idle_timeout:
+                expired.append(connections.pop(0))
+
+        for conn, close, _ in expired:
+            _safe_close(conn, close)
+
+    def _check_pid(self):
+        # must be called with the lock held
+        if self._pid != os.getpid():
+            self._idle = {}
+            self._pid = os.getpid()
+
+
+def _close(conn):
+    conn.close()
+
+
+def _safe_close(conn, close):
+    try:
+        close(conn)
+    except Exception:
+        logger.debug("Error while closing a connection.", exc_info=True)
+
+
+def resumable_retrieve(path, transfer, errors, retries=None):
+    """ Stores a remote file under `path` by calling ``transfer(local_file,
+        offset)``, which shall write the remote file from the byte `offset` on
+        to the given file object. If the transfer fails with one of the 
+        exception types in `errors`, it is resumed from the bytes already 
+        written, up to `retries` times (by default the `retrieve_retries` 
+        option of the `backends` section). Transfers that cannot be resumed 
+        need to truncate the local file and start from the beginning. Writes
+        are throttled by the limiter set with :func:`bandwidth_limit`.
+    """
+
+    if retries is None:
+        retries = ConnectionPoolConfigReader(
+            get_eoxserver_config()
+        ).retrieve_retries
+
+    attempt = 0
+    with open(path, "wb") as local_file:
+        limiter = getattr(_bandwidth_storage, "limiter", None)
+        if limiter is not None:
+            local_file = _ThrottledFile(local_file, limiter)
+
+        while True:
+            try:
+                transfer(local_file, local_file.tell())
+                return path
+            except errors, e:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                logger.warning(
+                    "Transfer to '%s' failed after %d bytes (%s), resuming "
+                    "(attempt %d of %d)." 
+                    % (path, local_file.tell(), e, attempt, retries)
+                )
+
+
+class BandwidthLimiter(object):
+    """ Token bucket limiting the combined rate of all transfers sharing it to
+        `rate` bytes per second. Bursts of up to one second worth of bytes are
+        allowed.
+    """
+
+    def __init__(self, rate):
+        self._rate = float(rate)
+        self._tokens = self._rate
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        """ Takes `amount` bytes from the bucket and blocks until they are 
+            covered by the rate.
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(
+                self._rate, self._tokens + (now - self._last) * self._rate
+            )
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self._rate
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+@contextmanager
+def bandwidth_limit(limiter):
+    """ Context manager to limit all transfers of :func:`resumable_retrieve` in
+        the current thread by the given :class:`BandwidthLimiter`. `None` 
+        disables the limit.
+    """
+    previous = getattr(_bandwidth_storage, "limiter", None)
+    _bandwidth_storage.limiter = limiter
+    try:
+        yield limiter
+    finally:
+        _bandwidth_storage.limiter = previous
+
+
+class _ThrottledFile(object):
+    """ File wrapper that passes all written bytes through a limiter.
+    """
+
+    def __init__(self, local_file, limiter):
+        self._file = local_file
+        self._limiter = limiter
+
+    def write(self, data):
+        self._limiter.consume(len(data))
+        self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
@@ -0,0 +1,151 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Concurrent warm-up of the persistent cache with data items that are known
+    to be requested soon.
+"""
+
+import time
+import Queue
+import logging
+import threading
+from os import path
+
+from eoxserver.backends.access import generate_hash, retrieve
+from eoxserver.backends.cache import CacheException, get_persistent_cache
+from eoxserver.backends.pool import BandwidthLimiter, bandwidth_limit
+
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchResult(object):
+    """ Outcome of the prefetching of a single data item. `path` is the cached
+        file, `size` its size in bytes, `cached` whether it was already in the
+        cache and `error` the exception raised if the retrieval failed.
+    """
+
+    def __init__(self, data_item, path=None, size=0, cached=False, 
+                 duration=0.0, error=None):
+        self.data_item = data_item
+        self.path = path
+        self.size = size
+        self.cached = cached
+        self.duration = duration
+        self.error = error
+
+
+def prefetch(data_items, concurrency=4, bandwidth=None, progress=None):
+    """ Retrieves the given data items into the persistent cache with 
+        `concurrency` worker threads, so that later requests do not wait for
+        their transfer. Packages are cached along with the members extracted 
+        from them. Data items residing on the local file system are skipped.
+
+        `bandwidth` limits the combined transfer rate of all workers in bytes
+        per second. `progress` is called with the number of processed items,
+        their total number and the :class:`PrefetchResult` of the last item
+        after each data item. Returns the list of :class:`PrefetchResult`. A
+        :exc:`CacheException` is raised if no persistent cache is configured.
+    """
+
+    cache = get_persistent_cache()
+    if cache is None:
+        raise CacheException(
+            "Prefetching requires a persistent cache; set the 'directory' and "
+            "'max_size' options of the 'backends' section."
+        )
+
+    data_items = [
+        data_item for data_item in data_items if _is_remote(data_item)
+    ]
+    limiter = BandwidthLimiter(bandwidth) if bandwidth else None
+
+    queue = Queue.Queue()
+    for data_item in data_items:
+        queue.put(data_item)
+
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        with bandwidth_limit(limiter):
+            while True:
+                try:
+                    data_item = queue.get_nowait()
+                except Queue.Empty:
+                    return
+
+                result = _prefetch(data_item, cache)
+                with lock:
+                    results.append(result)
+                    if progress:
+                        progress(len(results), len(data_items), result)
+
+    threads = [
+        threading.Thread(target=worker) 
+        for _ in range(min(max(concurrency, 1), len(data_items)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def _is_remote(data_item):
+    """ Checks whether the data item needs to be retrieved at all. This also 
+        fetches its storage and package chain, so that the workers do not need
+        to query the database.
+    """
+    remote = data_item.package is not None
+    location = data_item
+    while location is not None:
+        remote = remote or location.storage is not None
+        location = location.package
+    return remote
+
+
+def _prefetch(data_item, cache):
+    """ Retrieves a single data item into the cache and reports the outcome.
+    """
+    start = time.time()
+    cached = generate_hash(data_item.location, data_item.format) in cache
+    try:
+        cache_path = retrieve(data_item)
+        return PrefetchResult(
+            data_item, cache_path, path.getsize(cache_path), cached,
+            time.time() - start
+        )
+    except Exception, e:
+        logger.warning(
+            "Failed to prefetch %s: %s" % (data_item, e), exc_info=True
+        )
+        return PrefetchResult(
+            data_item, cached=cached, duration=time.time() - start, error=e
+        )
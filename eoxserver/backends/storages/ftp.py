@@ -28,6 +28,7 @@
 
 
 from os import path
+import ftplib
 from ftplib import FTP
 from urlparse import urlparse
 
@@ -35,6 +36,12 @@ from django.core.exceptions import ValidationError
 
 from eoxserver.core import Component, implements
 from eoxserver.backends.interfaces import FileStorageInterface
+from eoxserver.backends.pool import get_connection_pool, resumable_retrieve
+
+
+# errors upon which an interrupted transfer is resumed. Permanent errors (e.g:
+# a missing file) are not retried.
+RETRY_ERRORS = (ftplib.error_temp, ftplib.error_reply, IOError, EOFError)
 
 
 class FTPStorage(Component):
@@ -42,6 +49,8 @@ class FTPStorage(Component):
 
     name = "FTP"
 
+    streaming = True
+
     def validate(self, url):
         parsed = urlparse(url)
         if not parsed.hostname:
@@ -55,39 +64,72 @@ class FTPStorage(Component):
 
     def retrieve(self, url, location, result_path):
         """ Retrieves the file referenced by `location` from the server 
-            specified by its `url` and stores it under the `result_path`.
+            specified by its `url` and stores it under the `result_path`. 
+            Interrupted transfers are resumed from the bytes already received.
         """
         
-        ftp, parsed_url = self._open(url)
+        parsed_url = urlparse(url)
+        cmd = "RETR %s" % path.join(parsed_url.path, location)
 
-        try:
-            cmd = "RETR %s" % path.join(parsed_url.path, location)
-            with open(result_path, 'wb') as local_file:
-                ftp.retrbinary(cmd, local_file.write)
+        def transfer(local_file, offset):
+            with self._open(parsed_url) as ftp:
+                ftp.retrbinary(cmd, local_file.write, rest=offset or None)
 
-        finally:
-            ftp.quit()
+        return resumable_retrieve(result_path, transfer, RETRY_ERRORS)
+
+
+    def get_vsi_path(self, url, location):
+        """ Returns the ``/vsicurl/`` path of the file referenced by 
+            `location`, which is read in place by GDAL. Files on servers 
+            requiring a login other than the anonymous one are not read in 
+            place, as the credentials would be part of the path.
+        """
+        parsed_url = urlparse(url)
+        if parsed_url.password or parsed_url.username not in (
+                None, "", "anonymous"):
+            return None
+
+        return "/vsicurl/ftp://%s%s" % (
+            parsed_url.netloc.rpartition("@")[2], 
+            path.join(parsed_url.path or "/", location)
+        )
 
 
     def list_files(self, url, location):
-        ftp, parsed_url = self._open(url)
+        with self._open(urlparse(url)) as ftp:
+            try:
+                return ftp.nlst(location)
+            except ftplib.error_perm, resp:
+                if str(resp).startswith("550"):
+                    return []
+                else:
+                    raise
+
+
+    def _open(self, parsed_url):
+        """ Returns a context manager for a logged in FTP connection to the
+            server of the given URL, taken from the process wide connection
+            pool.
+        """
+        key = ("ftp", parsed_url.hostname, parsed_url.port, parsed_url.username)
 
-        try:
-            return ftp.nlst(location)
-        except ftplib.error_perm, resp:
-            if str(resp).startswith("550"):
-                return []
-            else:
-                raise
-        finally:
-            ftp.quit()
+        def connect():
+            ftp = FTP()
+            ftp.connect(parsed_url.hostname, parsed_url.port)
+            # TODO: default username/password?
+            ftp.login(parsed_url.username, parsed_url.password)
+            return ftp
 
+        return get_connection_pool().connection(key, connect, _check, _quit)
+
+
+def _check(ftp):
+    ftp.voidcmd("NOOP")
+    return True
 
-    def _open(self, url):
-        parsed_url = urlparse(url)
-        ftp = FTP()
-        ftp.connect(parsed_url.hostname, parsed_url.port)
-        # TODO: default username/password?
-        ftp.login(parsed_url.username, parsed_url.password)
 
-        return ftp, parsed_url
+def _quit(ftp):
+    try:
+        ftp.quit()
+    except ftplib.all_errors:
+        ftp.close()
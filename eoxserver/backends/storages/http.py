@@ -26,11 +26,22 @@
 #-------------------------------------------------------------------------------
 
 
-from urllib import urlretrieve
-from urlparse import urljoin
+import select
+import socket
+import httplib
+from base64 import b64encode
+from urllib import unquote
+from urlparse import urljoin, urlparse
 
 from eoxserver.core import Component, implements
 from eoxserver.backends.interfaces import FileStorageInterface
+from eoxserver.backends.pool import get_connection_pool, resumable_retrieve
+
+
+# errors upon which an interrupted transfer is resumed
+RETRY_ERRORS = (httplib.HTTPException, socket.error)
+
+MAX_REDIRECTS = 5
 
 
 class HTTPStorage(Component):
@@ -39,8 +50,128 @@ class HTTPStorage(Component):
 
     name = "HTTP"
 
+    streaming = True
+
     def validate(self, url):
         pass
 
     def retrieve(self, url, location, path):
-        urlretrieve(urljoin(url, location), path)
+        """ Retrieves the file referenced by `location` via a pooled keep-alive
+            connection. Interrupted transfers are resumed with a ``Range`` 
+            request, if the server supports it.
+        """
+        file_url = urljoin(url, location)
+
+        def transfer(local_file, offset):
+            self._get(file_url, local_file, offset)
+
+        return resumable_retrieve(path, transfer, RETRY_ERRORS)
+
+    def get_vsi_path(self, url, location):
+        """ Returns the ``/vsicurl/`` path of the file referenced by 
+            `location`. Files on servers requiring a login are not read in 
+            place, as the credentials would be part of the path.
+        """
+        parsed_url = urlparse(url)
+        if parsed_url.username or parsed_url.password:
+            return None
+        return "/vsicurl/" + urljoin(url, location)
+
+    def _get(self, url, local_file, offset):
+        for _ in range(MAX_REDIRECTS + 1):
+            parsed_url = urlparse(url)
+            headers = {}
+            if offset:
+                headers["Range"] = "bytes=%d-" % offset
+            if parsed_url.username:
+                headers["Authorization"] = "Basic " + b64encode("%s:%s" % (
+                    unquote(parsed_url.username), 
+                    unquote(parsed_url.password or "")
+                ))
+
+            selector = parsed_url.path or "/"
+            if parsed_url.query:
+                selector += "?" + parsed_url.query
+
+            with self._open(parsed_url) as conn:
+                conn.request("GET", selector, headers=headers)
+                response = conn.getresponse()
+                status = response.status
+
+                if status in (301, 302, 303, 307, 308):
+                    location = response.getheader("location")
+                    response.read()
+                    if not location:
+                        raise IOError(
+                            "Redirect without location for '%s'." % url
+                        )
+                    url = urljoin(url, location)
+                    continue
+
+                elif status == 416 and offset:
+                    # the requested range starts at the end of the file, so 
+                    # the previous attempt already received the whole file
+                    response.read()
+                    return
+
+                elif status not in (200, 206):
+                    response.read()
+                    raise IOError(
+                        "Failed to retrieve '%s': HTTP error %d (%s)."
+                        % (url, status, response.reason)
+                    )
+
+                if status == 200 and offset:
+                    # the server does not support ranges: start over
+                    local_file.seek(0)
+                    local_file.truncate()
+
+                _copy(response, local_file)
+                return
+
+        raise IOError("Too many redirects for '%s'." % url)
+
+    def _open(self, parsed_url):
+        """ Returns a context manager for a connection to the server of the 
+            given URL, taken from the process wide connection pool.
+        """
+        key = (
+            parsed_url.scheme, parsed_url.hostname, parsed_url.port, 
+            parsed_url.username
+        )
+
+        def connect():
+            if parsed_url.scheme == "https":
+                return httplib.HTTPSConnection(
+                    parsed_url.hostname, parsed_url.port
+                )
+            return httplib.HTTPConnection(parsed_url.hostname, parsed_url.port)
+
+        return get_connection_pool().connection(key, connect, _check)
+
+
+def _check(conn):
+    """ Checks whether an idle connection is still open. A readable idle socket
+        means that the server closed the connection.
+    """
+    if conn.sock is None:
+        return False
+    readable, _, _ = select.select([conn.sock], [], [], 0)
+    return not readable
+
+
+def _copy(response, local_file, chunk_size=65536):
+    """ Copies the body of the response to the file and raises an 
+        :exc:`httplib.IncompleteRead` if the connection closed prematurely.
+    """
+    length = response.getheader("content-length")
+    received = 0
+    while True:
+        data = response.read(chunk_size)
+        if not data:
+            break
+        local_file.write(data)
+        received += len(data)
+
+    if length is not None and received < int(length):
+        raise httplib.IncompleteRead("", int(length) - received)
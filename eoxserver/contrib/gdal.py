@@ -34,12 +34,20 @@ all available drivers.
 """
 
 
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+
 try:
     from osgeo.gdal import *
 except ImportError:
     from gdal import *
 from django.utils.datastructures import SortedDict
 
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
+
 
 UseExceptions()
 AllRegister()
@@ -131,3 +139,148 @@ GDT_FLOAT_COMPLEX_TYPES = frozenset((GDT_CFloat32, GDT_CFloat64))
 GDT_COMPLEX_TYPES = frozenset(
     (GDT_CInt16, GDT_CInt32, GDT_CFloat32, GDT_CFloat64)
 )
+
+
+class DatasetPoolConfigReader(config.Reader):
+    section = "core.gdal"
+    dataset_pool_size = config.Option(type=int, default=16)
+    cache_max = config.Option(type=int, default=None)
+
+
+class DatasetPool(object):
+    """ A bounded pool of open, read-only GDAL datasets. Datasets are keyed by
+        their resolved path and the modification time of the file, so that 
+        changed files are opened anew. Each dataset is used by only one thread
+        at a time: it is checked out of the pool while in use. Idle datasets 
+        are closed in least recently used order when the pool is full.
+    """
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self._idle = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+        self._pid = os.getpid()
+
+
+    @contextmanager
+    def open(self, filename):
+        """ Context manager to check out a dataset for the given filename. The
+            dataset must not be modified and no reference to it shall be kept
+            after leaving the context. Files that are not on the local file 
+            system (e.g. ``/vsimem/``) are opened without pooling.
+        """
+        key = self._key(filename)
+        ds = self._checkout(key) if key else None
+        if ds is None:
+            ds = Open(filename)
+
+        try:
+            yield ds
+        finally:
+            if key:
+                self._checkin(key, ds)
+
+
+    def clear(self):
+        """ Closes all idle datasets.
+        """
+        with self._lock:
+            self._idle.clear()
+            self._size = 0
+
+
+    def _check_pid(self):
+        # datasets inherited from a parent process share its file 
+        # descriptors and must not be used in a forked process
+        if self._pid != os.getpid():
+            self._idle.clear()
+            self._size = 0
+            self._pid = os.getpid()
+
+
+    def _key(self, filename):
+        if self.max_size <= 0:
+            return None
+
+        try:
+            path = os.path.realpath(filename)
+            return path, os.stat(path).st_mtime
+        except (OSError, TypeError):
+            return None
+
+
+    def _checkout(self, key):
+        with self._lock:
+            self._check_pid()
+            datasets = self._idle.get(key)
+            if not datasets:
+                return None
+
+            ds = datasets.pop()
+            if not datasets:
+                del self._idle[key]
+            self._size -= 1
+            return ds
+
+
+    def _checkin(self, key, ds):
+        with self._lock:
+            self._check_pid()
+            # mark the key as most recently used
+            datasets = self._idle.pop(key, [])
+            datasets.append(ds)
+            self._idle[key] = datasets
+            self._size += 1
+
+            while self._size > self.max_size:
+                oldest_key, datasets = next(self._idle.iteritems())
+                datasets.pop(0)
+                if not datasets:
+                    del self._idle[oldest_key]
+                self._size -= 1
+
+
+_dataset_pool = None
+_dataset_pool_lock = Lock()
+
+
+def get_dataset_pool(config=None):
+    """ Returns the process-wide ``DatasetPool``. On first use, the pool size
+        and the size of the GDAL block cache are set from the configuration.
+    """
+    global _dataset_pool
+
+    if _dataset_pool is None:
+        with _dataset_pool_lock:
+            if _dataset_pool is None:
+                reader = DatasetPoolConfigReader(
+                    config or get_eoxserver_config()
+                )
+                if reader.cache_max is not None:
+                    SetCacheMax(reader.cache_max)
+                _dataset_pool = DatasetPool(reader.dataset_pool_size)
+
+    return _dataset_pool
+
+
+def open_pooled(filename):
+    """ Shorthand to check out a dataset from the process-wide dataset pool. 
+        To be used in a `with` statement.
+    """
+    return get_dataset_pool().open(filename)
+
+
+@contextmanager
+def config_options(options):
+    """ Context manager to temporarily set the given GDAL configuration 
+        options. The previous values are restored when leaving the context.
+    """
+    previous = dict((key, GetConfigOption(key)) for key in options)
+    for key, value in options.items():
+        SetConfigOption(key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            SetConfigOption(key, value)
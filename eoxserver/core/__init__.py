@@ -27,17 +27,27 @@
 #-------------------------------------------------------------------------------
 
 
+import os
+import sys
+import json
 import logging
 import threading
+import weakref
 
 from django.utils.importlib import import_module
 
+import eoxserver
 from eoxserver.core.component import (
     ComponentManager, ComponentMeta, Component, 
-    ExtensionPoint, UniqueExtensionPoint, implements
+    ExtensionPoint, UniqueExtensionPoint, implements, interface_name
 )
 from eoxserver.core.util.importtools import easy_import
 
+try:
+    from django.dispatch.saferef import BoundMethodWeakref as WeakMethod
+except ImportError:
+    WeakMethod = weakref.ReferenceType
+
 
 env = ComponentManager()
 logger = logging.getLogger(__name__)
@@ -52,6 +62,14 @@ def initialize():
         settings module. If a module path ends with '*' then all direct 
         submodules will be imported aswell and if it ends with '**' it means 
         that the import will be done recursively.
+
+        If the `COMPONENTS_MANIFEST` setting names a file, the plugins are not
+        imported here. The manifest records the modules implementing each 
+        interface and these are imported when an extension point of the 
+        interface is first queried. Modules connecting receivers to Django 
+        signals on import are recorded as well and are still imported here, 
+        as their receivers must not wait for the first use of a component. A 
+        missing or outdated manifest is written after importing all plugins.
     """
 
     global __is_initialized
@@ -65,9 +83,154 @@ def initialize():
 
         logger.info("Initializing EOxServer components.")
 
-        for plugin in getattr(settings, "COMPONENTS", ()):
+        components = list(getattr(settings, "COMPONENTS", ()))
+        manifest = getattr(settings, "COMPONENTS_MANIFEST", None)
+
+        if manifest:
+            deferred = read_manifest(manifest, components)
+            if deferred is not None:
+                logger.info("Deferring the import of components to their "
+                            "first use.")
+                interfaces, eager_modules = deferred
+                ComponentMeta._deferred = interfaces
+                for module in eager_modules:
+                    easy_import(module)
+                return
+
+            modules = set(sys.modules)
+            receivers = signal_receivers()
+
+        for plugin in components:
             easy_import(plugin)
 
+        if manifest:
+            write_manifest(
+                manifest, components, 
+                [name for name in sys.modules if name not in modules],
+                set(
+                    module for key, module in signal_receivers().items()
+                    if key not in receivers
+                )
+            )
+
+
+def read_manifest(filename, components):
+    """ Read the component manifest and return the mapping of interface names
+        to the modules implementing them and the list of modules to be 
+        imported eagerly. Returns `None` if the manifest does not exist, was 
+        written for other plugins or another EOxServer version, or if any of 
+        the imported source files or packages changed since.
+    """
+
+    try:
+        with open(filename) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if (manifest.get("version") != eoxserver.get_version() 
+            or manifest.get("components") != components):
+        logger.info("The component manifest '%s' is outdated." % filename)
+        return None
+
+    for path, mtime in manifest.get("sources", {}).items():
+        try:
+            if os.path.getmtime(path) != mtime:
+                raise OSError
+        except OSError:
+            logger.info("The component manifest '%s' is outdated, '%s' "
+                        "changed." % (filename, path))
+            return None
+
+    return dict(
+        (str(name), [str(module) for module in modules])
+        for name, modules in manifest["interfaces"].items()
+    ), [str(module) for module in manifest.get("eager", ())]
+
+
+def write_manifest(filename, components, modules=(), eager_modules=()):
+    """ Write the manifest of the modules implementing each interface from the
+        currently registered components. The modification times of the 
+        source files of the given imported modules, and of the directories of 
+        packages, are recorded to detect changes of the code. Modules in 
+        `eager_modules` are imported on initialization even when the manifest 
+        is used.
+    """
+
+    interfaces = {}
+    for interface, classes in ComponentMeta._registry.items():
+        implementing = interfaces.setdefault(interface_name(interface), [])
+        for cls in classes:
+            if cls.__module__ not in implementing:
+                implementing.append(cls.__module__)
+
+    manifest = {
+        "version": eoxserver.get_version(),
+        "components": components,
+        "interfaces": interfaces,
+        "eager": sorted(eager_modules),
+        "sources": source_mtimes(modules)
+    }
+
+    # write to a temporary file first, as several processes may initialize 
+    # concurrently
+    tmp_filename = "%s.%d" % (filename, os.getpid())
+    try:
+        with open(tmp_filename, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.rename(tmp_filename, filename)
+        logger.info("Wrote the component manifest '%s'." % filename)
+    except (IOError, OSError):
+        logger.warning("Failed to write the component manifest '%s'." 
+                       % filename)
+
+
+def source_mtimes(modules):
+    """ Returns a dict mapping the source files of the given modules to their
+        modification times. For packages, the modification time of the 
+        directory is included as well, as it changes when submodules are 
+        added or removed.
+    """
+    mtimes = {}
+    for name in modules:
+        module = sys.modules.get(name)
+        filename = getattr(module, "__file__", None)
+        if not filename:
+            continue
+
+        if filename.endswith((".pyc", ".pyo")) and \
+                os.path.exists(filename[:-1]):
+            filename = filename[:-1]
+        paths = [filename]
+        if hasattr(module, "__path__"):
+            paths.append(os.path.dirname(filename))
+
+        for path in paths:
+            try:
+                mtimes[os.path.abspath(path)] = os.path.getmtime(path)
+            except OSError:
+                pass
+    return mtimes
+
+
+def signal_receivers():
+    """ Returns a dict mapping the keys of all receivers connected to the 
+        Django request and model signals to the modules they were defined in.
+    """
+    from django.core import signals as request_signals
+    from django.db.models import signals as model_signals
+
+    receivers = {}
+    for signals in (request_signals, model_signals):
+        for signal in vars(signals).values():
+            for key, receiver in getattr(signal, "receivers", ()):
+                if isinstance(receiver, (weakref.ReferenceType, WeakMethod)):
+                    receiver = receiver()
+                module = getattr(receiver, "__module__", None)
+                if module and module != "__main__":
+                    receivers[id(signal), key] = module
+    return receivers
+
 
 def reset():
     """ Reset the EOxServer plugin system.
@@ -83,5 +246,7 @@ def reset():
         logger.info("Resetting EOxServer components.")
         ComponentMeta._registry = {}
         ComponentMeta._components = []
+        ComponentMeta._deferred = {}
+        ComponentMeta._generation += 1
 
         initialize()
@@ -19,6 +19,13 @@
 __all__ = ['Component', 'ExtensionPoint', 'UniqueExtensionPoint', 'implements', 
            'Interface', 'ComponentException', 'ComponentManager']
 
+import logging
+from importlib import import_module
+from threading import RLock
+
+
+logger = logging.getLogger(__name__)
+
 
 def N_(string):
     """No-op translation marker, inlined here to avoid importing from
@@ -53,6 +60,7 @@ class ExtensionPoint(property):
         """Return a list of components that declare to implement the
         extension point interface.
         """
+        load_deferred(self.interface)
         classes = ComponentMeta._registry.get(self.interface, ())
         components = [component.compmgr[cls] for cls in classes]
         return [c for c in components if c]
@@ -88,10 +96,17 @@ class UniqueExtensionPoint(ExtensionPoint):
 class ComponentMeta(type):
     """Meta class for components.
 
-    Takes care of component and extension point registration.
+    Takes care of component and extension point registration. The 
+    `_generation` counter is increased whenever the registry changes, so that
+    information derived from it can be cached. `_deferred` maps interface
+    names to the modules of components implementing them which have not been
+    imported yet (see :func:`load_deferred`).
     """
     _components = []
     _registry = {}
+    _generation = 0
+    _deferred = {}
+    _deferred_lock = RLock()
 
     def __new__(mcs, name, bases, d):
         """Create the component class."""
@@ -112,6 +127,7 @@ class ComponentMeta(type):
                 classes = registry.setdefault(interface, [])
                 if new_class not in classes:
                     classes.append(new_class)
+        ComponentMeta._generation += 1
 
         return new_class
 
@@ -143,6 +159,39 @@ class ComponentMeta(type):
         return self
 
 
+def interface_name(interface):
+    """Return the qualified name of an interface class."""
+    return "%s.%s" % (interface.__module__, interface.__name__)
+
+
+def load_deferred(interface):
+    """Import the deferred modules of components implementing the given
+    interface. This is done once, when the extension point of the interface 
+    is first queried.
+    """
+    if not ComponentMeta._deferred:
+        return
+
+    name = interface_name(interface)
+    if name not in ComponentMeta._deferred:
+        return
+
+    with ComponentMeta._deferred_lock:
+        # the entry is removed only after all modules were imported, so that
+        # concurrent queries wait for the complete registry
+        modules = ComponentMeta._deferred.get(name)
+        if modules is None:
+            return
+
+        for module in modules:
+            try:
+                import_module(module)
+                logger.debug("Imported module '%s'." % module)
+            except ImportError:
+                logger.exception("Failed to import module '%s'." % module)
+        ComponentMeta._deferred.pop(name, None)
+
+
 class Component(object):
     """Base class for components.
 
@@ -225,6 +274,7 @@ class ComponentManager(object):
             component = component.__class__
         self.enabled[component] = False
         self.components[component] = None
+        ComponentMeta._generation += 1
 
     def component_activated(self, component):
         """Can be overridden by sub-classes so that special
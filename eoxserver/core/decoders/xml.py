@@ -55,19 +55,26 @@ class Parameter(BaseParameter):
         return self._locator or str(self.selector)
 
 
+def parse(data):
+    """ Parses an XML document and returns its root element."""
+    try:
+        return etree.fromstring(data)
+    except etree.XMLSyntaxError as exc:
+        # NOTE: lxml.etree.XMLSyntaxError is incorretly identified as
+        #       an OWS exception by the exception handler leading
+        #       to a wrong OWS error response.  This exception thus
+        #       must be cought and replaced by another exception
+        #       of a different type.
+        raise ValueError("Malformed XML document! %s"%(exc))
+
+
 class Decoder(object):
-    """ Base class for XML Decoders."""
+    """ Base class for XML Decoders. Accepts either the XML document as a 
+        string or an already parsed element tree, which allows several 
+        decoders to share a single parsed document."""
     namespaces = {}
 
     def __init__(self, tree):
         if isinstance(tree, basestring):
-            try:
-                tree = etree.fromstring(tree)
-            except etree.XMLSyntaxError as exc:
-                # NOTE: lxml.etree.XMLSyntaxError is incorretly identified as
-                #       an OWS exception by the exception handler leading
-                #       to a wrong OWS error response.  This exception thus
-                #       must be cought and replaced by another exception
-                #       of a different type.
-                raise ValueError("Malformed XML document! %s"%(exc))
+            tree = parse(tree)
         self._tree = tree
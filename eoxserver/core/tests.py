@@ -28,5 +28,235 @@
 #-------------------------------------------------------------------------------
 
 import logging
+import os
+import sys
+import json
+import shutil
+import tempfile
+from textwrap import dedent
 
 from django.test import TestCase
+
+from eoxserver import core
+from eoxserver.core.component import ComponentMeta, ComponentManager
+from eoxserver.contrib import gdal
+
+
+class ComponentManifestTestCase(TestCase):
+    interfaces_module = "eoxs_manifest_test_interfaces"
+    components_module = "eoxs_manifest_test_components"
+    interface = "eoxs_manifest_test_interfaces.ManifestTestInterface"
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manifest = os.path.join(self.directory, "components.json")
+        self.components = [self.interfaces_module, self.components_module]
+        self.write_module(self.interfaces_module, """\
+            from eoxserver.core import Component, ExtensionPoint
+
+            class ManifestTestInterface(object):
+                pass
+
+            class ManifestTestConsumer(Component):
+                extensions = ExtensionPoint(ManifestTestInterface)
+        """)
+        self.write_module(self.components_module, """\
+            from eoxserver.core import Component, implements
+            from eoxs_manifest_test_interfaces import ManifestTestInterface
+
+            class ManifestTestComponent(Component):
+                implements(ManifestTestInterface)
+        """)
+        sys.path.insert(0, self.directory)
+
+        self.registry = dict(
+            (interface, list(classes))
+            for interface, classes in ComponentMeta._registry.items()
+        )
+        self.registered = list(ComponentMeta._components)
+        self.deferred = ComponentMeta._deferred
+
+    def tearDown(self):
+        self.unload()
+        ComponentMeta._deferred = self.deferred
+        setattr(core, "__is_initialized", True)
+        sys.path.remove(self.directory)
+        shutil.rmtree(self.directory)
+
+    def write_module(self, name, source):
+        with open(os.path.join(self.directory, name + ".py"), "w") as f:
+            f.write(dedent(source))
+
+    def unload(self):
+        for name in self.components:
+            sys.modules.pop(name, None)
+        ComponentMeta._registry = dict(
+            (interface, list(classes))
+            for interface, classes in self.registry.items()
+        )
+        ComponentMeta._components = list(self.registered)
+        ComponentMeta._generation += 1
+
+    def initialize(self):
+        setattr(core, "__is_initialized", False)
+        with self.settings(COMPONENTS=self.components,
+                           COMPONENTS_MANIFEST=self.manifest):
+            core.initialize()
+
+    def test_first_run(self):
+        self.assertFalse(os.path.exists(self.manifest))
+        self.initialize()
+        self.assertIn(self.components_module, sys.modules)
+
+        with open(self.manifest) as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest["components"], self.components)
+        self.assertEqual(
+            manifest["interfaces"][self.interface], [self.components_module]
+        )
+        for name in self.components:
+            self.assertIn(
+                os.path.join(self.directory, name + ".py"), manifest["sources"]
+            )
+
+    def test_outdated(self):
+        self.initialize()
+        self.assertIsNotNone(
+            core.read_manifest(self.manifest, self.components)
+        )
+
+        # the manifest was written for other plugins
+        self.assertIsNone(
+            core.read_manifest(self.manifest, self.components[:1])
+        )
+
+        # the manifest was written by another version
+        with open(self.manifest) as f:
+            manifest = json.load(f)
+        with open(self.manifest, "w") as f:
+            json.dump(dict(manifest, version="0.0"), f)
+        self.assertIsNone(core.read_manifest(self.manifest, self.components))
+
+        # a source file changed
+        with open(self.manifest, "w") as f:
+            json.dump(manifest, f)
+        os.utime(
+            os.path.join(self.directory, self.components_module + ".py"), 
+            (0, 0)
+        )
+        self.assertIsNone(core.read_manifest(self.manifest, self.components))
+
+        # an outdated manifest is written again
+        self.unload()
+        self.initialize()
+        self.assertIsNotNone(
+            core.read_manifest(self.manifest, self.components)
+        )
+
+    def test_invalid(self):
+        self.assertIsNone(core.read_manifest(self.manifest, self.components))
+        with open(self.manifest, "w") as f:
+            f.write("{")
+        self.assertIsNone(core.read_manifest(self.manifest, self.components))
+
+    def test_deferred(self):
+        self.initialize()
+        self.unload()
+
+        # the components are not imported when the manifest is used
+        self.initialize()
+        self.assertNotIn(self.components_module, sys.modules)
+        self.assertIn(self.interface, ComponentMeta._deferred)
+
+        from eoxs_manifest_test_interfaces import ManifestTestConsumer
+        generation = ComponentMeta._generation
+
+        # but on the first query of an extension point of their interface
+        extensions = ManifestTestConsumer(ComponentManager()).extensions
+        self.assertEqual(
+            [type(extension).__name__ for extension in extensions], 
+            ["ManifestTestComponent"]
+        )
+        self.assertIn(self.components_module, sys.modules)
+        self.assertNotIn(self.interface, ComponentMeta._deferred)
+        self.assertTrue(ComponentMeta._generation > generation)
+
+
+class DatasetPoolTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = gdal.DatasetPool(2)
+
+    def tearDown(self):
+        self.pool.clear()
+        shutil.rmtree(self.directory)
+
+    def create(self, name):
+        filename = os.path.join(self.directory, name)
+        driver = gdal.GetDriverByName("GTiff")
+        driver.Create(filename, 1, 1, 1)
+        return filename
+
+    def test_reuse(self):
+        filename = self.create("a.tif")
+        with self.pool.open(filename) as ds:
+            first = ds
+        with self.pool.open(filename) as ds:
+            self.assertIs(ds, first)
+
+    def test_checkout(self):
+        filename = self.create("a.tif")
+        with self.pool.open(filename) as ds1:
+            # a dataset is used by one thread at a time
+            with self.pool.open(filename) as ds2:
+                self.assertIsNot(ds1, ds2)
+            with self.pool.open(filename) as ds3:
+                self.assertIs(ds3, ds2)
+
+        self.assertEqual(self.pool._size, 2)
+
+    def test_lru(self):
+        a, b, c = [self.create(name) for name in ("a.tif", "b.tif", "c.tif")]
+        for filename in (a, b, a, c):
+            with self.pool.open(filename):
+                pass
+
+        self.assertEqual(
+            [path for path, _ in self.pool._idle.keys()], 
+            [os.path.realpath(a), os.path.realpath(c)]
+        )
+
+    def test_modified(self):
+        filename = self.create("a.tif")
+        with self.pool.open(filename) as ds:
+            first = ds
+
+        os.utime(filename, (0, 0))
+        with self.pool.open(filename) as ds:
+            self.assertIsNot(ds, first)
+
+    def test_fork(self):
+        filename = self.create("a.tif")
+        with self.pool.open(filename) as ds:
+            first = ds
+
+        # pretend to be in a forked child process
+        self.pool._pid = -1
+        with self.pool.open(filename) as ds:
+            self.assertIsNot(ds, first)
+        self.assertEqual(self.pool._size, 1)
+
+    def test_unpooled(self):
+        filename = "/vsimem/%s.tif" % id(self)
+        gdal.GetDriverByName("GTiff").Create(filename, 1, 1, 1)
+        try:
+            with self.pool.open(filename) as ds:
+                self.assertEqual(ds.RasterXSize, 1)
+            self.assertEqual(self.pool._size, 0)
+        finally:
+            gdal.Unlink(filename)
+
+        pool = gdal.DatasetPool(0)
+        with pool.open(self.create("a.tif")):
+            pass
+        self.assertEqual(pool._size, 0)
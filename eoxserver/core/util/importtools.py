@@ -66,7 +66,7 @@ def import_modules(base_module_path):
     for loader, module_name, is_pkg in pkgutil.iter_modules(path):
         full_path = "%s.%s" % (base_module_path, module_name)
         try:
-            loader.find_module(module_name).load_module(module_name)
+            import_module(full_path)
             logger.debug("Imported module '%s'." % full_path)
         except ImportError:
             logger.error("Failed to import module '%s'." % full_path)
@@ -78,10 +78,10 @@ def import_recursive(base_module_path):
     """
 
     path = import_module(base_module_path).__path__
-    for loader, module_name, is_pkg in pkgutil.walk_packages(path):
-        full_path = "%s.%s" % (base_module_path, module_name)
+    prefix = base_module_path + "."
+    for loader, full_path, is_pkg in pkgutil.walk_packages(path, prefix):
         try:
-            loader.find_module(module_name).load_module(module_name)
+            import_module(full_path)
             logger.debug("Imported module '%s'." % full_path)
         except ImportError:
             logger.error("Failed to import module '%s'." % full_path)
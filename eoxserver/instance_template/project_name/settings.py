@@ -223,6 +223,14 @@ COMPONENTS = (
     'eoxserver.services.mapserver.**',
 )
 
+# Optional manifest of the modules implementing each component interface. When
+# set, the modules of the COMPONENTS are not all imported on startup, but only 
+# when a component of one of their interfaces is first required. Modules 
+# connecting signal receivers are still imported on startup. The manifest is 
+# (re-)generated automatically when missing or outdated, i.e. when the settings,
+# the EOxServer version or any of the imported source files changed.
+#COMPONENTS_MANIFEST = join(PROJECT_DIR, 'data/components.json')
+
 
 # A sample logging configuration. The only tangible logging
 # performed by this configuration is to send an email to
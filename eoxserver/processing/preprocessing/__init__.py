@@ -38,7 +38,7 @@ from django.contrib.gis.gdal.geometries import OGRGeometry
 from eoxserver.contrib import  gdal, ogr, osr 
 from eoxserver.core.util.xmltools import XMLEncoder
 from eoxserver.processing.preprocessing.util import (
-    create_mem, create_mem_copy, copy_projection
+    create_vrt_copy, DatasetFactory
 )
 from eoxserver.processing.preprocessing.optimization import (
     BandSelectionOptimization, ColorIndexOptimization, NoDataValueOptimization,
@@ -81,12 +81,19 @@ class NativeMetadataFormatEncoder(XMLEncoder):
 # enum for bandmode
 RGB, RGBA, ORIG_BANDS = range(3)
 
+# default memory budget for intermediate datasets and processing windows
+DEFAULT_WINDOW_BUDGET = 64 * 1024 * 1024
+
 #===============================================================================
 # Pre-Processors
 #===============================================================================
 
 class PreProcessor(object):
-    """
+    """ Base class for pre-processors. The raster data is processed in windows
+        and intermediate datasets exceeding the `window_budget` (in bytes) are
+        stored in temporary files, so that the memory consumption does not
+        depend on the size of the input. Steps that support multithreading
+        (warping, overview computation) use `num_threads` threads.
     """
     
     force = False
@@ -96,7 +103,9 @@ class PreProcessor(object):
                  color_index=False, palette_file=None, no_data_value=None,
                  overview_resampling=None, overview_levels=None, 
                  overview_minsize=None, radiometric_interval_min=None, 
-                 radiometric_interval_max=None, simplification_factor=None):
+                 radiometric_interval_max=None, simplification_factor=None,
+                 window_budget=None, num_threads=None,
+                 footprint_decimation=None):
         
         self.format_selection = format_selection
         self.overviews = overviews
@@ -120,59 +129,40 @@ class PreProcessor(object):
         else:
             # default 2 * resolution == 2 pixels
             self.simplification_factor = 2
+
+        if window_budget is not None:
+            self.window_budget = window_budget
+        else:
+            self.window_budget = DEFAULT_WINDOW_BUDGET
+
+        self.num_threads = num_threads
+        self.footprint_decimation = footprint_decimation
         
     
     def process(self, input_filename, output_filename, 
                 geo_reference=None, generate_metadata=True):
         
-        # open the dataset and create an In-Memory Dataset as copy
-        # to perform optimizations
-        ds = create_mem_copy(gdal.Open(input_filename))
-        
-        gt = ds.GetGeoTransform()
-        footprint_wkt = None
-        
-        if not geo_reference:
-            if gt == (0.0, 1.0, 0.0, 0.0, 0.0, 1.0): # TODO: maybe use a better check
-                raise ValueError("No geospatial reference for unreferenced "
-                                 "dataset given.")
-        else:
-            logger.debug("Applying geo reference '%s'."
-                         % type(geo_reference).__name__)
-            ds, footprint_wkt = geo_reference.apply(ds)
-        
-        # apply optimizations
-        for optimization in self.get_optimizations(ds):
-            logger.debug("Applying optimization '%s'."
-                         % type(optimization).__name__)
-            new_ds = optimization(ds)
-            ds = None
-            ds = new_ds
+        factory = DatasetFactory(self.window_budget)
+        try:
+            ds, footprint_wkt = self._process(
+                factory, input_filename, geo_reference
+            )
             
-        # generate the footprint from the dataset
-        if not footprint_wkt:
-            logger.debug("Generating footprint.")
-            footprint_wkt = self._generate_footprint_wkt(ds)
-        
-        
-        if self.footprint_alpha:
-            logger.debug("Applying optimization 'AlphaBandOptimization'.")
-            opt = AlphaBandOptimization()
-            opt(ds, footprint_wkt)
-        
-        
-        output_filename = self.generate_filename(output_filename)
-        
-        logger.debug("Writing file to disc using options: %s."
-                     % ", ".join(self.format_selection.creation_options))
-        
-        logger.debug("Metadata tags to be written: %s"
-                     % ", ".join(ds.GetMetadata_List("") or []))
-        
-        # save the file to the disc
-        driver = gdal.GetDriverByName(self.format_selection.driver_name)
-        ds = driver.CreateCopy(output_filename, ds,
-                               options=self.format_selection.creation_options)
+            output_filename = self.generate_filename(output_filename)
+            
+            logger.debug("Writing file to disc using options: %s."
+                         % ", ".join(self.format_selection.creation_options))
+            
+            logger.debug("Metadata tags to be written: %s"
+                         % ", ".join(ds.GetMetadata_List("") or []))
+            
+            # save the file to the disc. the driver copies the dataset block
+            # by block, evaluating virtual datasets only window-wise
+            driver = gdal.GetDriverByName(self.format_selection.driver_name)
+            ds = driver.CreateCopy(output_filename, ds,
+                                   options=self.format_selection.creation_options)
+        finally:
+            factory.close()
         
         for optimization in self.get_post_optimizations(ds):
             logger.debug("Applying post-optimization '%s'."
@@ -225,39 +215,111 @@ class PreProcessor(object):
         return PreProcessResult(output_filename, footprint, num_bands)
     
     
+    def _process(self, factory, input_filename, geo_reference):
+        """ Apply the geo reference and the optimizations to the input. Returns
+            the resulting dataset and its footprint WKT.
+        """
+        # open the dataset and create a virtual copy to perform the 
+        # optimizations on, without loading the pixel data. Each input is 
+        # opened only once, so the dataset pool (which requires a configured
+        # instance) is not used
+        src_ds = factory.keep(gdal.Open(input_filename))
+        ds = factory.keep(create_vrt_copy(src_ds))
+        
+        gt = ds.GetGeoTransform()
+        footprint_wkt = None
+        
+        if not geo_reference:
+            if gt == (0.0, 1.0, 0.0, 0.0, 0.0, 1.0): # TODO: maybe use a better check
+                raise ValueError("No geospatial reference for unreferenced "
+                                 "dataset given.")
+        else:
+            logger.debug("Applying geo reference '%s'."
+                         % type(geo_reference).__name__)
+            ds, footprint_wkt = geo_reference.apply(ds, factory)
+        
+        # apply optimizations
+        for optimization in self.get_optimizations(ds):
+            logger.debug("Applying optimization '%s'."
+                         % type(optimization).__name__)
+            ds = optimization(ds, factory)
+            
+        # generate the footprint from the dataset
+        if not footprint_wkt:
+            logger.debug("Generating footprint.")
+            footprint_wkt = self._generate_footprint_wkt(ds, factory)
+        
+        if self.footprint_alpha:
+            logger.debug("Applying optimization 'AlphaBandOptimization'.")
+            if ds.RasterCount in (3, 4):
+                # the alpha band is rendered into a writable copy
+                ds = factory.copy(ds, 4)
+            opt = AlphaBandOptimization()
+            opt(ds, footprint_wkt)
+        
+        return ds, footprint_wkt
+    
+    
     def generate_filename(self, filename):
         """ Adjust the filename with the correct extension. """
         base_filename, _ = splitext(filename)
         return base_filename + self.format_selection.extension 
     
     
-    def _generate_footprint_wkt(self, ds):
+    def get_footprint_decimation(self):
+        """ Returns the factor the raster is decimated by to extract the 
+            footprint. As the footprint is simplified with a tolerance of
+            `simplification_factor` pixels anyway, the mask is computed with
+            pixels of that size, unless a `footprint_decimation` was given.
+        """
+        if self.footprint_decimation is not None:
+            return max(1, int(self.footprint_decimation))
+        return max(1, int(self.simplification_factor))
+    
+    
+    def _generate_footprint_wkt(self, ds, factory=None):
         """ Generate a fooptrint from a raster, using black/no-data as exclusion
         """
+        factory = factory or DatasetFactory()
+        decimation = self.get_footprint_decimation()
+        size_x = -(-ds.RasterXSize // decimation)
+        size_y = -(-ds.RasterYSize // decimation)
+        
+        # create a temporary dataset with the decimated resolution to write
+        # the nodata mask into its single band
+        tmp_ds = factory.create(size_x + 2, size_y + 2, 1, gdal.GDT_Byte)
+        gt = ds.GetGeoTransform()
+        tmp_ds.SetProjection(ds.GetProjection())
+        tmp_ds.SetGeoTransform([
+            gt[0], gt[1] * decimation, gt[2] * decimation,
+            gt[3], gt[4] * decimation, gt[5] * decimation
+        ])
+        tmp_band = tmp_ds.GetRasterBand(1)
         
-        # create an empty boolean array initialized as 'False' to store where
-        # values exist as a mask array.
-        nodata_map = numpy.zeros((ds.RasterYSize, ds.RasterXSize),
-                                 dtype=numpy.bool)
+        bands = [
+            ds.GetRasterBand(idx) for idx in range(1, ds.RasterCount + 1)
+        ]
+        nodata_values = [band.GetNoDataValue() or 0 for band in bands]
         
-        for idx in range(1, ds.RasterCount + 1):
-            band = ds.GetRasterBand(idx)
-            raster_data = band.ReadAsArray()
-            nodata = band.GetNoDataValue()
+        for xoff, yoff, xsize, ysize in factory.windows(ds, decimation):
+            buf_xsize = -(-xsize // decimation)
+            buf_ysize = -(-ysize // decimation)
             
-            if nodata is None:
-                nodata = 0
+            # the mask array of where values exist. the bands are read 
+            # decimated, using overviews where available
+            nodata_map = numpy.zeros((buf_ysize, buf_xsize), dtype=numpy.bool)
+            for band, nodata in zip(bands, nodata_values):
+                raster_data = band.ReadAsArray(
+                    xoff, yoff, xsize, ysize, buf_xsize, buf_ysize
+                )
+                numpy.logical_or(
+                    nodata_map, raster_data != nodata, out=nodata_map
+                )
             
-            # apply the output to the map  
-            nodata_map |= (raster_data != nodata)
-        
-        # create a temporary in-memory dataset and write the nodata mask 
-        # into its single band
-        tmp_ds = create_mem(ds.RasterXSize + 2, ds.RasterYSize + 2, 1, 
-                            gdal.GDT_Byte)
-        copy_projection(ds, tmp_ds)
-        tmp_band = tmp_ds.GetRasterBand(1)
-        tmp_band.WriteArray(nodata_map.astype(numpy.uint8))
+            tmp_band.WriteArray(
+                nodata_map.view(numpy.uint8), xoff // decimation, 
+                yoff // decimation
+            )
         
         # create an OGR in memory layer to hold the created polygon
         sr = osr.SpatialReference(); sr.ImportFromWkt(ds.GetProjectionRef())
@@ -322,7 +384,7 @@ class WMSPreProcessor(PreProcessor):
 
     def get_optimizations(self, ds):
         if self.crs:
-            yield ReprojectionOptimization(self.crs)
+            yield ReprojectionOptimization(self.crs, self.num_threads)
         
         
         if self.bandmode not in (RGB, RGBA, ORIG_BANDS):
@@ -387,7 +449,8 @@ class WMSPreProcessor(PreProcessor):
         if self.overviews:
             yield OverviewOptimization(self.overview_resampling,
                                        self.overview_levels,
-                                       self.overview_minsize)
+                                       self.overview_minsize,
+                                       self.num_threads)
 
 
 #===============================================================================
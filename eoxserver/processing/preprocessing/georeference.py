@@ -31,7 +31,7 @@ import logging
 from eoxserver.contrib import gdal, ogr, osr
 from eoxserver.processing.gdal import reftools as rt 
 from eoxserver.processing.preprocessing.util import (
-    create_mem, copy_metadata
+    copy_metadata, DatasetFactory
 )
 from eoxserver.processing.preprocessing.exceptions import GCPTransformException
 
@@ -56,7 +56,7 @@ class Extent(GeographicReference):
         self.srid = srid
     
     
-    def apply(self, ds):
+    def apply(self, ds, factory=None):
         """ Set the geotransform and projection of the dataset according to 
             the defined extent and SRID.
         """
@@ -91,7 +91,9 @@ class GCPList(GeographicReference):
         self.srid = srid
     
         
-    def apply(self, src_ds):
+    def apply(self, src_ds, factory=None):
+        factory = factory or DatasetFactory()
+
         # setup
         dst_sr = osr.SpatialReference()
         gcp_sr = osr.SpatialReference()
@@ -137,9 +139,9 @@ class GCPList(GeographicReference):
                     logger.debug("New size is '%i x %i'" % (size_x, size_y))
                     
                     # create the output dataset
-                    dst_ds = create_mem(size_x, size_y,
-                                        src_ds.RasterCount, 
-                                        src_ds.GetRasterBand(1).DataType)
+                    dst_ds = factory.create(size_x, size_y,
+                                            src_ds.RasterCount, 
+                                            src_ds.GetRasterBand(1).DataType)
                     
                     # reproject the image
                     dst_ds.SetProjection(dst_sr.ExportToWkt())
@@ -32,7 +32,7 @@ import numpy
 
 from eoxserver.contrib import gdal, gdal_array, osr, ogr
 from eoxserver.processing.preprocessing.util import ( 
-    get_limits, create_mem, copy_metadata, copy_projection
+    get_limits, copy_metadata, copy_projection, DatasetFactory
 )
 from eoxserver.resources.coverages.crss import (
     parseEPSGCode, fromShortCode, fromURL, fromURN, fromProj4Str
@@ -48,19 +48,21 @@ logger = logging.getLogger(__name__)
 class DatasetOptimization(object):
     """ Abstract base class for dataset optimization steps. Each optimization
         step shall be callable and return the dataset or a copy thereof if 
-        necessary.
+        necessary. Copies shall be created using the optionally passed 
+        :class:`DatasetFactory <eoxserver.processing.preprocessing.util.DatasetFactory>`.
     """
     
-    def __call__(self, ds):
+    def __call__(self, ds, factory=None):
         raise NotImplementedError
 
 
 class ReprojectionOptimization(DatasetOptimization):
     """ Dataset optimization step to reproject the dataset into a predefined
-        projection identified by an SRID.
+        projection identified by an SRID. With `num_threads` the warping is
+        distributed to multiple threads.
     """
 
-    def __init__(self, crs_or_srid):
+    def __init__(self, crs_or_srid, num_threads=None):
         if isinstance(crs_or_srid, int):
             pass
         elif isinstance(crs_or_srid, basestring):
@@ -71,9 +73,12 @@ class ReprojectionOptimization(DatasetOptimization):
                              type(crs_or_srid).__name__)
         
         self.srid = crs_or_srid
+        self.num_threads = num_threads
 
         
-    def __call__(self, src_ds):
+    def __call__(self, src_ds, factory=None):
+        factory = factory or DatasetFactory()
+
         # setup
         src_sr = osr.SpatialReference()
         src_sr.ImportFromWkt(src_ds.GetProjection())
@@ -91,19 +96,20 @@ class ReprojectionOptimization(DatasetOptimization):
                                           gdal.GRA_Bilinear, 0.125)
         
         # create the output dataset
-        dst_ds = create_mem(tmp_ds.RasterXSize, tmp_ds.RasterYSize,
-                            src_ds.RasterCount, 
-                            src_ds.GetRasterBand(1).DataType)
+        dst_ds = factory.create(tmp_ds.RasterXSize, tmp_ds.RasterYSize,
+                                src_ds.RasterCount, 
+                                src_ds.GetRasterBand(1).DataType)
         
         
         # reproject the image
         dst_ds.SetProjection(dst_sr.ExportToWkt())
         dst_ds.SetGeoTransform(tmp_ds.GetGeoTransform())
         
-        gdal.ReprojectImage(src_ds, dst_ds,
-                            src_sr.ExportToWkt(),
-                            dst_sr.ExportToWkt(),
-                            gdal.GRA_Bilinear)
+        with gdal.config_options(_threading_options(self.num_threads)):
+            gdal.ReprojectImage(src_ds, dst_ds,
+                                src_sr.ExportToWkt(),
+                                dst_sr.ExportToWkt(),
+                                gdal.GRA_Bilinear)
         
         tmp_ds = None
         
@@ -125,62 +131,60 @@ class BandSelectionOptimization(DatasetOptimization):
                          bands)
         self.datatype = datatype
         
-    def __call__(self, src_ds):
-        dst_ds = create_mem(src_ds.RasterXSize, src_ds.RasterYSize, 
-                            len(self.bands), self.datatype)
+    def __call__(self, src_ds, factory=None):
+        factory = factory or DatasetFactory()
+        dst_ds = factory.create(src_ds.RasterXSize, src_ds.RasterYSize, 
+                                len(self.bands), self.datatype)
         dst_range = get_limits(self.datatype)
         
-        multiple = 0
-        
+        # collect the distinct source bands with their scales and the indices
+        # of the bands they are written to
+        selections = []
         for dst_index, (src_index, dmin, dmax) in enumerate(self.bands, 1):
-            # check if next band is equal
-            if dst_index < len(self.bands) and (src_index, dmin, dmax) == self.bands[dst_index]:
-                multiple += 1
+            # unavailable bands and band 0 stay initialized with zeros
+            if src_index == 0 or src_index > src_ds.RasterCount:
                 continue
-            # check that src band is available
-            if src_index > src_ds.RasterCount:
-                continue
-            
-            # initialize with zeros if band is 0
-            if src_index == 0:
-                src_band = src_ds.GetRasterBand(1)
-                data = numpy.zeros((src_band.YSize, src_band.XSize), dtype=gdal_array.codes[self.datatype])
-                src_min, src_max = (0, 0)
-            # use src_ds band otherwise
+
+            for selection in selections:
+                if selection[0] == (src_index, dmin, dmax):
+                    selection[-1].append(dst_index)
+                    break
             else:
                 src_band = src_ds.GetRasterBand(src_index)
-                data = src_band.ReadAsArray()
-                src_min, src_max = src_band.ComputeRasterMinMax()
-            
-            # get min/max values or calculate from band
-            if dmin is None:
-                dmin = get_limits(src_band.DataType)[0]
-            elif dmin == "min":
-                dmin = src_min
-            if dmax is None:
-                dmax = get_limits(src_band.DataType)[1]
-            elif dmax == "max":
-                dmax = src_max
-            src_range = (float(dmin), float(dmax))
-            
-            # perform clipping and scaling
-            data = ((dst_range[1] - dst_range[0]) * 
-                    ((numpy.clip(data, dmin, dmax) - src_range[0]) / 
-                    (src_range[1] - src_range[0])))
-            
-            # set new datatype
-            data = data.astype(gdal_array.codes[self.datatype])
-            
-            # write result
-            dst_band = dst_ds.GetRasterBand(dst_index)
-            dst_band.WriteArray(data)
-            
-            # write equal bands at once
-            if multiple > 0:
-                for i in range(multiple):
-                    dst_band = dst_ds.GetRasterBand(dst_index-1-i)
-                    dst_band.WriteArray(data)
-                multiple = 0
+                
+                # get min/max values or calculate from band
+                if dmin == "min" or dmax == "max":
+                    src_min, src_max = src_band.ComputeRasterMinMax()
+                
+                key = (src_index, dmin, dmax)
+                if dmin is None:
+                    dmin = get_limits(src_band.DataType)[0]
+                elif dmin == "min":
+                    dmin = src_min
+                if dmax is None:
+                    dmax = get_limits(src_band.DataType)[1]
+                elif dmax == "max":
+                    dmax = src_max
+
+                selections.append((key, src_band, dmin, dmax, [dst_index]))
+        
+        for xoff, yoff, xsize, ysize in factory.windows(src_ds):
+            for _, src_band, dmin, dmax, dst_indices in selections:
+                data = src_band.ReadAsArray(xoff, yoff, xsize, ysize)
+                src_range = (float(dmin), float(dmax))
+
+                # perform clipping and scaling
+                data = ((dst_range[1] - dst_range[0]) * 
+                        ((numpy.clip(data, dmin, dmax) - src_range[0]) / 
+                        (src_range[1] - src_range[0])))
+                
+                # set new datatype
+                data = data.astype(gdal_array.codes[self.datatype])
+                
+                # write result, equal bands at once
+                for dst_index in dst_indices:
+                    dst_band = dst_ds.GetRasterBand(dst_index)
+                    dst_band.WriteArray(data, xoff, yoff)
         
         copy_projection(src_ds, dst_ds)
         copy_metadata(src_ds, dst_ds)
@@ -199,9 +203,10 @@ class ColorIndexOptimization(DatasetOptimization):
         self.palette_file = palette_file
     
     
-    def __call__(self, src_ds):
-        dst_ds = create_mem(src_ds.RasterXSize, src_ds.RasterYSize, 
-                            1, gdal.GDT_Byte)
+    def __call__(self, src_ds, factory=None):
+        factory = factory or DatasetFactory()
+        dst_ds = factory.create(src_ds.RasterXSize, src_ds.RasterYSize, 
+                                1, gdal.GDT_Byte)
         
         if not self.palette_file:
             # create a color table as a median of the given dataset
@@ -242,7 +247,7 @@ class NoDataValueOptimization(DatasetOptimization):
         self.nodata_values = nodata_values
         
         
-    def __call__(self, ds):
+    def __call__(self, ds, factory=None):
         nodata_values = self.nodata_values
         if len(nodata_values) == 1:
             nodata_values = nodata_values * ds.RasterCount
@@ -274,13 +279,16 @@ class DatasetPostOptimization(object):
 
 class OverviewOptimization(DatasetPostOptimization):
     """ Dataset optimization step to add overviews to the dataset. This step may
-        have to be applied after the dataset has been reprojected.
+        have to be applied after the dataset has been reprojected. With 
+        `num_threads` each level is computed by multiple threads.
     """
     
-    def __init__(self, resampling=None, levels=None, minsize=None):
+    def __init__(self, resampling=None, levels=None, minsize=None,
+                 num_threads=None):
         self.resampling = resampling
         self.levels = levels
         self.minsize = minsize
+        self.num_threads = num_threads
     
     
     def __call__(self, ds):
@@ -303,21 +311,33 @@ class OverviewOptimization(DatasetPostOptimization):
         
         # workaround for libtiff 3.X systems, which generated wrong overviews on
         # some levels. Skip with warning if workaround is not working.
-        for level in levels:
-            try:
-                ds.BuildOverviews(self.resampling, [level])
-            except RuntimeError:
-                logger.warning("Overview building failed for level '%s'." % level)
+        with gdal.config_options(_threading_options(self.num_threads)):
+            for level in levels:
+                try:
+                    ds.BuildOverviews(self.resampling, [level])
+                except RuntimeError:
+                    logger.warning("Overview building failed for level '%s'."
+                                   % level)
         return ds
 
 
+def _threading_options(num_threads):
+    """ Returns the GDAL configuration options to use the given number of 
+        threads for warping and overview computation.
+    """
+    if not num_threads:
+        return {}
+    return {"GDAL_NUM_THREADS": str(num_threads)}
+
+
 #===============================================================================
 # AlphaBand Optimization
 #===============================================================================
 
 class AlphaBandOptimization(object):
     """ This optimization renders the footprint into the alpha channel of the 
-    image. """
+    image. The dataset has to be writable; if it has only three bands, it 
+    has to support adding a band. """
     
     def __call__(self, src_ds, footprint_wkt):
         dt = src_ds.GetRasterBand(1).DataType
@@ -26,12 +26,18 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
-from os.path import exists
+from os.path import exists, join
+import tempfile
+import logging
+import shutil
 import numpy
 
 from eoxserver.contrib import gdal, gdal_array
 
 
+logger = logging.getLogger(__name__)
+
+
 def get_limits(dt):
     """ Returns the numeric limits of the GDAL/numpy datatype """
     if dt in gdal_array.codes:
@@ -55,6 +61,15 @@ def create_mem_copy(ds, *args, **kwargs):
     return mem_drv.CreateCopy('', ds, *args, **kwargs)
     
 
+def create_vrt_copy(ds):
+    """ Create a new In-Memory VRT Dataset referencing an existing dataset. The
+        pixel data is not copied, but the georeference and metadata of the 
+        returned dataset can be altered without touching the original.
+    """
+    vrt_drv = gdal.GetDriverByName('VRT')
+    return vrt_drv.CreateCopy('', ds)
+
+
 def create_mem(sizex, sizey, numbands, datatype=gdal.GDT_Byte,
                options=None):
     """ Create a new In-Memory Dataset. """
@@ -76,6 +91,118 @@ def copy_metadata(src_ds, dst_ds):
     dst_ds.SetMetadata(src_ds.GetMetadata_Dict())
 
 
+def copy_nodata(src_ds, dst_ds):
+    """ Copy the no-data values of all bands from one dataset to another """
+    for index in range(1, min(src_ds.RasterCount, dst_ds.RasterCount) + 1):
+        nodata = src_ds.GetRasterBand(index).GetNoDataValue()
+        if nodata is not None:
+            dst_ds.GetRasterBand(index).SetNoDataValue(nodata)
+
+
+class DatasetFactory(object):
+    """ Creates the intermediate datasets of a pre-processing run. Datasets 
+        fitting into the `budget` (in bytes) are created in memory, larger 
+        ones as tiled GeoTIFFs in a temporary directory. The budget also 
+        bounds the windows the pixel data is processed in. All datasets are 
+        kept open until :meth:`close` is called, as other (virtual) datasets
+        may still refer to them.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.datasets = []
+        self.directory = None
+
+
+    def create(self, sizex, sizey, numbands, datatype=gdal.GDT_Byte):
+        """ Create a new writable dataset. """
+        size = sizex * sizey * numbands * gdal.GetDataTypeSize(datatype) // 8
+        if self.budget is None or size <= self.budget:
+            return self.keep(create_mem(sizex, sizey, numbands, datatype))
+
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="eoxs_preprocess_")
+
+        filename = join(self.directory, "%d.tif" % len(self.datasets))
+        logger.debug("Creating temporary dataset '%s'." % filename)
+        tif_drv = gdal.GetDriverByName('GTiff')
+        return self.keep(tif_drv.Create(
+            filename, sizex, sizey, numbands, datatype, 
+            ["TILED=YES", "BIGTIFF=IF_SAFER"]
+        ))
+
+
+    def copy(self, src_ds, numbands=None):
+        """ Create a writable copy of a dataset window by window. If 
+            `numbands` exceeds the number of bands of the source, the 
+            additional bands are left empty.
+        """
+        dst_ds = self.create(src_ds.RasterXSize, src_ds.RasterYSize, 
+                             numbands or src_ds.RasterCount,
+                             src_ds.GetRasterBand(1).DataType)
+        copy_projection(src_ds, dst_ds)
+        copy_metadata(src_ds, dst_ds)
+        copy_nodata(src_ds, dst_ds)
+
+        for xoff, yoff, xsize, ysize in self.windows(src_ds):
+            for index in range(1, src_ds.RasterCount + 1):
+                data = src_ds.GetRasterBand(index).ReadAsArray(
+                    xoff, yoff, xsize, ysize
+                )
+                dst_ds.GetRasterBand(index).WriteArray(data, xoff, yoff)
+
+        return dst_ds
+
+
+    def keep(self, ds):
+        """ Keep the dataset open until the factory is closed. """
+        self.datasets.append(ds)
+        return ds
+
+
+    def windows(self, ds, decimation=1):
+        """ Yield the windows as tuples (xoff, yoff, xsize, ysize) to process 
+            the dataset in. Windows are strips spanning the full width, 
+            aligned to the native block height. Their height is chosen so 
+            that one (double precision) working array for each band fits into
+            the budget. If a strip of a single block row exceeds the budget,
+            the strips are split into columns aligned to the native block 
+            width. When the data is read with a `decimation` factor, the
+            window sizes are also multiples of it and the budget applies to
+            the decimated arrays.
+        """
+        block_xsize, block_ysize = ds.GetRasterBand(1).GetBlockSize()
+        xunit = max(block_xsize, 1) * decimation
+        yunit = max(block_ysize, 1) * decimation
+
+        rows, cols = ds.RasterYSize, ds.RasterXSize
+        if self.budget is not None:
+            pixel_size = ds.RasterCount * 8
+            row_size = max(-(-cols // decimation) * pixel_size, 1)
+            rows = (self.budget // row_size) * decimation // yunit * yunit
+
+            if rows < yunit:
+                rows = yunit
+                strip_size = max(-(-rows // decimation) * pixel_size, 1)
+                cols = (self.budget // strip_size) * decimation // xunit * xunit
+                cols = max(cols, xunit)
+
+        for yoff in xrange(0, ds.RasterYSize, rows):
+            for xoff in xrange(0, ds.RasterXSize, cols):
+                yield (
+                    xoff, yoff, min(cols, ds.RasterXSize - xoff), 
+                    min(rows, ds.RasterYSize - yoff)
+                )
+
+
+    def close(self):
+        """ Close all datasets and remove the temporary files. """
+        self.datasets = []
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+
 def check_file_existence(filename):
     " Check if file exists and raise an IOError if it does. "
     if exists(filename):
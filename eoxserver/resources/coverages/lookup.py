@@ -0,0 +1,229 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+""" Helpers to look up EO objects, their collection hierarchies and related 
+    models in bulk, with a fixed number of queries regardless of the number of
+    objects involved.
+"""
+
+from collections import defaultdict
+
+from django.db.models import Q
+
+from eoxserver.backends import models as backends
+from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages.util import batched
+
+
+def _descendants(collection_ids):
+    """ Returns a subquery of the IDs of all direct and indirect members of the
+        given collections.
+    """
+    return models.CollectionClosure.objects.filter(
+        collection__in=collection_ids
+    ).values("eo_object")
+
+
+def collection_members(collection_ids):
+    """ Returns a list of (collection ID, EO object ID) tuples for all direct 
+        and indirect members of the given collections with a single query.
+    """
+    collection_ids = list(collection_ids)
+    if not collection_ids:
+        return []
+
+    return list(models.EOObjectToCollectionThrough.objects.filter(
+        Q(collection__in=collection_ids) 
+        | Q(collection__in=_descendants(collection_ids))
+    ).values_list("collection", "eo_object"))
+
+
+def collection_ancestors(eo_object_ids):
+    """ Returns the IDs of all collections that directly or indirectly contain
+        any of the given EO objects.
+    """
+    ancestors = set()
+    for batch in batched(eo_object_ids):
+        ancestors.update(models.CollectionClosure.objects.filter(
+            eo_object__in=batch
+        ).values_list("collection", flat=True))
+    return ancestors
+
+
+def filter_members(queryset, collection_ids):
+    """ Restrict a queryset of EO objects (or any subtype) to the direct and 
+        indirect members of the given collections.
+    """
+    collection_ids = list(collection_ids)
+    if not collection_ids:
+        return queryset.none()
+
+    return queryset.filter(pk__in=_descendants(collection_ids))
+
+
+def closure_collections(identifiers, subsets=None):
+    """ Returns a queryset of the collections with the given identifiers and 
+        all their direct and indirect sub-collections overlapping the 
+        `subsets`. As the EO metadata of a collection covers its members, 
+        sub-collections of collections not overlapping are never included.
+    """
+    identifiers = list(identifiers)
+    if not identifiers:
+        return models.Collection.objects.none()
+
+    roots = models.Collection.objects.filter(
+        identifier__in=identifiers
+    ).values("pk")
+
+    queryset = models.Collection.objects.filter(
+        Q(pk__in=roots) | Q(pk__in=_descendants(roots))
+    )
+    if subsets is not None:
+        queryset = subsets.filter(queryset, containment="overlaps")
+    return queryset
+
+
+def closure_coverages(identifiers, subsets=None, containment="overlaps"):
+    """ Returns a queryset of the coverages with the given identifiers and all
+        coverages contained in the collections returned by 
+        :func:`closure_collections`. The `subsets` are applied to the coverages
+        with the given `containment`.
+    """
+    identifiers = list(identifiers)
+    if not identifiers:
+        return models.Coverage.objects.none()
+
+    collections = closure_collections(identifiers, subsets).values("pk")
+    queryset = models.Coverage.objects.filter(
+        Q(identifier__in=identifiers) 
+        | Q(pk__in=models.EOObjectToCollectionThrough.objects.filter(
+            collection__in=collections
+        ).values("eo_object"))
+    )
+    if subsets is not None:
+        queryset = subsets.filter(queryset, containment=containment)
+    return queryset
+
+
+def closure_data_items(identifiers, subsets=None):
+    """ Returns a queryset of the data items of all coverages returned by 
+        :func:`closure_coverages`, with their storages and packages.
+    """
+    coverages = closure_coverages(identifiers, subsets).values("dataset_ptr")
+    return backends.DataItem.objects.filter(
+        dataset__in=coverages
+    ).select_related("storage", "package", "package__storage")
+
+
+def cast_eo_objects(eo_objects):
+    """ Returns a list of the given EO objects cast to their actual types. 
+        Instead of one query per object, one query per type is performed.
+        Coverages are fetched with their range types.
+    """
+    eo_objects = list(eo_objects)
+    pks_by_type = defaultdict(list)
+    for eo_object in eo_objects:
+        if eo_object.real_type != type(eo_object):
+            pks_by_type[eo_object.real_type].append(eo_object.pk)
+
+    cast = {}
+    for real_type, pks in pks_by_type.items():
+        queryset = real_type.objects.all()
+        if issubclass(real_type, models.Coverage):
+            queryset = queryset.select_related("range_type")
+
+        for batch in batched(pks):
+            for eo_object in queryset.filter(pk__in=batch):
+                cast[eo_object.pk] = eo_object
+
+    return [cast.get(eo_object.pk, eo_object) for eo_object in eo_objects]
+
+
+def prefetch_coverages(coverages):
+    """ Fetches the data items (with storages and packages) and the range types
+        (with bands, nil value sets and nil values) of all given coverages in 
+        bulk. The data items are stored as `cached_data_items` on each 
+        coverage, the range types are shared between the coverages and have 
+        their caches filled.
+    """
+    coverages = [
+        coverage for coverage in coverages 
+        if isinstance(coverage, models.Coverage)
+    ]
+    if not coverages:
+        return coverages
+
+    # data items
+    data_items = defaultdict(list)
+    dataset_ids = set(coverage.dataset_ptr_id for coverage in coverages)
+    queryset = backends.DataItem.objects.select_related("storage", "package")
+    for batch in batched(dataset_ids):
+        for data_item in queryset.filter(dataset__in=batch):
+            data_items[data_item.dataset_id].append(data_item)
+
+    for coverage in coverages:
+        coverage.cached_data_items = data_items[coverage.dataset_ptr_id]
+
+    # range types
+    range_type_ids = set(coverage.range_type_id for coverage in coverages)
+    range_types = dict(
+        (range_type.pk, range_type) 
+        for range_type in models.RangeType.objects.filter(
+            pk__in=range_type_ids
+        )
+    )
+
+    bands = defaultdict(list)
+    nil_value_sets = {}
+    for band in models.Band.objects.filter(
+            range_type__in=range_type_ids).select_related("nil_value_set"):
+        band.range_type = range_types[band.range_type_id]
+        if band.nil_value_set_id is not None:
+            band.nil_value_set = nil_value_sets.setdefault(
+                band.nil_value_set_id, band.nil_value_set
+            )
+        bands[band.range_type_id].append(band)
+
+    nil_values = defaultdict(list)
+    if nil_value_sets:
+        for nil_value in models.NilValue.objects.filter(
+                nil_value_set__in=nil_value_sets.keys()):
+            nil_value.nil_value_set = nil_value_sets[nil_value.nil_value_set_id]
+            nil_values[nil_value.nil_value_set_id].append(nil_value)
+
+    for pk, nil_value_set in nil_value_sets.items():
+        nil_value_set._cached_nil_values = nil_values[pk]
+
+    for pk, range_type in range_types.items():
+        range_type._cached_bands = bands[pk]
+
+    for coverage in coverages:
+        coverage.range_type = range_types[coverage.range_type_id]
+
+    return coverages
@@ -0,0 +1,133 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+from optparse import make_option
+
+from django.core.management.base import CommandError, BaseCommand
+
+from eoxserver.backends.cache import CacheException
+from eoxserver.backends.prefetch import prefetch
+from eoxserver.resources.coverages.lookup import closure_data_items
+from eoxserver.resources.coverages.management.commands import (
+    CommandOutputMixIn
+)
+
+
+UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_rate(value):
+    """ Parses a rate in bytes per second with an optional K, M or G suffix.
+    """
+    value = value.strip().upper()
+    unit = value[-1:] if value[-1:] in UNITS else ""
+    try:
+        return int(float(value[:len(value) - len(unit)]) * UNITS[unit])
+    except ValueError:
+        raise CommandError("Invalid bandwidth '%s'." % value)
+
+
+class Command(CommandOutputMixIn, BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option("-c", "--concurrency", dest="concurrency",
+            action="store", type="int", default=4,
+            help=("Optional. Number of data items retrieved concurrently. "
+                  "Default is 4.")
+        ),
+        make_option("-b", "--bandwidth", dest="bandwidth",
+            action="store", default=None,
+            help=("Optional. Maximum combined transfer rate in bytes per "
+                  "second, with an optional K, M or G suffix (e.g: 10M). "
+                  "Default is unlimited.")
+        ),
+    )
+
+    args = "<identifier> [<identifier> ...]"
+
+    help = """
+        Retrieves the data items of the given coverages and of all coverages
+        contained in the given collections into the persistent cache, so that
+        subsequent requests do not need to wait for their transfer. Requires
+        the 'directory' and 'max_size' options of the 'backends' section to be
+        set.
+    """
+
+    def handle(self, *identifiers, **kwargs):
+        if not identifiers:
+            raise CommandError(
+                "Missing the mandatory coverage or collection identifier(s)."
+            )
+
+        self.verbosity = int(kwargs.get("verbosity", 1))
+        bandwidth = kwargs.get("bandwidth")
+        if bandwidth:
+            bandwidth = parse_rate(bandwidth)
+
+        data_items = list(closure_data_items(identifiers))
+        if not data_items:
+            raise CommandError(
+                "No data items found for the given identifier(s)."
+            )
+
+        self.print_msg("Prefetching %d data items." % len(data_items))
+
+        def progress(done, total, result):
+            if result.error:
+                self.print_wrn("[%d/%d] Failed to retrieve %s: %s" % (
+                    done, total, result.data_item, result.error
+                ))
+            else:
+                self.print_msg("[%d/%d] %s %s (%d bytes, %.2f s)" % (
+                    done, total, "Found" if result.cached else "Retrieved",
+                    result.data_item, result.size, result.duration
+                ), 2 if result.cached else 1)
+
+        try:
+            results = prefetch(
+                data_items, kwargs["concurrency"], bandwidth, progress
+            )
+        except CacheException as e:
+            raise CommandError(str(e))
+
+        failed = [result for result in results if result.error]
+        retrieved = [
+            result for result in results 
+            if not result.error and not result.cached
+        ]
+        self.print_msg(
+            "Retrieved %d data items (%d bytes), %d were already cached, %d "
+            "failed." % (
+                len(retrieved), sum(result.size for result in retrieved),
+                len(results) - len(retrieved) - len(failed), len(failed)
+            )
+        )
+
+        if failed:
+            raise CommandError(
+                "Failed to prefetch %d data items." % len(failed)
+            )
@@ -129,19 +129,21 @@ class Command(CommandOutputMixIn, BaseCommand):
                     raise CommandError(msg)
         
         try:
-            for collection, eo_object in product(collections, objects):
-                # check whether the link does not exist
-                if eo_object not in collection:
-                    self.print_msg(
-                        "Linking: %s <--- %s" % (collection, eo_object)
-                    )
-                    collection.insert(eo_object)
+            # aggregate the EO metadata of each collection only once
+            with models.deferred_eo_metadata():
+                for collection, eo_object in product(collections, objects):
+                    # check whether the link does not exist
+                    if eo_object not in collection:
+                        self.print_msg(
+                            "Linking: %s <--- %s" % (collection, eo_object)
+                        )
+                        collection.insert(eo_object)
 
-                else:
-                    self.print_wrn(
-                        "Collection %s already contains %s" 
-                        % (collection, eo_object)
-                    )
+                    else:
+                        self.print_wrn(
+                            "Collection %s already contains %s" 
+                            % (collection, eo_object)
+                        )
 
         except Exception as e:
             self.print_traceback(e, kwargs)
@@ -27,12 +27,18 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+import csv
+import json
+import time
 from optparse import make_option
 from itertools import chain
+from multiprocessing import Pool, cpu_count
 
 from django.core.exceptions import ValidationError
 from django.core.management import call_command
 from django.core.management.base import CommandError, BaseCommand
+from django.db import connection
+from django.db.models.signals import post_save
 from django.utils.dateparse import parse_datetime
 from django.contrib.gis import geos 
 
@@ -43,6 +49,7 @@ from eoxserver.backends.component import BackendComponent
 from eoxserver.backends.cache import CacheContext
 from eoxserver.backends.access import connect
 from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages.util import batched
 from eoxserver.resources.coverages.metadata.component import MetadataComponent
 from eoxserver.resources.coverages.management.commands import (
     CommandOutputMixIn, _variable_args_cb, nested_commit_on_success
@@ -66,6 +73,97 @@ def _variable_args_cb_list(option, opt_str, value, parser):
     getattr(parser.values, option.dest).append(args)
 
 
+METADATA_KEYS = frozenset((
+    "identifier", "extent", "size", "projection",
+    "footprint", "begin_time", "end_time", "coverage_type",
+))
+
+
+def read_manifest(filename, format=None):
+    """ Reads the entries of a bulk registration manifest, either in the JSON 
+        lines or the CSV format. Yields a dict for each entry, where "data" 
+        and "metadata" are lists of location chains and "semantics" and 
+        "collections" are lists of strings.
+    """
+    if format is None:
+        format = "csv" if filename.lower().endswith(".csv") else "jsonl"
+
+    with open(filename) as f:
+        if format == "csv":
+            entries = (
+                dict(
+                    (key, value) for key, value in row.items() 
+                    if value not in (None, "")
+                ) for row in csv.DictReader(f)
+            )
+        else:
+            entries = (json.loads(line) for line in f if line.strip())
+
+        for entry in entries:
+            for key in ("data", "metadata"):
+                value = entry.get(key) or []
+                if isinstance(value, basestring):
+                    value = value.split(";")
+                entry[key] = [
+                    item.split() if isinstance(item, basestring) else item
+                    for item in value
+                ]
+
+            for key in ("semantics", "collections"):
+                value = entry.get(key)
+                if isinstance(value, basestring):
+                    entry[key] = value.split(";")
+
+            if isinstance(entry.get("visible"), basestring):
+                entry["visible"] = entry["visible"].lower() in ("true", "1")
+
+            yield entry
+
+
+def _extract_metadata(job):
+    """ Reads the metadata of the data and metadata items of a single manifest
+        entry. This function is run in the worker processes of the bulk 
+        registration and does not access the database. Returns the index of 
+        the entry, the retrieved metadata, the formats detected for the items
+        and an error message, if any.
+    """
+    index, metadata_items, data_items = job
+    metadata_component = MetadataComponent(env)
+    retrieved_metadata = {}
+    formats = []
+
+    try:
+        with CacheContext() as cache:
+            for data_item in metadata_items:
+                values = {}
+                with open(connect(data_item, cache)) as f:
+                    content = f.read()
+                    reader = metadata_component.get_reader_by_test(content)
+                    if reader:
+                        values = reader.read(content)
+                formats.append(values.pop("format", None))
+                for key, value in values.items():
+                    if key in METADATA_KEYS:
+                        retrieved_metadata.setdefault(key, value)
+
+            for data_item in data_items:
+                values = {}
+                ds = gdal.Open(connect(data_item, cache))
+                reader = metadata_component.get_reader_by_test(ds)
+                if reader:
+                    values = reader.read(ds)
+                ds = None
+                formats.append(values.pop("format", None))
+                for key, value in values.items():
+                    if key in METADATA_KEYS:
+                        retrieved_metadata.setdefault(key, value)
+
+    except Exception as e:
+        return index, None, None, str(e)
+
+    return index, retrieved_metadata, formats, None
+
+
 class Command(CommandOutputMixIn, BaseCommand):
     option_list = BaseCommand.option_list + (
         make_option("-i", "--identifier", "--coverage-id", dest="identifier",
@@ -152,6 +250,30 @@ class Command(CommandOutputMixIn, BaseCommand):
             help=("Optional. Proceed even if the linked collection "
                   "does not exist. By defualt, a missing collection " 
                   "will result in an error.")
+        ),
+
+        make_option("--manifest", dest="manifest",
+            action="store", default=None,
+            help=("Optional. Register all datasets listed in the given "
+                  "manifest file (JSON lines or CSV) in bulk.")
+        ),
+
+        make_option("--manifest-format", dest="manifest_format",
+            action="store", default=None, choices=("jsonl", "csv"),
+            help=("Optional. The format of the manifest, either 'jsonl' or "
+                  "'csv'. By default, it is derived from the file extension.")
+        ),
+
+        make_option("--processes", dest="processes",
+            action="store", type="int", default=None,
+            help=("Optional. Number of processes extracting the metadata in "
+                  "bulk mode. Defaults to the number of CPUs.")
+        ),
+
+        make_option("--batch-size", dest="batch_size",
+            action="store", type="int", default=100,
+            help=("Optional. Number of datasets inserted per transaction in "
+                  "bulk mode. Defaults to 100.")
         )
     )
 
@@ -168,7 +290,9 @@ class Command(CommandOutputMixIn, BaseCommand):
         "[--begin-time <begin-time>] [--end-time <end-time>] "
         "[--coverage-type <coverage-type-name>] "
         "[--visible] [--collection <collection-id> [--collection ... ]] "
-        "[--ignore-missing-collection]"
+        "[--ignore-missing-collection] "
+        "[--manifest <manifest-file> [--manifest-format jsonl|csv] "
+        "[--processes <n>] [--batch-size <n>]]"
     )
 
     help = """
@@ -184,10 +308,28 @@ class Command(CommandOutputMixIn, BaseCommand):
 
         The registered dataset can optionally be directly inserted one or more
         collections.
+
+        With the `--manifest` option, all datasets listed in the manifest are
+        registered in bulk. Each line of a JSON lines manifest is an object 
+        with the keys "data", "metadata", "semantics", "range_type", 
+        "collections", "visible" and the names of the override options, e.g.
+        "identifier" or "begin_time". "data" and "metadata" are lists of 
+        location chains, each being a list or a whitespace separated string 
+        of `[<storage>:][<package>:]<location>` items. CSV manifests have a 
+        header with the same column names, list items are separated by ";".
+        The options given on the command line are used as defaults for all
+        entries. The metadata is extracted in parallel, the datasets are 
+        inserted in transactions of `--batch-size` datasets and the metadata
+        of the collections is aggregated once at the end.
     """
 
-    @nested_commit_on_success
     def handle(self, *args, **kwargs):
+        if kwargs.get("manifest"):
+            return self.handle_manifest(**kwargs)
+        return self.handle_single(*args, **kwargs)
+
+    @nested_commit_on_success
+    def handle_single(self, *args, **kwargs):
         with CacheContext() as cache:
             self.handle_with_cache(cache, *args, **kwargs)
 
@@ -203,10 +345,7 @@ class Command(CommandOutputMixIn, BaseCommand):
             raise CommandError("No range type name specified.")
         range_type = models.RangeType.objects.get(name=range_type_name)
 
-        metadata_keys = set((
-            "identifier", "extent", "size", "projection",
-            "footprint", "begin_time", "end_time", "coverage_type",
-        ))
+        metadata_keys = METADATA_KEYS
 
         all_data_items = []
         retrieved_metadata = {}
@@ -248,17 +387,7 @@ class Command(CommandOutputMixIn, BaseCommand):
             raise CommandError("No data files specified.")
 
         if semantics is None:
-            # TODO: check corner cases.
-            # e.g: only one data item given but multiple bands in range type
-            # --> bands[1:<bandnum>]
-            if len(datas) == 1:
-                if len(range_type) == 1:
-                    semantics = ["bands[1]"]
-                else:
-                    semantics = ["bands[1:%d]" % len(range_type)]
-            
-            else:
-                semantics = ["bands[%d]" % i for i in range(len(datas))]
+            semantics = self._get_default_semantics(datas, range_type)
 
 
         for data, semantic in zip(datas, semantics):
@@ -288,46 +417,10 @@ class Command(CommandOutputMixIn, BaseCommand):
                         retrieved_metadata.setdefault(key, value)
             ds = None
 
-        if len(metadata_keys - set(retrieved_metadata.keys())):
-            raise CommandError(
-                "Missing metadata keys %s." 
-                % ", ".join(metadata_keys - set(retrieved_metadata.keys()))
-            )
-
         try:
-            # TODO: allow types of different apps
-            CoverageType = getattr(models, retrieved_metadata["coverage_type"])
-        except AttributeError:
-            raise CommandError(
-                "Type '%s' is not supported." % kwargs["coverage_type"]
+            coverage = self._create_coverage(
+                retrieved_metadata, range_type, kwargs["visible"]
             )
-
-        try:
-            coverage = CoverageType()
-            coverage.range_type = range_type
-            
-            proj = retrieved_metadata.pop("projection")
-            if isinstance(proj, int):
-                retrieved_metadata["srid"] = proj
-            else:
-                definition, format = proj
-
-                # Try to identify the SRID from the given input
-                try:
-                    sr = osr.SpatialReference(definition, format)
-                    retrieved_metadata["srid"] = sr.srid
-                except Exception, e:
-                    prj = models.Projection.objects.get(
-                        format=format, definition=definition
-                    )
-                    retrieved_metadata["projection"] = prj
-
-            # TODO: bug in models for some coverages
-            for key, value in retrieved_metadata.items():
-                setattr(coverage, key, value)
-
-            coverage.visible = kwargs["visible"]
-
             coverage.full_clean()
             coverage.save()
 
@@ -354,6 +447,314 @@ class Command(CommandOutputMixIn, BaseCommand):
             % coverage.identifier
         ) 
 
+
+    def handle_manifest(self, **kwargs):
+        """ Registers all datasets of a manifest in bulk. The metadata is 
+            extracted in a process pool, the datasets and their data items are
+            inserted in batches, each in its own transaction. Collections are 
+            linked in bulk and their EO metadata is aggregated once at the end.
+        """
+        stages = []
+        def report(stage, start, count):
+            duration = time.time() - start
+            stages.append((stage, count, duration))
+            self.print_msg(
+                "%s: %d datasets in %.2f s (%.1f datasets/s)" % (
+                    stage, count, duration, count / duration if duration else 0
+                )
+            )
+
+        # prepare the entries and their data items
+        start = time.time()
+        entries = list(read_manifest(
+            kwargs["manifest"], kwargs.get("manifest_format")
+        ))
+        range_types = {}
+        jobs = []
+        default_overrides = self._get_overrides(**kwargs)
+        for index, entry in enumerate(entries):
+            range_type_name = entry.get("range_type", kwargs["range_type_name"])
+            if range_type_name is None:
+                raise CommandError(
+                    "No range type name specified for entry %d." % index
+                )
+            if range_type_name not in range_types:
+                range_types[range_type_name] = models.RangeType.objects.get(
+                    name=range_type_name
+                )
+            entry["range_type"] = range_types[range_type_name]
+
+            if not entry["data"]:
+                raise CommandError("No data files specified for entry %d." % index)
+
+            semantics = entry.get("semantics") or self._get_default_semantics(
+                entry["data"], entry["range_type"]
+            )
+
+            metadata_items = [
+                self._create_data_item(items, "metadata")
+                for items in entry["metadata"]
+            ]
+            data_items = [
+                self._create_data_item(items, semantic)
+                for items, semantic in zip(entry["data"], semantics)
+            ]
+            entry["data_items"] = metadata_items + data_items
+            entry["overrides"] = dict(default_overrides)
+            entry["overrides"].update(self._get_overrides(**dict(
+                (str(key), value) for key, value in entry.items()
+                if key in METADATA_KEYS
+            )))
+            jobs.append((index, metadata_items, data_items))
+
+        report("prepare", start, len(entries))
+
+        # extract the metadata in parallel. The database connection must not 
+        # be shared with the worker processes.
+        start = time.time()
+        processes = kwargs.get("processes") or cpu_count()
+        if processes > 1 and len(jobs) > 1:
+            connection.close()
+            pool = Pool(processes)
+            try:
+                results = pool.map(_extract_metadata, jobs, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = map(_extract_metadata, jobs)
+
+        coverages = []
+        for index, retrieved_metadata, formats, error in results:
+            if error:
+                raise CommandError(
+                    "Metadata extraction for entry %d failed: %s" 
+                    % (index, error)
+                )
+            entry = entries[index]
+            for data_item, format in zip(entry["data_items"], formats):
+                if format:
+                    data_item.format = format
+
+            retrieved_metadata.update(entry["overrides"])
+            coverages.append(self._create_coverage(
+                retrieved_metadata, entry["range_type"], 
+                entry.get("visible", kwargs["visible"])
+            ))
+        report("extract", start, len(entries))
+
+        # insert the coverages and their data items
+        start = time.time()
+        batch_size = max(1, kwargs["batch_size"])
+        for i in range(0, len(entries), batch_size):
+            self._insert_batch(
+                coverages[i:i + batch_size], entries[i:i + batch_size], kwargs
+            )
+        report("insert", start, len(entries))
+
+        # link the coverages with their collections
+        start = time.time()
+        links = {}
+        for coverage, entry in zip(coverages, entries):
+            collection_ids = entry.get("collections") or kwargs["collection_ids"]
+            for collection_id in set(collection_ids or ()):
+                links.setdefault(collection_id, []).append(coverage)
+
+        collections = self._link_collections(
+            links, kwargs["ignore_missing_collection"], batch_size
+        )
+        report("link", start, len(entries))
+
+        # aggregate the EO metadata of each collection once
+        start = time.time()
+        for collection, linked in collections:
+            for batch in batched([coverage.pk for coverage in linked]):
+                collection.extend_eo_metadata(
+                    models.EOObject.objects.filter(pk__in=batch)
+                )
+        report("aggregate", start, len(entries))
+
+        total = sum(duration for _, _, duration in stages)
+        self.print_msg(
+            "Registered %d datasets in %.2f s (%.1f datasets/s)." % (
+                len(entries), total, len(entries) / total if total else 0
+            )
+        )
+
+
+    @nested_commit_on_success
+    def _insert_batch(self, coverages, entries, kwargs):
+        """ Inserts a batch of coverages and bulk creates their data items. """
+        data_items = []
+        for coverage, entry in zip(coverages, entries):
+            try:
+                coverage.full_clean()
+                coverage.save()
+            except Exception as e:
+                self.print_traceback(e, kwargs)
+                raise CommandError(
+                    "Registration of dataset '%s' failed: %s" 
+                    % (coverage.identifier, e)
+                )
+
+            for data_item in entry["data_items"]:
+                data_item.dataset = coverage
+                data_item.full_clean()
+                data_items.append(data_item)
+
+        for batch in batched(data_items, 100):
+            backends.DataItem.objects.bulk_create(batch)
+
+        # bulk_create does not send the post_save signal, so the caches 
+        # invalidated by its receivers are notified once per dataset
+        self._send_post_save(
+            backends.DataItem.objects.filter(
+                dataset__in=[coverage.pk for coverage in coverages]
+            ), "dataset_id"
+        )
+
+
+    @nested_commit_on_success
+    def _link_collections(self, links, ignore_missing_collection, batch_size):
+        """ Links the coverages to the collections. Dataset series do not 
+            validate their members, so their relations and closure entries are 
+            bulk created. Other collections insert each coverage, with their EO
+            metadata updates deferred. Returns the dataset series with the 
+            linked coverages, whose EO metadata still needs to be extended.
+        """
+        series = []
+        relations = []
+        with models.deferred_eo_metadata():
+            for collection_id, coverages in links.items():
+                try:
+                    collection = models.Collection.objects.get(
+                        identifier=collection_id
+                    ).cast()
+                except models.Collection.DoesNotExist:
+                    msg = (
+                        "There is no Collection matching the given "
+                        "identifier: '%s'" % collection_id
+                    )
+                    if ignore_missing_collection:
+                        self.print_wrn(msg)
+                        continue
+                    raise CommandError(msg)
+
+                if not isinstance(collection, models.DatasetSeries):
+                    collection.insert_batch(coverages)
+                    continue
+
+                series.append((collection, coverages))
+                relations.extend(
+                    models.EOObjectToCollectionThrough(
+                        eo_object=coverage, collection=collection
+                    ) for coverage in coverages
+                )
+
+        for i in range(0, len(relations), batch_size):
+            batch = relations[i:i + batch_size]
+            models.EOObjectToCollectionThrough.objects.bulk_create(batch)
+            self._send_post_save(
+                models.EOObjectToCollectionThrough.objects.filter(
+                    collection__in=set(
+                        relation.collection.pk for relation in batch
+                    ),
+                    eo_object__in=[relation.eo_object.pk for relation in batch]
+                ), "collection_id"
+            )
+        models.CollectionClosure.add_new_relations([
+            (relation.collection.pk, relation.eo_object.pk)
+            for relation in relations
+        ])
+        return series
+
+
+    def _send_post_save(self, queryset, field):
+        """ Sends the post_save signal for bulk created rows. The rows are 
+            re-fetched, as ``bulk_create`` does not set the primary keys on 
+            all databases. The signal is sent once per distinct value of the 
+            given field.
+        """
+        sent = set()
+        for instance in queryset.iterator():
+            value = getattr(instance, field)
+            if value in sent:
+                continue
+            sent.add(value)
+            post_save.send(
+                sender=queryset.model, instance=instance, created=True, 
+                raw=False, using=queryset.db
+            )
+
+
+    def _create_data_item(self, items, semantic):
+        """ Returns an unsaved data item for the given location chain. """
+        storage, package, format, location = self._get_location_chain(items)
+        return backends.DataItem(
+            location=location, format=format or "", semantic=semantic, 
+            storage=storage, package=package,
+        )
+
+
+    def _get_default_semantics(self, datas, range_type):
+        # TODO: check corner cases.
+        # e.g: only one data item given but multiple bands in range type
+        # --> bands[1:<bandnum>]
+        if len(datas) == 1:
+            if len(range_type) == 1:
+                return ["bands[1]"]
+            else:
+                return ["bands[1:%d]" % len(range_type)]
+
+        else:
+            return ["bands[%d]" % i for i in range(len(datas))]
+
+
+    def _create_coverage(self, retrieved_metadata, range_type, visible):
+        """ Returns an unsaved coverage of the retrieved type with the 
+            retrieved metadata.
+        """
+        missing = METADATA_KEYS - set(retrieved_metadata.keys())
+        if missing:
+            raise CommandError(
+                "Missing metadata keys %s." % ", ".join(missing)
+            )
+
+        try:
+            # TODO: allow types of different apps
+            CoverageType = getattr(models, retrieved_metadata["coverage_type"])
+        except AttributeError:
+            raise CommandError(
+                "Type '%s' is not supported." 
+                % retrieved_metadata["coverage_type"]
+            )
+
+        coverage = CoverageType()
+        coverage.range_type = range_type
+        
+        proj = retrieved_metadata.pop("projection")
+        if isinstance(proj, int):
+            retrieved_metadata["srid"] = proj
+        else:
+            definition, format = proj
+
+            # Try to identify the SRID from the given input
+            try:
+                sr = osr.SpatialReference(definition, format)
+                retrieved_metadata["srid"] = sr.srid
+            except Exception:
+                prj = models.Projection.objects.get(
+                    format=format, definition=definition
+                )
+                retrieved_metadata["projection"] = prj
+
+        # TODO: bug in models for some coverages
+        for key, value in retrieved_metadata.items():
+            setattr(coverage, key, value)
+
+        coverage.visible = visible
+        return coverage
+
         
     def _get_overrides(self, identifier=None, size=None, extent=None, 
                        begin_time=None, end_time=None, footprint=None, 
@@ -368,10 +769,14 @@ class Command(CommandOutputMixIn, BaseCommand):
             overrides["identifier"] = identifier
 
         if extent:
-            overrides["extent"] = map(float, extent.split(","))
+            if isinstance(extent, basestring):
+                extent = extent.split(",")
+            overrides["extent"] = map(float, extent)
 
         if size:
-            overrides["size"] = map(int, size.split(","))            
+            if isinstance(size, basestring):
+                size = size.split(",")
+            overrides["size"] = map(int, size)
 
         if begin_time:
             overrides["begin_time"] = parse_datetime(begin_time)
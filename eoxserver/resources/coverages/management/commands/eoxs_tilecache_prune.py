@@ -0,0 +1,72 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+from optparse import make_option
+
+from django.core.management.base import CommandError, BaseCommand
+
+from eoxserver.services.ows.wms.tilecache import get_tile_cache
+from eoxserver.resources.coverages.management.commands import (
+    CommandOutputMixIn
+)
+
+
+class Command(CommandOutputMixIn, BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option("-s", "--max-size", dest="max_size",
+            action="store", type="int", default=None,
+            help=("Optional. Maximum total size of the tiles in bytes. "
+                  "Default is the 'tile_cache_max_size' option.")
+        ),
+        make_option("-r", "--retention-time", dest="retention_time",
+            action="store", type="int", default=None,
+            help=("Optional. Number of seconds after their last access after "
+                  "which tiles are removed. Default is the "
+                  "'tile_cache_retention_time' option.")
+        ),
+    )
+
+    help = """
+        Prunes the WMS tile cache: removes the tiles that exceeded the 
+        retention time and then the least recently accessed tiles until the
+        cache is below its maximum size. Requires the 'tile_cache_directory' 
+        option of the 'services.ows.wms' section to be set. Can be run 
+        periodically, e.g: as a cron job.
+    """
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = int(kwargs.get("verbosity", 1))
+
+        tile_cache = get_tile_cache()
+        if tile_cache is None:
+            raise CommandError("No tile cache directory is configured.")
+
+        count, size = tile_cache.prune(
+            kwargs["max_size"], kwargs["retention_time"]
+        )
+        self.print_msg("Removed %d tiles (%d bytes)." % (count, size))
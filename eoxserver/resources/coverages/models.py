@@ -29,16 +29,22 @@
 
 import logging
 from itertools import chain
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import local
 
 from django.core.exceptions import ValidationError
 from django.contrib.gis.db import models
+from django.db.models import F
+from django.db.models.query import QuerySet
+from django.db.models.signals import pre_delete
 from django.utils.timezone import now
 
 from eoxserver.core import models as base
 from eoxserver.contrib import gdal, osr
 from eoxserver.backends import models as backends
 from eoxserver.resources.coverages.util import (
-    detect_circular_reference, collect_eo_metadata, is_same_grid
+    collect_eo_metadata, extend_eo_metadata, is_same_grid, batched
 )
 
 
@@ -59,6 +65,55 @@ def iscollection(eo_object):
     return issubclass(eo_object.real_type, Collection)
 
 
+_deferred = local()
+
+
+@contextmanager
+def deferred_eo_metadata():
+    """ Context manager to defer the EO metadata updates of collections. Within
+        the context, inserted objects are only recorded per collection and 
+        removals mark the collection for a full recomputation. When the 
+        context is left without an error, the EO metadata of each affected 
+        collection is updated once. Nested contexts are merged into the 
+        outermost one.
+    """
+    if getattr(_deferred, "updates", None) is not None:
+        yield
+        return
+
+    _deferred.updates = {}
+    try:
+        yield
+        updates = _deferred.updates
+    finally:
+        _deferred.updates = None
+
+    for pk, (inserted, recompute) in updates.items():
+        collection = Collection.objects.get(pk=pk).cast()
+        if recompute:
+            collection.update_eo_metadata()
+        else:
+            for batch in batched(inserted):
+                collection.extend_eo_metadata(
+                    EOObject.objects.filter(pk__in=batch)
+                )
+
+
+def _defer_eo_metadata(collection, insert=None, recompute=False):
+    """ Records an EO metadata update of the collection, if updates are 
+        deferred. Returns whether the update was deferred.
+    """
+    updates = getattr(_deferred, "updates", None)
+    if updates is None:
+        return False
+
+    inserted, previous = updates.get(collection.pk, ([], False))
+    if insert is not None:
+        inserted.append(insert.pk)
+    updates[collection.pk] = (inserted, previous or recompute)
+    return True
+
+
 #===============================================================================
 # Metadata classes
 #===============================================================================
@@ -562,12 +617,63 @@ class Collection(EOObject):
         raise NotImplementedError
 
 
-    def update_eo_metadata(self):
+    # whether the footprint of the collection is only the bbox of its members
+    eo_metadata_bbox = False
+
+    def update_eo_metadata(self, exclude=None):
+        """ Recomputes the EO metadata from all members of the collection. """
+        if _defer_eo_metadata(self, recompute=True):
+            return
+
         logger.debug("Updating EO Metadata for %s." % self)
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(self.eo_objects.all())
+        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
+            self.eo_objects.all(), exclude=exclude, bbox=self.eo_metadata_bbox
+        )
+        self.full_clean()
+        self.save()
+
+    def extend_eo_metadata(self, eo_objects):
+        """ Incrementally extends the EO metadata of the collection by the given
+        EO objects, without aggregating the existing members. If a queryset is
+        passed, its EO metadata is aggregated in the database.
+        """
+        logger.debug("Extending EO Metadata for %s." % self)
+
+        # start with the stored metadata, as this instance might be outdated
+        stored = EOObject.objects.get(pk=self.pk)
+        self.begin_time, self.end_time, self.footprint = (
+            stored.begin_time, stored.end_time, stored.footprint
+        )
+
+        if isinstance(eo_objects, QuerySet):
+            # pass self to merge the aggregated with the current metadata
+            values = collect_eo_metadata(
+                eo_objects, insert=[self], bbox=self.eo_metadata_bbox
+            )
+        else:
+            values = extend_eo_metadata(
+                self.begin_time, self.end_time, self.footprint, eo_objects, 
+                bbox=self.eo_metadata_bbox
+            )
+
+        self.begin_time, self.end_time, self.footprint = values
         self.full_clean()
         self.save()
 
+    def insert_batch(self, eo_objects):
+        """ Inserts all given EO objects into the collection. The EO metadata of
+        the collection is aggregated once for the whole batch.
+        """
+        with deferred_eo_metadata():
+            for eo_object in eo_objects:
+                self.insert(eo_object)
+
+        # the metadata was updated on a different instance
+        updated = EOObject.objects.get(pk=self.pk)
+        self.begin_time, self.end_time, self.footprint = (
+            updated.begin_time, updated.end_time, updated.footprint
+        )
+
     # containment methods
 
     def contains(self, eo_object, recursive=False):
@@ -578,16 +684,12 @@ class Collection(EOObject):
         if not isinstance(eo_object, EOObject):
             raise ValueError("Expected EOObject.")
 
-        if self.eo_objects.filter(pk=eo_object.pk).exists():
-            return True
-
         if recursive:
-            for collection in self.eo_objects.filter(collection__isnull=False):
-                collection = collection.cast()
-                if collection.contains(eo_object, recursive):
-                    return True
+            return CollectionClosure.objects.filter(
+                collection=self.pk, eo_object=eo_object.pk
+            ).exists()
 
-        return False
+        return self.eo_objects.filter(pk=eo_object.pk).exists()
 
 
     def __contains__(self, eo_object):
@@ -598,12 +700,17 @@ class Collection(EOObject):
         return iter(self.eo_objects.all())
 
     def iter_cast(self, recursive=False):
-        for eo_object in self.eo_objects.all():
-            eo_object = eo_object.cast()
-            yield eo_object
-            if recursive and iscollection(eo_object):
-                for item in eo_object.iter_cast(recursive):
-                    yield item
+        if recursive:
+            eo_objects = EOObject.objects.filter(
+                pk__in=CollectionClosure.objects.filter(
+                    collection=self.pk
+                ).values("eo_object")
+            )
+        else:
+            eo_objects = self.eo_objects.all()
+
+        for eo_object in eo_objects:
+            yield eo_object.cast()
 
     def __len__(self):
         if self.id == None:
@@ -637,17 +744,24 @@ class EOObjectToCollectionThrough(models.Model):
 
 
     def save(self, *args, **kwargs):
-        if (self._original_eo_object is not None 
+        created = self.pk is None
+        altered = (
+            self._original_eo_object is not None 
             and self._original_collection is not None
             and (self._original_eo_object != self.eo_object
-                 or self._original_collection != self.collection)):
+                 or self._original_collection != self.collection)
+        )
+        if altered:
             logger.debug("Relation has been altered!")
             self._original_collection.remove(self._original_eo_object, self)
+            CollectionClosure.remove_relation(
+                self._original_collection.pk, self._original_eo_object.pk
+            )
 
-        def getter(eo_object):
-            return eo_object.collections.all()
-
-        if detect_circular_reference(self.eo_object, self.collection, getter):
+        if (self.eo_object.pk == self.collection.pk 
+                or CollectionClosure.objects.filter(
+                    collection=self.eo_object.pk, eo_object=self.collection.pk
+                ).exists()):
             raise ValidationError("Circular reference detected.")
 
         # perform the insertion
@@ -658,6 +772,9 @@ class EOObjectToCollectionThrough(models.Model):
 
         super(EOObjectToCollectionThrough, self).save(*args, **kwargs)
 
+        if created or altered:
+            CollectionClosure.add_relation(self.collection.pk, self.eo_object.pk)
+
         self._original_eo_object = self.eo_object
         self._original_collection = self.collection
 
@@ -676,6 +793,158 @@ class EOObjectToCollectionThrough(models.Model):
         verbose_name_plural = "EO Object to Collection Relations"
 
 
+class CollectionClosure(models.Model):
+    """ Materialized transitive closure of the collection hierarchy. There is 
+    one entry for each collection and each of its direct or indirect members,
+    holding the number of distinct paths between them. The entries are 
+    maintained when relations are saved or deleted and allow recursive 
+    containment checks with a single indexed lookup.
+    """
+
+    collection = models.ForeignKey(Collection, related_name="+")
+    eo_object = models.ForeignKey(EOObject, related_name="+")
+    paths = models.PositiveIntegerField(default=1)
+
+    objects = models.GeoManager()
+
+    class Meta:
+        unique_together = (("collection", "eo_object"),)
+
+    @classmethod
+    def add_relation(cls, collection_id, eo_object_id):
+        """ Adds the paths introduced by the relation of the EO object to the
+        collection.
+        """
+        cls._update(collection_id, eo_object_id, 1)
+
+    @classmethod
+    def remove_relation(cls, collection_id, eo_object_id):
+        """ Removes the paths introduced by the relation of the EO object to 
+        the collection.
+        """
+        cls._update(collection_id, eo_object_id, -1)
+
+    @classmethod
+    def add_new_relations(cls, relations):
+        """ Adds the paths of many (collection ID, EO object ID) relations with
+        bulk inserts. This is only valid for EO objects without members and 
+        not yet contained in any collection, e.g. newly registered datasets.
+        """
+        relations = list(relations)
+        collection_ids = set(collection_id for collection_id, _ in relations)
+
+        ancestors = defaultdict(list)
+        for batch in batched(collection_ids):
+            for collection_id, ancestor_id, paths in cls.objects.filter(
+                    eo_object__in=batch).values_list(
+                    "eo_object", "collection", "paths"):
+                ancestors[collection_id].append((ancestor_id, paths))
+
+        entries = defaultdict(int)
+        for collection_id, eo_object_id in relations:
+            entries[collection_id, eo_object_id] += 1
+            for ancestor_id, paths in ancestors[collection_id]:
+                entries[ancestor_id, eo_object_id] += paths
+
+        for batch in batched(entries.items(), 250):
+            cls.objects.bulk_create([
+                cls(collection_id=collection_id, eo_object_id=eo_object_id, 
+                    paths=paths)
+                for (collection_id, eo_object_id), paths in batch
+            ])
+
+    @classmethod
+    def _update(cls, collection_id, eo_object_id, sign):
+        # the collection itself and all collections containing it
+        ancestors = dict(cls.objects.filter(
+            eo_object=collection_id
+        ).values_list("collection", "paths"))
+        ancestors[collection_id] = 1
+
+        # the EO object itself and all its members
+        descendants = dict(cls.objects.filter(
+            collection=eo_object_id
+        ).values_list("eo_object", "paths"))
+        descendants[eo_object_id] = 1
+
+        for ancestor_id, ancestor_paths in ancestors.items():
+            # group the descendants by the change of their path count
+            increments = defaultdict(list)
+            for descendant_id, descendant_paths in descendants.items():
+                increments[ancestor_paths * descendant_paths * sign].append(
+                    descendant_id
+                )
+
+            for increment, descendant_ids in increments.items():
+                for batch in batched(descendant_ids):
+                    qs = cls.objects.filter(
+                        collection=ancestor_id, eo_object__in=batch
+                    )
+                    existing = set(qs.values_list("eo_object", flat=True))
+                    if existing:
+                        qs.update(paths=F("paths") + increment)
+
+                    if sign > 0:
+                        cls.objects.bulk_create([
+                            cls(
+                                collection_id=ancestor_id, 
+                                eo_object_id=descendant_id, paths=increment
+                            )
+                            for descendant_id in batch
+                            if descendant_id not in existing
+                        ])
+                    else:
+                        qs.filter(paths__lte=0).delete()
+
+    @classmethod
+    def rebuild(cls):
+        """ Recreates all entries from the existing relations. """
+        cls.objects.all().delete()
+
+        members = defaultdict(list)
+        for collection_id, eo_object_id in (
+                EOObjectToCollectionThrough.objects.values_list(
+                    "collection", "eo_object")):
+            members[collection_id].append(eo_object_id)
+
+        closures = {}
+        def closure(collection_id):
+            if collection_id not in closures:
+                paths = defaultdict(int)
+                for eo_object_id in members.get(collection_id, ()):
+                    paths[eo_object_id] += 1
+                    for descendant_id, count in closure(eo_object_id).items():
+                        paths[descendant_id] += count
+                closures[collection_id] = paths
+            return closures[collection_id]
+
+        entries = [
+            cls(collection_id=collection_id, eo_object_id=eo_object_id, 
+                paths=paths)
+            for collection_id in members
+            for eo_object_id, paths in closure(collection_id).items()
+        ]
+        for batch in batched(entries, 250):
+            cls.objects.bulk_create(batch)
+
+        return len(entries)
+
+
+def remove_relation_closure(sender, instance, **kwargs):
+    """ Signal handler to remove the paths of a deleted relation from the 
+    closure. This is also invoked for relations deleted in a cascade, e.g when
+    a collection is deleted.
+    """
+    CollectionClosure.remove_relation(
+        instance.collection_id, instance.eo_object_id
+    )
+
+pre_delete.connect(
+    remove_relation_closure, sender=EOObjectToCollectionThrough,
+    dispatch_uid="remove_relation_closure"
+)
+
+
 #===============================================================================
 # Actual Coverage and Collections
 #===============================================================================
@@ -738,21 +1007,14 @@ class RectifiedStitchedMosaic(Coverage, Collection):
                 "Stitched Mosaic '%s'."  % (rectified_dataset, self.identifier)
             )
 
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), insert=[eo_object]
-        )
         # TODO: recalculate size and extent!
-        self.full_clean()
-        self.save()
+        if not _defer_eo_metadata(self, insert=eo_object):
+            self.extend_eo_metadata([eo_object])
         return
 
     def perform_removal(self, eo_object):
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), exclude=[eo_object]
-        )
         # TODO: recalculate size and extent!
-        self.full_clean()
-        self.save()
+        self.update_eo_metadata(exclude=[eo_object])
         return
 
 EO_OBJECT_TYPE_REGISTRY[20] = RectifiedStitchedMosaic
@@ -770,20 +1032,15 @@ class DatasetSeries(Collection):
         verbose_name_plural = "Dataset Series"
 
 
+    eo_metadata_bbox = True
+
     def perform_insertion(self, eo_object, through=None):
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), insert=[eo_object], bbox=True
-        )
-        self.full_clean()
-        self.save()
+        if not _defer_eo_metadata(self, insert=eo_object):
+            self.extend_eo_metadata([eo_object])
         return
 
     def perform_removal(self, eo_object):
-        self.begin_time, self.end_time, self.footprint = collect_eo_metadata(
-            self.eo_objects.all(), exclude=[eo_object], bbox=True
-        )
-        self.full_clean()
-        self.save()
+        self.update_eo_metadata(exclude=[eo_object])
         return
 
 EO_OBJECT_TYPE_REGISTRY[30] = DatasetSeries
@@ -27,21 +27,47 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+import os
+import imp
+import json
+import shutil
+import tempfile
 from datetime import datetime
 from StringIO import StringIO
 from textwrap import dedent
+from unittest import skipUnless
+
+import numpy
 
 from django.test import TestCase
+from django.core.management import call_command
+from django.db.models.signals import post_save
 from django.core.exceptions import ValidationError
 from django.contrib.gis.geos import GEOSGeometry, Polygon, MultiPolygon
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import utc
 
+import eoxserver
 from eoxserver.core import env
+from eoxserver.contrib import gdal, osr
+from eoxserver.backends.models import DataItem
 from eoxserver.resources.coverages.models import *
+from eoxserver.resources.coverages import lookup
 from eoxserver.resources.coverages.metadata.formats import (
     native, eoom, dimap_general
 )
+from eoxserver.processing.preprocessing import WMSPreProcessor
+from eoxserver.processing.preprocessing.format import get_format_selection
+from eoxserver.processing.preprocessing.util import DatasetFactory
+from eoxserver.processing.preprocessing.optimization import (
+    BandSelectionOptimization
+)
+
+
+PREPROCESS_TOOL = os.path.join(
+    os.path.dirname(eoxserver.__file__), os.pardir, "tools", 
+    "eoxserver-preprocess.py"
+)
 
 
 def create(Class, **kwargs):
@@ -222,6 +248,43 @@ class ModelTests(GeometryMixIn, TestCase):
             pass
 
 
+    def test_insert_batch(self):
+        rectified_1, rectified_2, rectified_3 = (
+            self.rectified_1, self.rectified_2, self.rectified_3
+        )
+        mosaic, series_1, series_2 = self.mosaic, self.series_1, self.series_2
+
+        for eo_object in (rectified_1, rectified_2, rectified_3):
+            mosaic.insert(eo_object)
+            series_1.insert(eo_object)
+
+        mosaic.remove(rectified_3)
+        mosaic.insert(rectified_3)
+
+        series_2.insert_batch([rectified_1, rectified_2, rectified_3])
+        mosaic, series_1, series_2 = refresh(mosaic, series_1, series_2)
+
+        begin_time, end_time, footprint = collect_eo_metadata(
+            RectifiedDataset.objects.all()
+        )
+
+        self.assertEqual(len(series_2), 3)
+        self.assertEqual(series_2.time_extent, (begin_time, end_time))
+        self.assertEqual(series_2.time_extent, series_1.time_extent)
+        self.assertGeometryEqual(series_2.footprint, series_1.footprint)
+        self.assertGeometryEqual(mosaic.footprint, footprint)
+
+        with deferred_eo_metadata():
+            series_2.remove(rectified_1)
+            series_2.remove(rectified_2)
+
+        series_2 = refresh(series_2)
+        self.assertEqual(
+            series_2.time_extent, 
+            (rectified_3.begin_time, rectified_3.end_time)
+        )
+
+
     def test_insertion_cascaded(self):
         rectified_1, mosaic, series_1, series_2 = (
             self.rectified_1, self.mosaic, self.series_1, self.series_2
@@ -244,6 +307,136 @@ class ModelTests(GeometryMixIn, TestCase):
             pass
 
 
+    def test_lookup_members(self):
+        rectified_1, rectified_2, mosaic, series_1, series_2 = (
+            self.rectified_1, self.rectified_2, self.mosaic, self.series_1, 
+            self.series_2
+        )
+
+        mosaic.insert(rectified_1)
+        series_1.insert(mosaic)
+        series_1.insert(rectified_2)
+        series_2.insert(series_1)
+
+        self.assertEqual(
+            set(lookup.collection_members([series_2.pk])), set([
+                (series_2.pk, series_1.pk), (series_1.pk, mosaic.pk),
+                (series_1.pk, rectified_2.pk), (mosaic.pk, rectified_1.pk)
+            ])
+        )
+
+        self.assertEqual(
+            set(
+                eo_object.identifier for eo_object in lookup.filter_members(
+                    EOObject.objects.all(), [series_1.pk]
+                )
+            ), set(["mosaic-1", "rectified-1", "rectified-2"])
+        )
+
+        eo_objects = EOObject.objects.filter(
+            identifier__in=["rectified-1", "series-1"]
+        ).order_by("identifier")
+        cast = lookup.cast_eo_objects(eo_objects)
+        self.assertEqual(type(cast[0]), RectifiedDataset)
+        self.assertEqual(type(cast[1]), DatasetSeries)
+
+        lookup.prefetch_coverages(cast)
+        self.assertEqual(cast[0].cached_data_items, [])
+
+        self.assertEqual(
+            set(
+                collection.identifier 
+                for collection in lookup.closure_collections(["series-2"])
+            ), set(["series-2", "series-1", "mosaic-1"])
+        )
+
+        self.assertEqual(
+            set(
+                coverage.identifier for coverage in lookup.closure_coverages(
+                    ["series-1", "rectified-1"]
+                )
+            ), set(["mosaic-1", "rectified-1", "rectified-2"])
+        )
+
+        create(DataItem,
+            dataset=rectified_2, location="rectified-2.tif", semantic="bands"
+        )
+        create(DataItem,
+            dataset=self.rectified_3, location="rectified-3.tif", 
+            semantic="bands"
+        )
+        self.assertEqual(
+            [
+                data_item.location 
+                for data_item in lookup.closure_data_items(["series-2"])
+            ], ["rectified-2.tif"]
+        )
+
+
+    def test_collection_closure(self):
+        rectified_1, mosaic, series_1, series_2 = (
+            self.rectified_1, self.mosaic, self.series_1, self.series_2
+        )
+
+        def closure():
+            return set(CollectionClosure.objects.values_list(
+                "collection", "eo_object", "paths"
+            ))
+
+        mosaic.insert(rectified_1)
+        series_1.insert(mosaic)
+        series_2.insert(series_1)
+        series_2.insert(mosaic)
+
+        self.assertEqual(closure(), set([
+            (mosaic.pk, rectified_1.pk, 1), (series_1.pk, mosaic.pk, 1),
+            (series_1.pk, rectified_1.pk, 1), (series_2.pk, series_1.pk, 1), 
+            (series_2.pk, mosaic.pk, 2), (series_2.pk, rectified_1.pk, 2)
+        ]))
+
+        entries = closure()
+        CollectionClosure.rebuild()
+        self.assertEqual(closure(), entries)
+
+        with self.assertRaises(ValidationError):
+            series_1.insert(series_2)
+
+        series_2.remove(series_1)
+        self.assertTrue(series_2.contains(rectified_1, recursive=True))
+        self.assertFalse(series_2.contains(series_1, recursive=True))
+
+        series_2.insert(series_1)
+        series_1.delete()
+        self.assertEqual(closure(), set([
+            (mosaic.pk, rectified_1.pk, 1), (series_2.pk, mosaic.pk, 1), 
+            (series_2.pk, rectified_1.pk, 1)
+        ]))
+
+
+    def test_add_new_relations(self):
+        rectified_1, rectified_2, series_1, series_2 = (
+            self.rectified_1, self.rectified_2, self.series_1, self.series_2
+        )
+        series_2.insert(series_1)
+
+        CollectionClosure.add_new_relations([
+            (series_1.pk, rectified_1.pk), (series_2.pk, rectified_1.pk),
+            (series_1.pk, rectified_2.pk)
+        ])
+
+        self.assertEqual(
+            set(CollectionClosure.objects.values_list(
+                "collection", "eo_object", "paths"
+            )), set([
+                (series_2.pk, series_1.pk, 1), 
+                (series_1.pk, rectified_1.pk, 1), 
+                (series_2.pk, rectified_1.pk, 2),
+                (series_1.pk, rectified_2.pk, 1),
+                (series_2.pk, rectified_2.pk, 1)
+            ])
+        )
+
+
     def test_insertion_failed(self):
         referenceable, mosaic = self.referenceable, self.mosaic
 
@@ -478,6 +671,373 @@ class MetadataFormatTests(GeometryMixIn, TestCase):
 
         """
         # TODO: find example DIMAP
-        
 
 
+class ManifestRegistrationTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.range_type = create(RangeType, name="Gray")
+        self.series = create(DatasetSeries, identifier="series")
+
+        driver = gdal.GetDriverByName("GTiff")
+        self.filenames = []
+        for i in range(2):
+            filename = os.path.join(self.directory, "image-%d.tif" % i)
+            ds = driver.Create(filename, 10, 10, 1, gdal.GDT_Byte)
+            ds.SetProjection(osr.SpatialReference(4326).wkt)
+            ds.SetGeoTransform((i * 10, 1, 0, 10, 0, -1))
+            ds = None
+            self.filenames.append(filename)
+
+        self.saved = []
+        post_save.connect(self.record_save, dispatch_uid="test_manifest")
+
+    def tearDown(self):
+        post_save.disconnect(dispatch_uid="test_manifest")
+        shutil.rmtree(self.directory)
+
+    def record_save(self, sender, instance, **kwargs):
+        self.saved.append(instance)
+
+    def register(self, entries, **kwargs):
+        manifest = os.path.join(self.directory, "manifest.jsonl")
+        with open(manifest, "w") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+
+        kwargs.setdefault("range_type_name", "Gray")
+        call_command(
+            "eoxs_dataset_register", manifest=manifest, processes=1,
+            verbosity=0, **kwargs
+        )
+
+    def test_register_manifest(self):
+        self.register([{
+            "identifier": "dataset-1", "data": [self.filenames[0]],
+            "semantics": ["bands[1]"], "begin_time": "2013-06-12T00:00:00Z"
+        }, {
+            "identifier": "dataset-2", "data": [self.filenames[1]],
+            "semantics": ["bands[1]"], "extent": [10, 0, 15, 5], 
+            "size": [5, 5]
+        }], begin_time="2013-06-10T00:00:00Z", 
+            end_time="2013-06-11T00:00:00Z", 
+            footprint="POLYGON((0 0, 0 10, 20 10, 20 0, 0 0))",
+            collection_ids=["series"]
+        )
+
+        dataset_1 = RectifiedDataset.objects.get(identifier="dataset-1")
+        dataset_2 = RectifiedDataset.objects.get(identifier="dataset-2")
+
+        # the entry values take precedence over the command line defaults
+        self.assertEqual(
+            dataset_1.begin_time, parse_datetime("2013-06-12T00:00:00Z")
+        )
+        self.assertEqual(
+            dataset_2.begin_time, parse_datetime("2013-06-10T00:00:00Z")
+        )
+        self.assertEqual(
+            dataset_2.end_time, parse_datetime("2013-06-11T00:00:00Z")
+        )
+        self.assertEqual(dataset_1.extent, (0, 0, 10, 10))
+        self.assertEqual(dataset_2.extent, (10, 0, 15, 5))
+        self.assertEqual(dataset_2.size, (5, 5))
+
+        self.assertEqual(
+            [data_item.location for data_item in dataset_2.data_items.all()],
+            [self.filenames[1]]
+        )
+        self.assertEqual(
+            set(self.series.eo_objects.values_list("identifier", flat=True)),
+            set(["dataset-1", "dataset-2"])
+        )
+
+        # the bulk created data items and relations are signalled as well
+        self.assertEqual(
+            set(
+                instance.dataset_id for instance in self.saved 
+                if isinstance(instance, DataItem)
+            ), set([dataset_1.pk, dataset_2.pk])
+        )
+        self.assertTrue(any(
+            isinstance(instance, EOObjectToCollectionThrough) 
+            and instance.collection_id == self.series.pk
+            for instance in self.saved
+        ))
+        # the signalled rows are stored ones, with their primary keys set
+        self.assertTrue(all(instance.pk for instance in self.saved))
+
+
+class PreprocessingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        # a tiled raster of 4 x 3 blocks with two bands
+        self.filename = os.path.join(self.directory, "image.tif")
+        ds = gdal.GetDriverByName("GTiff").Create(
+            self.filename, 64, 48, 2, gdal.GDT_UInt16, 
+            ["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16"]
+        )
+        ds.SetProjection(osr.SpatialReference(4326).wkt)
+        ds.SetGeoTransform((0, 1, 0, 48, 0, -1))
+        random = numpy.random.RandomState(0)
+        self.data = []
+        for index in (1, 2):
+            data = random.randint(0, 2000, (48, 64)).astype(numpy.uint16)
+            ds.GetRasterBand(index).WriteArray(data)
+            self.data.append(data)
+        ds = None
+        self.ds = gdal.Open(self.filename)
+
+    def tearDown(self):
+        self.ds = None
+        shutil.rmtree(self.directory)
+
+    def assertCovers(self, windows, ds):
+        covered = numpy.zeros((ds.RasterYSize, ds.RasterXSize), numpy.int)
+        for xoff, yoff, xsize, ysize in windows:
+            covered[yoff:yoff + ysize, xoff:xoff + xsize] += 1
+        self.assertTrue((covered == 1).all())
+
+    def test_windows_strips(self):
+        # two strips of one block row fit into the budget
+        windows = list(DatasetFactory(2 * 16 * 64 * 2 * 8).windows(self.ds))
+        self.assertEqual(windows, [(0, 0, 64, 32), (0, 32, 64, 16)])
+
+        windows = list(DatasetFactory().windows(self.ds))
+        self.assertEqual(windows, [(0, 0, 64, 48)])
+
+    def test_windows_columns(self):
+        # a single strip exceeds the budget, so it is split into blocks
+        budget = 16 * 16 * 2 * 8
+        windows = list(DatasetFactory(budget).windows(self.ds))
+        self.assertEqual(len(windows), 12)
+        self.assertCovers(windows, self.ds)
+        for xoff, yoff, xsize, ysize in windows:
+            self.assertEqual((xoff % 16, yoff % 16), (0, 0))
+            self.assertLessEqual(xsize * ysize * 2 * 8, budget)
+
+    def test_windows_decimated(self):
+        budget = 16 * 16 * 2 * 8
+        windows = list(DatasetFactory(budget).windows(self.ds, 2))
+        self.assertCovers(windows, self.ds)
+        for xoff, yoff, xsize, ysize in windows:
+            self.assertEqual((xoff % 32, yoff % 32), (0, 0))
+            self.assertLessEqual(
+                -(-xsize // 2) * -(-ysize // 2) * 2 * 8, budget
+            )
+
+    def test_create(self):
+        factory = DatasetFactory(100)
+        ds = factory.create(10, 10, 1)
+        self.assertEqual(ds.GetDriver().ShortName, "MEM")
+
+        # datasets exceeding the budget spill to temporary files
+        ds = factory.create(20, 20, 1)
+        self.assertEqual(ds.GetDriver().ShortName, "GTiff")
+        directory = factory.directory
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+        ds = None
+        factory.close()
+        self.assertFalse(os.path.exists(directory))
+
+    def test_copy(self):
+        factory = DatasetFactory(16 * 16 * 2 * 8)
+        ds = factory.copy(self.ds)
+        self.assertEqual(ds.GetDriver().ShortName, "GTiff")
+        for index, data in enumerate(self.data, 1):
+            self.assertTrue(
+                (ds.GetRasterBand(index).ReadAsArray() == data).all()
+            )
+        ds = None
+        factory.close()
+
+    def test_band_selection(self):
+        bands = [(1, 100, 1000), (1, 100, 1000), (2, "min", "max"), (0,)]
+        factory = DatasetFactory(16 * 16 * 2 * 8)
+        ds = BandSelectionOptimization(bands)(self.ds, factory)
+
+        # the result equals the scaling of the whole bands at once
+        def scale(data, dmin, dmax):
+            return (255 * (
+                (numpy.clip(data, dmin, dmax) - float(dmin)) / 
+                (float(dmax) - float(dmin))
+            )).astype(numpy.uint8)
+
+        expected = [
+            scale(self.data[0], 100, 1000), scale(self.data[0], 100, 1000), 
+            scale(self.data[1], self.data[1].min(), self.data[1].max()),
+            numpy.zeros((48, 64), numpy.uint8)
+        ]
+        self.assertEqual(ds.RasterCount, 4)
+        for index, data in enumerate(expected, 1):
+            self.assertTrue(
+                (ds.GetRasterBand(index).ReadAsArray() == data).all()
+            )
+        ds = None
+        factory.close()
+
+    def test_footprint_decimation(self):
+        # data within a triangle, surrounded by no-data
+        ds = gdal.GetDriverByName("MEM").Create("", 64, 48, 1, gdal.GDT_Byte)
+        ds.SetProjection(osr.SpatialReference(4326).wkt)
+        ds.SetGeoTransform((0, 1, 0, 48, 0, -1))
+        y, x = numpy.mgrid[0:48, 0:64]
+        data = (x >= 4) & (y >= 4) & (y < 44) & (x + y < 64)
+        ds.GetRasterBand(1).WriteArray(data.astype(numpy.uint8) * 255)
+
+        def footprint(decimation, budget=None):
+            preprocessor = WMSPreProcessor(
+                get_format_selection("GTiff"), footprint_decimation=decimation
+            )
+            factory = DatasetFactory(budget)
+            try:
+                return GEOSGeometry(
+                    preprocessor._generate_footprint_wkt(ds, factory)
+                )
+            finally:
+                factory.close()
+
+        full = footprint(1)
+        self.assertAlmostEqual(full.area, data.sum(), delta=40)
+
+        # the decimated footprints deviate by at most the decimation factor
+        # and the simplification tolerance of two pixels, also when the mask
+        # is computed in column windows
+        for decimated, tolerance in ((footprint(2, 512), 4), 
+                                     (footprint(4), 6)):
+            self.assertTrue(full.buffer(tolerance).contains(decimated))
+            self.assertTrue(decimated.buffer(tolerance).contains(full))
+
+
+@skipUnless(os.path.exists(PREPROCESS_TOOL), "Requires a source checkout.")
+class BatchPreprocessingTests(TestCase):
+    def setUp(self):
+        self.tool = imp.load_source("eoxserver_preprocess", PREPROCESS_TOOL)
+        self.tool._preprocess = self.preprocess
+        self.format_selection = get_format_selection("GTiff")
+
+        self.directory = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.directory, "input")
+        self.output_dir = os.path.join(self.directory, "output")
+        os.mkdir(self.input_dir)
+        for name in ("b.tif", "a.tif", "readme.txt"):
+            open(os.path.join(self.input_dir, name), "w").close()
+
+        self.processed = []
+        self.failing = set()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def preprocess(self, format_selection, values, input_filename, 
+                   output_filename, output_md_filename, geo_reference, 
+                   generate_metadata, metadata_values):
+        name = os.path.basename(input_filename)
+        self.processed.append(name)
+        open(output_filename, "w").close()
+        if name in self.failing:
+            raise RuntimeError("Failed to process '%s'." % name)
+
+        if generate_metadata:
+            open(output_md_filename, "w").close()
+
+    def run_batch(self, generate_metadata=False, force=False, 
+                  metadata_values=None):
+        self.processed = []
+        jobs = self.tool._get_batch_jobs(
+            self.input_dir, self.output_dir, "*.tif", metadata_values or {}
+        )
+        self.tool._init_batch_worker((
+            self.format_selection, {}, None, generate_metadata, force, False
+        ))
+        return dict(
+            (os.path.basename(input_filename), status) 
+            for input_filename, status, _, _ 
+            in map(self.tool._run_batch_job, jobs)
+        )
+
+    def test_jobs(self):
+        jobs = self.tool._get_batch_jobs(
+            self.input_dir, self.output_dir, "*.tif", {"begin_time": "now"}
+        )
+        self.assertEqual(jobs, [
+            (
+                os.path.join(self.input_dir, "a.tif"), 
+                os.path.join(self.output_dir, "a"),
+                {"coverage_id": "a", "begin_time": "now"}
+            ), (
+                os.path.join(self.input_dir, "b.tif"), 
+                os.path.join(self.output_dir, "b"),
+                {"coverage_id": "b", "begin_time": "now"}
+            )
+        ])
+        self.assertTrue(os.path.isdir(self.output_dir))
+
+    def test_manifest_jobs(self):
+        manifest = os.path.join(self.input_dir, "manifest.txt")
+        with open(manifest, "w") as f:
+            f.write(dedent("""\
+                # comment
+                a.tif
+                b.tif b_id 2013-06-10T00:00:00Z 2013-06-11T00:00:00Z
+            """))
+
+        jobs = self.tool._get_batch_jobs(manifest, self.output_dir, "*", {})
+        self.assertEqual(
+            [(os.path.basename(i), m) for i, _, m in jobs], [
+                ("a.tif", {"coverage_id": "a"}),
+                ("b.tif", {
+                    "coverage_id": "b_id", 
+                    "begin_time": "2013-06-10T00:00:00Z",
+                    "end_time": "2013-06-11T00:00:00Z"
+                })
+            ]
+        )
+
+    def test_resume(self):
+        self.failing.add("b.tif")
+        self.assertEqual(self.run_batch(), {"a.tif": "done", "b.tif": "failed"})
+        self.assertEqual(
+            sorted(os.listdir(self.output_dir)), ["a.tif", "b.part.tif"]
+        )
+
+        # completed outputs are skipped when the batch is run again
+        self.failing.clear()
+        self.assertEqual(
+            self.run_batch(), {"a.tif": "skipped", "b.tif": "done"}
+        )
+        self.assertEqual(self.processed, ["b.tif"])
+        self.assertEqual(
+            sorted(os.listdir(self.output_dir)), ["a.tif", "b.tif"]
+        )
+
+        self.assertEqual(
+            self.run_batch(force=True), {"a.tif": "done", "b.tif": "done"}
+        )
+
+    def test_resume_metadata(self):
+        metadata_values = {
+            "begin_time": "2013-06-10T00:00:00Z", 
+            "end_time": "2013-06-11T00:00:00Z"
+        }
+        self.run_batch(metadata_values=metadata_values)
+
+        # outputs without their metadata file are not complete
+        self.assertEqual(
+            self.run_batch(True, metadata_values=metadata_values), 
+            {"a.tif": "done", "b.tif": "done"}
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(self.output_dir, "a.xml"))
+        )
+        self.assertEqual(
+            self.run_batch(True, metadata_values=metadata_values), 
+            {"a.tif": "skipped", "b.tif": "skipped"}
+        )
+
+    def test_invalid_metadata(self):
+        self.assertEqual(
+            self.run_batch(True), {"a.tif": "failed", "b.tif": "failed"}
+        )
+        self.assertEqual(self.processed, [])
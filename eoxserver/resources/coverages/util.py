@@ -31,13 +31,27 @@
 
 import operator
 
+from django.db import connection
 from django.db.models import Min, Max
-from django.contrib.gis.db.models import Union
+from django.contrib.gis.db.models import Union, Extent
 from django.contrib.gis.geos import MultiPolygon, Polygon
 from django.utils.timezone import is_naive, make_aware, get_current_timezone
 from django.utils.dateparse import parse_datetime
 
 
+def batched(values, size=None):
+    """ Split the given values into lists suitable for ``__in`` lookups. SQLite
+        limits the number of query parameters, so batches are required there.
+        Other databases get a single batch.
+    """
+    values = list(values)
+    if size is None:
+        size = 900 if connection.vendor == "sqlite" else len(values) or 1
+
+    for i in xrange(0, len(values), size):
+        yield values[i:i + size]
+
+
 def pk_equals(first, second):
     return first.pk == second.pk
 
@@ -68,13 +82,17 @@ def collect_eo_metadata(qs, insert=None, exclude=None, bbox=False):
         pk__in=[eo_object.pk for eo_object in exclude or ()]
     ).aggregate(
         begin_time=Min("begin_time"), end_time=Max("end_time"),
-        footprint=Union("footprint")
+        # the extent is much cheaper than the union, if only the bbox is needed
+        footprint=Extent("footprint") if bbox else Union("footprint")
     )
 
     begin_time, end_time, footprint = (
         values["begin_time"], values["end_time"], values["footprint"]
     )
 
+    if bbox and footprint is not None:
+        footprint = MultiPolygon(Polygon.from_bbox(footprint))
+
     # workaround for Django 1.4 bug: aggregate times are strings
     if isinstance(begin_time, basestring):
         begin_time = parse_datetime(begin_time)
@@ -87,7 +105,21 @@ def collect_eo_metadata(qs, insert=None, exclude=None, bbox=False):
     if end_time and is_naive(end_time):
         end_time = make_aware(end_time, get_current_timezone())
 
-    for eo_object in insert or ():
+    return extend_eo_metadata(
+        begin_time, end_time, footprint, insert or (), bbox
+    )
+
+
+def extend_eo_metadata(begin_time, end_time, footprint, eo_objects, 
+                       bbox=False):
+    """ Helper function to extend the given EO metadata by the metadata of the
+    EO objects, without any database access. If bbox is `True` then the 
+    returned polygon will only be a minimal bounding box of the footprints.
+    """
+
+    footprints = [footprint] if footprint is not None else []
+
+    for eo_object in eo_objects:
         if begin_time is None:
             begin_time = eo_object.begin_time
         elif eo_object.begin_time is not None:
@@ -98,16 +130,28 @@ def collect_eo_metadata(qs, insert=None, exclude=None, bbox=False):
         elif eo_object.end_time is not None:
             end_time = max(end_time, eo_object.end_time)
 
-        if footprint is None:
-            footprint = eo_object.footprint
-        elif eo_object.footprint is not None:
-            footprint = footprint.union(eo_object.footprint)
+        if eo_object.footprint is not None:
+            footprints.append(eo_object.footprint)
 
-    if not isinstance(footprint, MultiPolygon) and footprint is not None:
-        footprint = MultiPolygon(footprint)
+    if not footprints:
+        return begin_time, end_time, None
 
-    if bbox and footprint is not None:
-        footprint = MultiPolygon(Polygon.from_bbox(footprint.extent))
+    if bbox:
+        # merging the extents is sufficient, no union required
+        extents = [footprint.extent for footprint in footprints]
+        return begin_time, end_time, MultiPolygon(Polygon.from_bbox((
+            min(extent[0] for extent in extents),
+            min(extent[1] for extent in extents),
+            max(extent[2] for extent in extents),
+            max(extent[3] for extent in extents)
+        )))
+
+    footprint = footprints[0]
+    for other in footprints[1:]:
+        footprint = footprint.union(other)
+
+    if not isinstance(footprint, MultiPolygon):
+        footprint = MultiPolygon(footprint)
 
     return begin_time, end_time, footprint
 
@@ -30,6 +30,7 @@
 from os.path import splitext, abspath
 from datetime import datetime
 from uuid import uuid4
+from contextlib import contextmanager
 import logging
 
 from django.contrib.gis.geos import GEOSGeometry
@@ -38,7 +39,7 @@ from eoxserver.core import Component, implements
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import config
 from eoxserver.core.util.rect import Rect
-from eoxserver.backends.access import connect
+from eoxserver.backends.access import connect, is_virtual_path
 from eoxserver.contrib import gdal, osr
 from eoxserver.contrib.vrt import VRTBuilder
 from eoxserver.resources.coverages import models
@@ -77,44 +78,42 @@ class GDALReferenceableDatasetRenderer(Component):
 
         # GDAL source dataset. Either a single file dataset or a composed VRT 
         # dataset.
-        src_ds = self.get_source_dataset(
-            coverage, data_items, range_type
-        )
-
-        # retrieve area of interest of the source image according to given 
-        # subsets
-        src_rect, dst_rect = self.get_source_and_dest_rect(src_ds, subsets)
+        with self.get_source_dataset(
+                coverage, data_items, range_type) as src_ds:
+            # retrieve area of interest of the source image according to given 
+            # subsets
+            src_rect, dst_rect = self.get_source_and_dest_rect(src_ds, subsets)
 
-        # deduct "native" format of the source image
-        native_format = data_items[0].format if len(data_items) == 1 else None
+            # deduct "native" format of the source image
+            native_format = data_items[0].format if len(data_items) == 1 else None
 
-        # get the requested image format, which defaults to the native format
-        # if available
-        frmt = params.format or native_format
+            # get the requested image format, which defaults to the native format
+            # if available
+            frmt = params.format or native_format
 
-        if not frmt:
-            raise RenderException("No format specified.", "format")
+            if not frmt:
+                raise RenderException("No format specified.", "format")
 
-        if params.scalefactor is not None or params.scales:
-            raise RenderException(
-                "ReferenceableDataset cannot be scaled.",
-                "scalefactor" if params.scalefactor is not None else "scale"
-            )
-
-        maxsize = WCSConfigReader(get_eoxserver_config()).maxsize
-        if maxsize is not None:
-            if maxsize < dst_rect.size_x or maxsize < dst_rect.size_y:
+            if params.scalefactor is not None or params.scales:
                 raise RenderException(
-                    "Requested image size %dpx x %dpx exceeds the allowed "
-                    "limit maxsize=%dpx." % (
-                        dst_rect.size_x, dst_rect.size_y, maxsize
-                    ), "size"
+                    "ReferenceableDataset cannot be scaled.",
+                    "scalefactor" if params.scalefactor is not None else "scale"
                 )
 
-        # perform subsetting either with or without rangesubsetting
-        subsetted_ds = self.perform_subset(
-            src_ds, range_type, src_rect, dst_rect, params.rangesubset
-        )
+            maxsize = WCSConfigReader(get_eoxserver_config()).maxsize
+            if maxsize is not None:
+                if maxsize < dst_rect.size_x or maxsize < dst_rect.size_y:
+                    raise RenderException(
+                        "Requested image size %dpx x %dpx exceeds the allowed "
+                        "limit maxsize=%dpx." % (
+                            dst_rect.size_x, dst_rect.size_y, maxsize
+                        ), "size"
+                    )
+
+            # perform subsetting either with or without rangesubsetting
+            subsetted_ds = self.perform_subset(
+                src_ds, range_type, src_rect, dst_rect, params.rangesubset
+            )
 
         # encode the processed dataset and save it to the filesystem
         out_ds, out_driver = self.encode(
@@ -161,9 +160,14 @@ class GDALReferenceableDatasetRenderer(Component):
         return result_set
 
 
+    @contextmanager
     def get_source_dataset(self, coverage, data_items, range_type):
+        """ Context manager for the GDAL source dataset. Single file datasets
+            are checked out of the process-wide dataset pool.
+        """
         if len(data_items) == 1:
-            return gdal.OpenShared(abspath(connect(data_items[0])))
+            with gdal.open_pooled(get_path(data_items[0])) as ds:
+                yield ds
         else:
             vrt = VRTBuilder(
                 coverage.size_x, coverage.size_y,
@@ -176,7 +180,7 @@ class GDALReferenceableDatasetRenderer(Component):
             gcps = []
             compound_index = 0
             for data_item in data_items:
-                path = abspath(connect(data_item))
+                path = get_path(data_item)
 
                 # iterate over all bands of the data item
                 for set_index, item_index in self._data_item_band_indices(data_item):
@@ -190,7 +194,7 @@ class GDALReferenceableDatasetRenderer(Component):
                         set_index, path, item_index
                     )
 
-            return vrt.dataset
+            yield vrt.dataset
 
 
     def get_source_and_dest_rect(self, dataset, subsets):
@@ -311,6 +315,16 @@ def _get_gtiff_options(compression=None, jpeg_quality=None,
             yield ("BLOCKYSIZE", str(tileheight))
 
 
+def get_path(data_item):
+    """ Returns the path to open the data item with GDAL. Local paths are made
+        absolute, virtual file system paths are returned as they are.
+    """
+    path = connect(data_item)
+    if is_virtual_path(path):
+        return path
+    return abspath(path)
+
+
 class WCSConfigReader(config.Reader):
     section = "services.ows.wcs"
     maxsize = config.Option(type=int, default=None)
@@ -0,0 +1,69 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+""" Caching helpers for the MapServer based renderers.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class MapTemplateCache(object):
+    """ A size bounded, least recently used cache of prepared map templates.
+    """
+    def __init__(self):
+        self.templates = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            template = self.templates.pop(key, None)
+            if template is not None:
+                self.templates[key] = template
+            return template
+
+    def put(self, key, template, max_size):
+        with self.lock:
+            self.templates.pop(key, None)
+            self.templates[key] = template
+            while len(self.templates) > max_size:
+                self.templates.popitem(last=False)
+
+    def remove(self, predicate):
+        """ Removes all templates for which ``predicate(key, template)`` is 
+            true.
+        """
+        with self.lock:
+            for key, template in self.templates.items():
+                if predicate(key, template):
+                    del self.templates[key]
+
+    def clear(self):
+        with self.lock:
+            self.templates.clear()
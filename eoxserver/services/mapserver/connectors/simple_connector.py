@@ -64,10 +64,10 @@ class SimpleConnector(Component):
             e = wrap_extent_around_dateline(coverage.extent, coverage.srid)
 
             vrt_path = join("/vsimem", uuid4().hex)
-            ds = gdal.Open(data)
-            vrt_ds = create_simple_vrt(ds, vrt_path)
-            size_x = ds.RasterXSize
-            size_y = ds.RasterYSize
+            with gdal.open_pooled(data) as ds:
+                vrt_ds = create_simple_vrt(ds, vrt_path)
+                size_x = ds.RasterXSize
+                size_y = ds.RasterYSize
             
             dx = abs(e[0] - e[2]) / size_x
             dy = abs(e[1] - e[3]) / size_y 
@@ -42,6 +42,7 @@ class WCSConfigReader(config.Reader):
     section = "services.ows.wcs"
     supported_formats = config.Option(type=typelist(str, ","), default=())
     maxsize = config.Option(type=int, default=None)
+    map_cache_size = config.Option(type=int, default=32)
 
     section = "services.ows"
     update_sequence = config.Option(default="0")
@@ -29,12 +29,17 @@
 
 from datetime import datetime
 from urllib import unquote
+from hashlib import sha1
+from threading import Lock
 import logging
 
 from lxml import etree
+from django.db.models.signals import post_save, post_delete
 
 from eoxserver.core import implements, ExtensionPoint
+from eoxserver.core.config import get_eoxserver_config
 from eoxserver.contrib import mapserver as ms
+from eoxserver.backends.models import DataItem
 from eoxserver.resources.coverages import models, crss
 from eoxserver.resources.coverages.formats import getFormatRegistry
 from eoxserver.services.exceptions import NoSuchCoverageException
@@ -48,8 +53,9 @@ from eoxserver.services.mapserver.interfaces import (
 )
 from eoxserver.services.subset import Subsets
 from eoxserver.services.mapserver.wcs.base_renderer import (
-    BaseRenderer, is_format_supported
+    BaseRenderer, WCSConfigReader, is_format_supported
 )
+from eoxserver.services.mapserver.cache import MapTemplateCache
 from eoxserver.services.ows.version import Version
 from eoxserver.services.result import result_set_from_raw_data, ResultBuffer
 from eoxserver.services.exceptions import (
@@ -110,11 +116,6 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
         if issubclass(coverage.real_type, models.ReferenceableDataset):
             raise NoSuchCoverageException((coverage.identifier,))
 
-        data_items = self.data_items_for_coverage(coverage)
-
-        range_type = coverage.range_type
-        bands = list(range_type)
-
         subsets = params.subsets
 
         if subsets:
@@ -126,52 +127,23 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
                         "'%s'." % srid, "subset"
                     )
 
-        # create and configure map object
-        map_ = self.create_map()
-
-        # configure outputformat
-        native_format = self.get_native_format(coverage, data_items)
-        if get_format_by_mime(native_format) is None:
-            native_format = "image/tiff"
-
-        frmt = params.format or native_format
-
-        if frmt is None:
-            raise RenderException("Format could not be determined", "format")
-
-        mime_type, frmt = split_format(frmt)
-
-        imagemode = ms.gdalconst_to_imagemode(bands[0].data_type)
-        time_stamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        basename = "%s_%s" % (coverage.identifier, time_stamp)
-        of = create_outputformat(
-            mime_type, frmt, imagemode, basename,
-            getattr(params, "encoding_params", {})
-        )
-
-        map_.appendOutputFormat(of)
-        map_.setOutputFormat(of)
-
-        # TODO: use layer factory here
-        layer = self.layer_for_coverage(coverage, native_format, params.version)
-
-        map_.insertLayer(layer)
-
-        for connector in self.connectors:
-            if connector.supports(data_items):
-                break
-        else:
-            raise OperationNotSupportedException(
-                "Could not find applicable layer connector.", "coverage"
+        # get the prepared map, layer and connector for the coverage
+        template = self.get_map_template(coverage, params)
+        map_, layer = template.instantiate(
+            "%s_%s" % (
+                coverage.identifier, datetime.now().strftime("%Y%m%d%H%M%S")
             )
+        )
+        connector = template.connector
+        data_items = template.data_items
 
         try:
             connector.connect(coverage, data_items, layer)
             # create request object and dispatch it against the map
             request = ms.create_request(
-                self.translate_params(params, range_type)
+                self.translate_params(params, template.range_type)
             )
-            request.setParameter("format", mime_type)
+            request.setParameter("format", template.mime_type)
             raw_result = ms.dispatch(map_, request)
 
         finally:
@@ -208,6 +180,106 @@ class RectifiedCoverageMapServerRenderer(BaseRenderer):
         # "default" response
         return result_set
 
+    def get_map_template(self, coverage, params):
+        """ Returns the ``CoverageMapTemplate`` for the coverage and the 
+            requested format. Templates are cached per process and reused by
+            subsequent requests with the same coverage, format and encoding 
+            parameters, as long as the stamp of the coverage is unchanged.
+        """
+        encoding_params = getattr(params, "encoding_params", {})
+        cache_size = WCSConfigReader(get_eoxserver_config()).map_cache_size
+        if not cache_size:
+            return self.create_map_template(
+                coverage, params.version, params.format, encoding_params
+            )
+
+        key = (
+            coverage.pk, self.get_template_stamp(coverage), 
+            str(params.version), params.format, 
+            repr(sorted(encoding_params.items()))
+        )
+
+        template = coverage_map_templates.get(key)
+        if template is None:
+            template = self.create_map_template(
+                coverage, params.version, params.format, encoding_params
+            )
+            coverage_map_templates.put(key, template, cache_size)
+
+        return template
+
+    def get_template_stamp(self, coverage):
+        """ Returns a stamp of the database state the map template of the 
+            coverage is derived from: the coverage itself, its data items and
+            the bands of its range type. Primary keys may be reused once a 
+            coverage is deleted and changes in other processes are not 
+            signalled to this one, so the key alone does not identify a 
+            template.
+        """
+        data_items = DataItem.objects.filter(
+            dataset=coverage.dataset_ptr_id
+        ).order_by("pk").values_list(
+            "pk", "location", "format", "semantic", "storage", "package"
+        )
+        bands = models.Band.objects.filter(
+            range_type=coverage.range_type_id
+        ).order_by("index", "pk").values_list(
+            "pk", "index", "name", "identifier", "data_type", 
+            "color_interpretation", "nil_value_set__nil_values__raw_value"
+        )
+        return sha1(repr((
+            coverage.identifier, coverage.real_content_type, 
+            coverage.range_type_id, coverage.srid, coverage.projection_id, 
+            coverage.extent, coverage.size, list(data_items), list(bands)
+        ))).hexdigest()
+
+    def create_map_template(self, coverage, version, frmt, encoding_params):
+        data_items = list(self.data_items_for_coverage(coverage))
+
+        range_type = coverage.range_type
+        bands = list(range_type)
+
+        # create and configure map object
+        map_ = self.create_map()
+
+        # configure outputformat
+        native_format = self.get_native_format(coverage, data_items)
+        if get_format_by_mime(native_format) is None:
+            native_format = "image/tiff"
+
+        frmt = frmt or native_format
+
+        if frmt is None:
+            raise RenderException("Format could not be determined", "format")
+
+        mime_type, frmt = split_format(frmt)
+
+        imagemode = ms.gdalconst_to_imagemode(bands[0].data_type)
+        of = create_outputformat(
+            mime_type, frmt, imagemode, coverage.identifier, encoding_params
+        )
+
+        map_.appendOutputFormat(of)
+        map_.setOutputFormat(of)
+
+        # TODO: use layer factory here
+        layer = self.layer_for_coverage(coverage, native_format, version)
+
+        map_.insertLayer(layer)
+
+        for connector in self.connectors:
+            if connector.supports(data_items):
+                break
+        else:
+            raise OperationNotSupportedException(
+                "Could not find applicable layer connector.", "coverage"
+            )
+
+        return CoverageMapTemplate(
+            map_, layer.index, connector, data_items, range_type, mime_type,
+            of.extension, coverage.dataset_ptr_id
+        )
+
     def translate_params(self, params, range_type):
         """ "Translate" parameters to be understandable by mapserver.
         """
@@ -360,3 +432,58 @@ def get_format_by_mime(mime_type):
         return None
 
     return reg_format
+
+
+class CoverageMapTemplate(object):
+    """ A prepared map with the output format and the layer of a coverage, 
+        together with all objects required to connect the layer. 
+        Instantiating the template returns a clone of the map and its layer.
+    """
+
+    def __init__(self, map_, layer_index, connector, data_items, range_type,
+                 mime_type, extension, dataset_id):
+        self.map = map_
+        self.layer_index = layer_index
+        self.connector = connector
+        self.data_items = data_items
+        self.range_type = range_type
+        self.mime_type = mime_type
+        self.extension = extension
+        self.dataset_id = dataset_id
+        self.lock = Lock()
+
+    def instantiate(self, basename):
+        with self.lock:
+            map_ = self.map.clone()
+
+        map_.outputformat.setOption("FILENAME", str(basename + self.extension))
+        return map_, map_.getLayer(self.layer_index)
+
+
+coverage_map_templates = MapTemplateCache()
+
+
+def invalidate_coverage_map_templates(sender, instance, **kwargs):
+    """ Signal handler to drop the cached map templates of coverages that 
+        changed or whose data items changed. Changes of range types drop all
+        templates.
+    """
+    if isinstance(instance, models.Coverage):
+        coverage_map_templates.remove(lambda key, _: key[0] == instance.pk)
+    elif isinstance(instance, DataItem):
+        coverage_map_templates.remove(
+            lambda _, template: template.dataset_id == instance.dataset_id
+        )
+    elif isinstance(instance, (
+            models.RangeType, models.Band, models.NilValueSet, 
+            models.NilValue)):
+        coverage_map_templates.clear()
+
+post_save.connect(
+    invalidate_coverage_map_templates, 
+    dispatch_uid="invalidate_coverage_map_templates_save"
+)
+post_delete.connect(
+    invalidate_coverage_map_templates, 
+    dispatch_uid="invalidate_coverage_map_templates_delete"
+)
@@ -162,6 +162,9 @@ class PlainLayerMixIn(object):
         return layer
 
     def get_render_options(self, coverage):
+        # use the render options prefetched by the layer lookup, if available
+        if hasattr(coverage, "cached_render_options"):
+            return coverage.cached_render_options
         try:
             return service_models.WMSRenderOptions.objects.get(
                 coverage=coverage
@@ -169,6 +172,31 @@ class PlainLayerMixIn(object):
         except service_models.WMSRenderOptions.DoesNotExist:
             return None
 
+    def get_data_items(self, coverage, semantic=None, 
+                       semantic_startswith=None):
+        """ Returns the data items of the coverage, optionally filtered by 
+            their semantic. Uses the data items prefetched by the layer lookup
+            if available.
+        """
+        data_items = getattr(coverage, "cached_data_items", None)
+        if data_items is None:
+            data_items = coverage.data_items.all()
+            if semantic is not None:
+                data_items = data_items.filter(semantic=semantic)
+            if semantic_startswith is not None:
+                data_items = data_items.filter(
+                    semantic__startswith=semantic_startswith
+                )
+            return data_items
+
+        return [
+            data_item for data_item in data_items
+            if (semantic is None or data_item.semantic == semantic) and (
+                semantic_startswith is None 
+                or data_item.semantic.startswith(semantic_startswith)
+            )
+        ]
+
     def set_render_options(self, layer, offsite=None, options=None):
         if offsite:
             layer.offsite = offsite
@@ -221,7 +249,7 @@ class BaseCoverageLayerFactory(OffsiteColorMixIn, PlainLayerMixIn, Component):
         extent = coverage.extent
         srid = coverage.srid
 
-        data_items = coverage.data_items.all()
+        data_items = self.get_data_items(coverage)
         range_type = coverage.range_type
 
         offsite = self.offsite_color_from_range_type(range_type)
@@ -59,8 +59,8 @@ class ColorizedMaskLayerFactory(BaseStyleMixIn, AbstractLayerFactory):
         if mask_name not in self.enabled_masks:
             return
 
-        mask_items = coverage.data_items.filter(
-            semantic="polygonmask[%s]" % mask_name
+        mask_items = self.get_data_items(
+            coverage, semantic="polygonmask[%s]" % mask_name
         )
 
         # externaly enforced group or multiple groupped masks 
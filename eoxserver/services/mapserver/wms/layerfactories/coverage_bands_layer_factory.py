@@ -95,7 +95,7 @@ class CoverageBandsLayerFactory(OffsiteColorMixIn, AbstractLayerFactory):
         self.set_render_options(layer, offsite, options)
 
         layer.setProcessingKey("BANDS", indices_str)
-        yield (layer, coverage.data_items.all())
+        yield (layer, self.get_data_items(coverage))
 
     def generate_group(self, name):
         return Layer(name)
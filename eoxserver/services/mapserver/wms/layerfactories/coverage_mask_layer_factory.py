@@ -48,9 +48,12 @@ class CoverageMaskedLayerFactory(BaseCoverageLayerFactory):
 
         # get the applicable sematics 
         mask_semantics = ("polygonmask",)
-        mask_items = eo_object.data_items.all()
+        mask_items = self.get_data_items(eo_object)
         for mask_semantic in mask_semantics:
-            mask_items = mask_items.filter(semantic__startswith=mask_semantic)
+            mask_items = [
+                mask_item for mask_item in mask_items 
+                if mask_item.semantic.startswith(mask_semantic)
+            ]
 
         # layer creating closure 
         def _create_mask_polygon_layer(name):
@@ -57,8 +57,8 @@ class CoverageMaskedOutlinesLayerFactory(BaseStyleMixIn, PolygonLayerMixIn, Abst
         coverage = eo_object.cast()
         layer.setMetaData("eoxs_geometry_reversed", "true")
 
-        mask_items = coverage.data_items.filter(
-            semantic__startswith="polygonmask"
+        mask_items = self.get_data_items(
+            coverage, semantic_startswith="polygonmask"
         )
 
         # use the whole footprint if no mask is given
@@ -28,18 +28,27 @@
 
 
 import logging
+from hashlib import sha1
 from itertools import chain
+from threading import Lock
 
 from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
 from django.utils.datastructures import SortedDict
 
 from eoxserver.core import Component, ExtensionPoint
 from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
 from eoxserver.contrib import mapserver as ms
+from eoxserver.backends.models import DataItem
+from eoxserver.resources.coverages.models import (
+    EOObject, EOObjectToCollectionThrough
+)
 from eoxserver.resources.coverages.crss import CRSsConfigReader
 from eoxserver.services.mapserver.interfaces import (
     ConnectorInterface, LayerFactoryInterface, StyleApplicatorInterface
 )
+from eoxserver.services.mapserver.cache import MapTemplateCache
 from eoxserver.services.result import result_set_from_raw_data, get_content_type
 from eoxserver.services.exceptions import RenderException
 from eoxserver.services.ows.wms.exceptions import InvalidCRS, InvalidFormat
@@ -57,6 +66,19 @@ class MapServerWMSBaseComponent(Component):
 
 
     def render(self, layer_groups, request_values, **options):
+        map_, session = self.get_map(layer_groups, options)
+
+        self.check_parameters(map_, request_values)
+        
+        with session:
+            request = ms.create_request(request_values)
+            raw_result = ms.dispatch(map_, request)
+
+            result = result_set_from_raw_data(raw_result)
+            return result, get_content_type(result)
+
+
+    def create_map(self):
         map_ = ms.Map()
         map_.setMetaData("ows_enable_request", "*")
         map_.setProjection("EPSG:4326")
@@ -69,17 +91,112 @@ class MapServerWMSBaseComponent(Component):
         )
         map_.setMetaData("ows_srs", crss_string)
         map_.setMetaData("wms_srs", crss_string)
+        return map_
+
+
+    def get_map(self, layer_selection, options):
+        """ Returns a map with all layers of the layer selection and the 
+            ``ConnectorSession`` to connect them. Assembled maps are kept as 
+            templates, so that subsequent requests for the same selection only
+            get a clone of the template. All request specific parameters 
+            (BBOX, size, TIME) are applied by the dispatched request.
+        """
+        cache_size = MapTemplateConfigReader(
+            get_eoxserver_config()
+        ).map_template_cache_size
+
+        if not cache_size:
+            map_ = self.create_map()
+            return map_, self.setup_map(layer_selection, map_, options)
+
+        key = self.get_map_key(layer_selection, options)
+        template = map_templates.get(key)
+        if template is None:
+            map_ = self.create_map()
+            session = self.setup_map(layer_selection, map_, options)
+            template = MapTemplate(map_, session)
+            map_templates.put(key, template, cache_size)
+
+        return template.instantiate()
+
+
+    def get_map_key(self, layer_selection, options):
+        """ Returns a key identifying the map of a layer selection: the 
+            selected EO objects with their names and suffixes, the stamp of 
+            their database state and the rendering options. The TIME is not 
+            part of the key, as it only affects the selection itself.
+        """
+        selection = tuple(
+            (
+                tuple(collection.pk for collection in collections),
+                coverage.pk if coverage else None, name, suffix
+            )
+            for collections, coverage, name, suffix in layer_selection.walk()
+        )
+        options = tuple(
+            (key, repr(value)) for key, value in sorted(options.items())
+            if key != "time"
+        )
+        return selection, self.get_map_stamp(layer_selection), options
+
+
+    def get_map_stamp(self, layer_selection):
+        """ Returns a stamp of the database state the map of the layer 
+            selection is derived from: the collections and the fields, data 
+            items, bands and render options of the coverages. Primary keys may
+            be reused once an object is deleted and changes in other processes
+            are not signalled to this one, so the primary keys alone do not 
+            identify a template. The collection membership is resolved anew by
+            each layer lookup, so it is part of the selection itself.
+
+            The state is taken from the objects prefetched by the lookup.
+        """
+        state = []
+        for collections, coverage, _, _ in layer_selection.walk():
+            state.append(tuple(
+                (collection.pk, collection.identifier) 
+                for collection in collections
+            ))
+            if coverage is None:
+                continue
 
-        self.check_parameters(map_, request_values)
-
-        session = self.setup_map(layer_groups, map_, options)
-        
-        with session:
-            request = ms.create_request(request_values)
-            raw_result = map_.dispatch(request)
-
-            result = result_set_from_raw_data(raw_result)
-            return result, get_content_type(result)
+            if getattr(coverage, "cached_data_items", None) is None:
+                coverage.cached_data_items = coverage.data_items.all()
+            data_items = tuple(
+                (
+                    data_item.pk, data_item.location, data_item.format,
+                    data_item.semantic, data_item.storage_id, 
+                    data_item.package_id
+                )
+                for data_item in coverage.cached_data_items
+            )
+            bands = tuple(
+                (
+                    band.pk, band.index, band.name, band.identifier, 
+                    band.data_type, band.color_interpretation,
+                    tuple(
+                        nil_value.raw_value 
+                        for nil_value in band.nil_value_set
+                    ) if band.nil_value_set_id is not None else None
+                )
+                for band in coverage.range_type
+            )
+            render_options = getattr(coverage, "cached_render_options", None)
+            if render_options is not None:
+                render_options = tuple(
+                    getattr(render_options, field.attname)
+                    for field in render_options._meta.fields
+                )
+            footprint = coverage.footprint
+
+            state.append((
+                coverage.identifier, coverage.real_content_type, 
+                coverage.srid, coverage.projection_id, coverage.extent, 
+                coverage.size, str(footprint.wkb) if footprint else None,
+                coverage.range_type_id, data_items, bands, render_options
+            ))
+
+        return sha1(repr(state)).hexdigest()
 
 
     def check_parameters(self, map_, request_values):
@@ -166,8 +283,9 @@ class MapServerWMSBaseComponent(Component):
                 tmp_layer.name = name
                 layers_and_data_items = ((tmp_layer, ()),)
             else:
-                data_items = coverage.data_items.all()
-                coverage.cached_data_items = data_items
+                # the data items might have been prefetched by the lookup
+                if getattr(coverage, "cached_data_items", None) is None:
+                    coverage.cached_data_items = coverage.data_items.all()
                 layers_and_data_items = tuple(factory.generate(
                     coverage, group_layer, suffix, options
                 ))
@@ -207,6 +325,56 @@ class MapServerWMSBaseComponent(Component):
         return (layer,)
 
 
+class MapTemplate(object):
+    """ An assembled map and the connector information of its layers. 
+        Instantiating the template returns a clone of the map together with a
+        ``ConnectorSession`` for the cloned layers.
+    """
+    def __init__(self, map_, session):
+        self.map = map_
+        self.lock = Lock()
+        self.item_list = [
+            (connector, coverage, layer.index, data_items)
+            for connector, coverage, layer, data_items in session.item_list
+        ]
+
+    def instantiate(self):
+        with self.lock:
+            map_ = self.map.clone()
+
+        session = ConnectorSession()
+        for connector, coverage, index, data_items in self.item_list:
+            # layers that were replaced by a layer of the same name are not 
+            # part of the map
+            if index >= 0:
+                session.add(connector, coverage, data_items, map_.getLayer(index))
+
+        return map_, session
+
+
+map_templates = MapTemplateCache()
+
+
+def invalidate_map_templates(sender, instance, **kwargs):
+    """ Signal handler to drop all cached map templates when EO objects, 
+        their data items or their collection relations change.
+    """
+    if isinstance(instance, (EOObject, EOObjectToCollectionThrough, DataItem)):
+        map_templates.clear()
+
+post_save.connect(
+    invalidate_map_templates, dispatch_uid="invalidate_map_templates_save"
+)
+post_delete.connect(
+    invalidate_map_templates, dispatch_uid="invalidate_map_templates_delete"
+)
+
+
+class MapTemplateConfigReader(config.Reader):
+    section = "services.ows.wms"
+    map_template_cache_size = config.Option(type=int, default=64)
+
+
 class ConnectorSession(object):
     """ Helper class to be used in `with` statements. Allows connecting and 
         disconnecting all added layers with the given data items.
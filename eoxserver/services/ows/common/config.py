@@ -66,3 +66,7 @@ class CapabilitiesConfigReader(config.Reader):
 class WCSEOConfigReader(config.Reader):
     section = "services.ows.wcs20"
     paging_count_default = config.Option(type=int, default=None)
+    stream_packages = config.Option(type=bool, default=True)
+    package_chunk_size = config.Option(type=int, default=262144)
+    render_concurrency = config.Option(type=int, default=1)
+    render_concurrency_limit = config.Option(type=int, default=None)
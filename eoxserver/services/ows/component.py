@@ -29,11 +29,14 @@
 
 import itertools
 from functools import partial
+from threading import Lock
 
 from eoxserver.core import env, Component, implements, ExtensionPoint
+from eoxserver.core.component import ComponentMeta
 
 from eoxserver.services.ows.interfaces import *
 from eoxserver.services.ows.decoders import get_decoder
+from eoxserver.services.ows.version import Version, parse_version_string
 from eoxserver.services.exceptions import (
     ServiceNotSupportedException, VersionNotSupportedException,
     VersionNegotiationException, OperationNotSupportedException
@@ -55,6 +58,24 @@ class ServiceComponent(Component):
 
     def __init__(self, *args, **kwargs):
         super(ServiceComponent, self).__init__(*args, **kwargs)
+        self._dispatch_index = None
+        self._dispatch_index_lock = Lock()
+
+
+    def get_dispatch_index(self):
+        """ Returns the :class:`DispatchIndex` of the currently registered 
+            handlers. The index is compiled on first use and again whenever 
+            the component registry changed.
+        """
+        index = self._dispatch_index
+        if index is None or index.generation != ComponentMeta._generation:
+            with self._dispatch_index_lock:
+                index = self._dispatch_index
+                if (index is None 
+                        or index.generation != ComponentMeta._generation):
+                    index = DispatchIndex(self)
+                    self._dispatch_index = index
+        return index
 
 
     def query_service_handler(self, request):
@@ -62,21 +83,36 @@ class ServiceComponent(Component):
         """
 
         decoder = get_decoder(request)
-        if request.method == "GET":
-            handlers = self.get_service_handlers 
-        elif request.method == "POST":
-            handlers = self.post_service_handlers 
-        else:
-            handlers = self.service_handlers
+        method = request.method if request.method in ("GET", "POST") else None
+        index = self.get_dispatch_index()
 
         version = decoder.version
         if version is None:
             accepted_versions = decoder.acceptversions
-            handlers = filter_handlers(
-                handlers, decoder.service, accepted_versions, decoder.request
+            handlers = index.negotiation.get(
+                (method, decoder.service, decoder.request), ()
             )
             return self.version_negotiation(handlers, accepted_versions)
 
+        handler = index.handlers.get(
+            (method, decoder.service, version_key(version), decoder.request)
+        )
+        if handler is not None:
+            return handler
+
+        # requests not found in the index either fail or use a version that
+        # only matches the declared versions partially (e.g. '2.0' and 
+        # '2.0.1'). Both are resolved by filtering the handlers
+        return self.lookup_service_handler(
+            index.handlers_by_method[method], decoder
+        )
+
+
+    def lookup_service_handler(self, handlers, decoder):
+        """ Selects the service handler for the decoded request from the given
+            handlers, or raises the appropriate exception.
+        """
+
         # check that the service is supported
         handlers = filter(
             partial(handler_supports_service, service=decoder.service), handlers
@@ -122,14 +158,9 @@ class ServiceComponent(Component):
     def query_service_handlers(self, service=None, versions=None, request=None, method=None):
         method = method.upper() if method is not None else None
 
-        if method == "GET":
-            handlers = self.get_service_handlers
-        elif method == "POST":
-            handlers = self.post_service_handlers
-        elif method is None:
-            handlers = self.service_handlers
-        else:
+        if method not in ("GET", "POST", None):
             return []
+        handlers = self.get_dispatch_index().handlers_by_method[method]
 
         handlers = filter_handlers(handlers, service, versions, request)
         return sort_handlers(handlers)
@@ -138,13 +169,8 @@ class ServiceComponent(Component):
     def query_exception_handler(self, request):
         try:
             decoder = get_decoder(request)
-            handlers = self.exception_handlers
-            handlers = sorted(
-                filter(
-                    partial(handler_supports_service, service=decoder.service), 
-                    self.exception_handlers
-                ),
-                key=lambda h: max(h.versions), reverse=True
+            handlers = self.get_dispatch_index().exception_handlers.get(
+                decoder.service, ()
             )
 
             # try to get the correctly versioned exception handler
@@ -186,6 +212,98 @@ class ServiceComponent(Component):
         raise VersionNegotiationException()
 
 
+class DispatchIndex(object):
+    """ Immutable index of the handlers of a :class:`ServiceComponent`, so 
+        that dispatching a request requires a single lookup instead of 
+        activating, filtering and sorting all handlers:
+
+        * `handlers` maps the keys (method, service, version, request) of all
+          declared versions to the service handler to use, which is the same
+          as selected by :meth:`ServiceComponent.lookup_service_handler`
+        * `negotiation` maps the keys (method, service, request) to the 
+          candidate handlers for version negotiation
+        * `exception_handlers` maps each service to its exception handlers,
+          sorted by version in descending order
+        * `handlers_by_method` maps "GET", "POST" and ``None`` to all 
+          respective service handlers
+    """
+
+    def __init__(self, component):
+        self.handlers_by_method = {
+            "GET": tuple(component.get_service_handlers),
+            "POST": tuple(component.post_service_handlers),
+            None: tuple(component.service_handlers),
+        }
+
+        self.handlers = {}
+        self.negotiation = {}
+        for method, handlers in self.handlers_by_method.items():
+            requests = set(handler.request.upper() for handler in handlers)
+            services = get_services(handlers)
+
+            for service, request in itertools.product(
+                    list(services) + [None], requests):
+                self.negotiation[(method, service, request)] = tuple(
+                    filter_handlers(handlers, service, None, request)
+                )
+
+            for service, request in itertools.product(services, requests):
+                candidates = sorted(
+                    filter_handlers(handlers, service, None, request), 
+                    key=lambda h: max(h.versions), reverse=True
+                )
+                for candidate in candidates:
+                    for version in candidate.versions:
+                        key = (method, service, version_key(version), request)
+                        if key in self.handlers:
+                            continue
+                        # like the lookup, compare the versions as ``Version``
+                        # objects, which consider e.g. '2.0' and '2.0.1' equal
+                        version = parse_version_string(version)
+                        self.handlers[key] = next(
+                            handler for handler in candidates 
+                            if version in handler.versions
+                        )
+
+        exception_handlers = tuple(component.exception_handlers)
+        self.exception_handlers = dict(
+            (service, tuple(sorted(
+                filter(
+                    partial(handler_supports_service, service=service),
+                    exception_handlers
+                ),
+                key=lambda h: max(h.versions), reverse=True
+            )))
+            for service in get_services(exception_handlers)
+        )
+
+        # querying the extension points may import deferred components, so 
+        # the generation is taken afterwards
+        self.generation = ComponentMeta._generation
+
+
+def version_key(version):
+    """ Returns the hashable components of a version given either as a 
+        ``Version`` or as a string.
+    """
+    if not isinstance(version, Version):
+        version = parse_version_string(version)
+    return version._values
+
+
+def get_services(handlers):
+    """ Returns the set of (uppercase) service names supported by the given 
+        handlers.
+    """
+    services = set()
+    for handler in handlers:
+        if isinstance(handler.service, basestring):
+            services.add(handler.service.upper())
+        else:
+            services.update(service.upper() for service in handler.service)
+    return services
+
+
 def filter_handlers(handlers, service=None, versions=None, request=None):
     """ Utility function to filter the given OWS service handlers by their
         attributes 'service', 'versions' and 'request'.
@@ -48,7 +48,21 @@ def get_decoder(request):
         return OWSCommonKVPDecoder(request.GET)
     elif request.method == "POST":
         # TODO: this may also be in a different format.
-        return OWSCommonXMLDecoder(request.body)
+        return OWSCommonXMLDecoder(get_xml_tree(request))
+
+
+def get_xml_tree(request):
+    """ Returns the parsed XML body of the given `django.http.HttpRequest`. 
+        The body is parsed only once and the tree is stored with the request,
+        so that the OWS Common decoder, the decoder of the service handler 
+        and the exception handling all share it. The tree must not be 
+        modified.
+    """
+    tree = getattr(request, "_xml_tree", None)
+    if tree is None:
+        tree = xml.parse(request.body)
+        request._xml_tree = tree
+    return tree
 
 
 class OWSCommonKVPDecoder(kvp.Decoder):
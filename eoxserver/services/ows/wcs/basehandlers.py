@@ -243,9 +243,10 @@ class WCSGetCoverageHandlerBase(object):
         )
 
     def to_http_response(self, result_set):
-        """ Default result to response conversion method.
+        """ Default result to response conversion method. Large coverages are
+            streamed.
         """
-        return to_http_response(result_set)
+        return to_http_response(result_set, streaming=True)
 
     def handle(self, request):
         """ Default handling method implementation.
@@ -93,6 +93,24 @@ class PackageWriterInterface(object):
             `create_package` method.
         """
 
+    def create_stream(self, format, params, chunksize):
+        """ Create a package in streaming mode. Instead of being written to a 
+            file, the encoded package is yielded by the `stream_to_package` and
+            `stream_cleanup` methods. Files are read in chunks of `chunksize` 
+            bytes.
+        """
+
+    def stream_to_package(self, package, file_obj, size, location):
+        """ Add the file object to the package, that is returned by the 
+            `create_stream` method, and return an iterator over the encoded
+            data.
+        """
+
+    def stream_cleanup(self, package):
+        """ Finalize the package, that is returned by the `create_stream` 
+            method, and return an iterator over the remaining encoded data.
+        """
+
     def get_mime_type(self, package, format, params):
         """ Retrieve the output mime type for the given package and/or format
             specifier.
@@ -29,6 +29,7 @@
 
 from eoxserver.core import Component, implements
 from eoxserver.core.decoders import xml, kvp, typelist, lower
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
     PostServiceHandlerInterface, VersionNegotiationInterface
@@ -52,7 +53,7 @@ class WCS10GetCapabilitiesHandler(WCSGetCapabilitiesHandlerBase, Component):
         if request.method == "GET":
             return WCS10GetCapabilitiesKVPDecoder(request.GET)
         elif request.method == "POST":
-            return WCS10GetCapabilitiesXMLDecoder(request.body)
+            return WCS10GetCapabilitiesXMLDecoder(get_xml_tree(request))
 
     def get_params(self, coverages, decoder):
         return WCSCapabilitiesRenderParams(
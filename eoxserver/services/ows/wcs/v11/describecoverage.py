@@ -29,6 +29,7 @@
 
 from eoxserver.core import Component, implements
 from eoxserver.core.decoders import xml, kvp, typelist
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
     PostServiceHandlerInterface
@@ -54,7 +55,7 @@ class WCS11DescribeCoverageHandler(WCSDescribeCoverageHandlerBase, Component):
         if request.method == "GET":
             return WCS11DescribeCoverageKVPDecoder(request.GET)
         elif request.method == "POST":
-            return WCS11DescribeCoverageXMLDecoder(request.body)
+            return WCS11DescribeCoverageXMLDecoder(get_xml_tree(request))
 
 
     def get_params(self, coverages, decoder):
@@ -29,6 +29,7 @@
 
 from eoxserver.core import Component, implements
 from eoxserver.core.decoders import xml, kvp, typelist, lower
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
     PostServiceHandlerInterface, VersionNegotiationInterface
@@ -52,7 +53,7 @@ class WCS11GetCapabilitiesHandler(WCSGetCapabilitiesHandlerBase, Component):
         if request.method == "GET":
             return WCS11GetCapabilitiesKVPDecoder(request.GET)
         elif request.method == "POST":
-            return WCS11GetCapabilitiesXMLDecoder(request.body)
+            return WCS11GetCapabilitiesXMLDecoder(get_xml_tree(request))
 
 
     def get_params(self, coverages, decoder):
@@ -29,6 +29,7 @@
 
 from eoxserver.core import Component, implements
 from eoxserver.core.decoders import xml, kvp, typelist
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
     PostServiceHandlerInterface
@@ -49,7 +50,7 @@ class WCS11GetCoverageHandler(WCSGetCoverageHandlerBase, Component):
         if request.method == "GET":
             return WCS11GetCoverageKVPDecoder(request.GET)
         elif request.method == "POST":
-            return WCS11GetCoverageXMLDecoder(request.body)
+            return WCS11GetCoverageXMLDecoder(get_xml_tree(request))
 
 
     def get_params(self, coverage, decoder, request):
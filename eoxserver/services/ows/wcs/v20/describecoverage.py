@@ -29,6 +29,7 @@
 
 from eoxserver.core import Component, implements
 from eoxserver.core.decoders import xml, kvp, typelist, upper
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
     PostServiceHandlerInterface
@@ -55,7 +56,7 @@ class WCS20DescribeCoverageHandler(WCSDescribeCoverageHandlerBase, Component):
         if request.method == "GET":
             return WCS20DescribeCoverageKVPDecoder(request.GET)
         elif request.method == "POST":
-            return WCS20DescribeCoverageXMLDecoder(request.body)
+            return WCS20DescribeCoverageXMLDecoder(get_xml_tree(request))
 
     def get_params(self, coverages, decoder):
         return WCS20CoverageDescriptionRenderParams(coverages)
@@ -31,12 +31,12 @@ import sys
 import logging
 from itertools import chain
 
-from django.db.models import Q
 
 from eoxserver.core import Component, implements
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import xml, kvp, typelist, upper, enum
-from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages import models, lookup
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
     PostServiceHandlerInterface
@@ -69,7 +69,7 @@ class WCS20DescribeEOCoverageSetHandler(Component):
         if request.method == "GET":
             return WCS20DescribeEOCoverageSetKVPDecoder(request.GET)
         elif request.method == "POST":
-            return WCS20DescribeEOCoverageSetXMLDecoder(request.body)
+            return WCS20DescribeEOCoverageSetXMLDecoder(get_xml_tree(request))
 
     @property
     def constraints(self):
@@ -117,41 +117,16 @@ class WCS20DescribeEOCoverageSetHandler(Component):
         if failed:
             raise NoSuchDatasetSeriesOrCoverageException(failed)
 
-        collections_qs = subsets.filter(models.Collection.objects.filter(
-            identifier__in=eo_ids
-        ), containment="overlaps")
-
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
-
-        collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
-
-        collection_pks = map(lambda c: c.pk, collection_set)
+        # get the set of all directly and indirectly referenced collections
+        # with a single recursive query. The containment is "overlaps", to 
+        # also include collections that might have been excluded with 
+        # "contains" but would have matching coverages inserted.
+        collection_set = set(lookup.closure_collections(eo_ids, subsets))
 
         # Get all either directly referenced coverages or coverages that are
         # within referenced containers. Full subsetting is applied here.
 
-        coverages_qs = subsets.filter(models.Coverage.objects.filter(
-            Q(identifier__in=eo_ids) | Q(collections__in=collection_pks)
-        ), containment=containment)
+        coverages_qs = lookup.closure_coverages(eo_ids, subsets, containment)
 
         # save a reference before limits are applied to obtain the full number
         # of matched coverages.
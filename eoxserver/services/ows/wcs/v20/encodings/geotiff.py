@@ -32,6 +32,7 @@ from eoxserver.core.decoders import (
     kvp, xml, upper, enum, value_range, boolean, InvalidParameterException
 )
 from eoxserver.core.util.xmltools import NameSpace, NameSpaceMap
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.wcs.interfaces import EncodingExtensionInterface
 from eoxserver.services.ows.wcs.v20.util import ns_wcs
 
@@ -50,7 +51,9 @@ class WCS20GeoTIFFEncodingExtension(Component):
         if request.method == "GET":
             return WCS20GeoTIFFEncodingExtensionKVPDecoder(request.GET)
         else:
-            return WCS20GeoTIFFEncodingExtensionXMLDecoder(request.body)
+            return WCS20GeoTIFFEncodingExtensionXMLDecoder(
+                get_xml_tree(request)
+            )
 
     def get_encoding_params(self, request):
         decoder = self.get_decoder(request)
@@ -30,6 +30,7 @@
 from eoxserver.core import Component, implements
 from eoxserver.core.decoders import xml, kvp, typelist, lower
 from eoxserver.resources.coverages import models
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
     PostServiceHandlerInterface, VersionNegotiationInterface
@@ -56,7 +57,7 @@ class WCS20GetCapabilitiesHandler(WCSGetCapabilitiesHandlerBase, Component):
         if request.method == "GET":
             return WCS20GetCapabilitiesKVPDecoder(request.GET)
         elif request.method == "POST":
-            return WCS20GetCapabilitiesXMLDecoder(request.body)
+            return WCS20GetCapabilitiesXMLDecoder(get_xml_tree(request))
 
 
     def lookup_coverages(self, decoder):
@@ -30,6 +30,7 @@ from itertools import chain
 
 from eoxserver.core import Component, implements, ExtensionPoint
 from eoxserver.core.decoders import xml, kvp, typelist
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.subset import Subsets
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
@@ -60,7 +61,7 @@ class WCS20GetCoverageHandler(WCSGetCoverageHandlerBase, Component):
         if request.method == "GET":
             return WCS20GetCoverageKVPDecoder(request.GET)
         elif request.method == "POST":
-            return WCS20GetCoverageXMLDecoder(request.body)
+            return WCS20GetCoverageXMLDecoder(get_xml_tree(request))
 
     def get_params(self, coverage, decoder, request):
         subsets = Subsets(decoder.subsets, crs=decoder.subsettingcrs)
@@ -29,13 +29,18 @@
 
 import sys
 import os
+import shutil
 import tempfile
 import logging
-from itertools import chain
+import threading
+import multiprocessing
+from collections import deque
+from itertools import chain, izip, islice
 from cStringIO import StringIO
+from uuid import uuid4
 import mimetypes
 
-from django.db.models import Q
+from django.db import connections
 from django.http import HttpResponse
 try:
     from django.http import StreamingHttpResponse
@@ -45,7 +50,12 @@ except:
 from eoxserver.core import Component, implements, ExtensionPoint
 from eoxserver.core.config import get_eoxserver_config
 from eoxserver.core.decoders import xml, kvp, typelist, upper, enum
-from eoxserver.resources.coverages import models
+from eoxserver.backends.cache import (
+    get_cache_context, set_cache_context, setup_cache_session, 
+    shutdown_cache_session, CacheException
+)
+from eoxserver.resources.coverages import models, lookup
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface, 
     PostServiceHandlerInterface
@@ -60,9 +70,10 @@ from eoxserver.services.ows.wcs.interfaces import (
     WCSCoverageRendererInterface, PackageWriterInterface
 )
 from eoxserver.services.subset import Subsets, Trim
+from eoxserver.services.result import ResultFile
 from eoxserver.services.exceptions import (
     NoSuchDatasetSeriesOrCoverageException, InvalidRequestException,
-    InvalidSubsettingException
+    InvalidSubsettingException, RenderException
 )
 
 
@@ -86,7 +97,7 @@ class WCS20GetEOCoverageSetHandler(Component):
         if request.method == "GET":
             return WCS20GetEOCoverageSetKVPDecoder(request.GET)
         elif request.method == "POST":
-            return WCS20GetEOCoverageSetXMLDecoder(request.body)
+            return WCS20GetEOCoverageSetXMLDecoder(get_xml_tree(request))
 
 
     def get_params(self, coverage, decoder, request):
@@ -156,42 +167,16 @@ class WCS20GetEOCoverageSetHandler(Component):
         if failed:
             raise NoSuchDatasetSeriesOrCoverageException(failed)
 
-        collections_qs = subsets.filter(models.Collection.objects.filter(
-            identifier__in=eo_ids
-        ), containment="overlaps")
-
-        # create a set of all indirectly referenced containers by iterating
-        # recursively. The containment is set to "overlaps", to also include 
-        # collections that might have been excluded with "contains" but would 
-        # have matching coverages inserted.
-
-        def recursive_lookup(super_collection, collection_set):
-            sub_collections = models.Collection.objects.filter(
-                collections__in=[super_collection.pk]
-            ).exclude(
-                pk__in=map(lambda c: c.pk, collection_set)
-            )
-            sub_collections = subsets.filter(sub_collections, "overlaps")
-
-            # Add all to the set
-            collection_set |= set(sub_collections)
-
-            for sub_collection in sub_collections:
-                recursive_lookup(sub_collection, collection_set)
-
-        collection_set = set(collections_qs)
-        for collection in set(collection_set):
-            recursive_lookup(collection, collection_set)
-
-        collection_pks = map(lambda c: c.pk, collection_set)
+        # get the set of all directly and indirectly referenced collections
+        # with a single recursive query. The containment is "overlaps", to 
+        # also include collections that might have been excluded with 
+        # "contains" but would have matching coverages inserted.
+        collection_set = set(lookup.closure_collections(eo_ids, subsets))
 
         # Get all either directly referenced coverages or coverages that are
         # within referenced containers. Full subsetting is applied here.
 
-        coverages_qs = models.Coverage.objects.filter(
-            Q(identifier__in=eo_ids) | Q(collections__in=collection_pks)
-        )
-        coverages_qs = subsets.filter(coverages_qs, containment=containment)
+        coverages_qs = lookup.closure_coverages(eo_ids, subsets, containment)
 
         # save a reference before limits are applied to obtain the full number
         # of matched coverages.
@@ -233,42 +218,146 @@ class WCS20GetEOCoverageSetHandler(Component):
                 coverages.append(eo_object.cast())
 
 
+        reader = WCSEOConfigReader(get_eoxserver_config())
+        chunksize = reader.package_chunk_size
+
+        if reader.stream_packages:
+            package = writer.create_stream(format, format_params, chunksize)
+            mime_type = writer.get_mime_type(package, format, format_params)
+            ext = writer.get_file_extension(package, format, format_params)
+
+            response = StreamingHttpResponse(
+                self.stream_package(
+                    writer, package, coverages, decoder, request, chunksize
+                ), mime_type
+            )
+            response["Content-Disposition"] = 'inline; filename="ows%s"' % ext
+            return response
+
         fd, pkg_filename = tempfile.mkstemp()
         tmp = os.fdopen(fd)
         tmp.close()
         package = writer.create_package(pkg_filename, format, format_params)
 
-        for coverage in coverages:
-            params = self.get_params(coverage, decoder, request)
-            renderer = self.get_renderer(params)
-            result_set = renderer.render(params)
-            all_filenames = set()
-            for result_item in result_set:
-                if not result_item.filename:
-                    ext = mimetypes.guess_extension(result_item.content_type)
-                    filename = coverage.identifier + ext
-                else:
-                    filename = result_item.filename
-                if filename in all_filenames:
-                    continue # TODO: create new filename
-                all_filenames.add(filename)
-                location = "%s/%s" % (coverage.identifier, filename)
-                writer.add_to_package(
-                    package, result_item.data_file, result_item.size, location
-                )
+        for result_item, location in self.render_coverages(
+                coverages, decoder, request):
+            writer.add_to_package(
+                package, result_item.data_file, result_item.size, location
+            )
 
         mime_type = writer.get_mime_type(package, format, format_params)
         ext = writer.get_file_extension(package, format, format_params)
         writer.cleanup(package)
 
         response = StreamingHttpResponse(
-            tempfile_iterator(pkg_filename), mime_type
+            tempfile_iterator(pkg_filename, chunksize), mime_type
         )
         response["Content-Disposition"] = 'inline; filename="ows%s"' % ext
         response["Content-Length"] = str(os.path.getsize(pkg_filename))
 
         return response
 
+    def render_coverage(self, coverage, decoder, request):
+        """ Render a single coverage and return its result set.
+        """
+        params = self.get_params(coverage, decoder, request)
+        renderer = self.get_renderer(params)
+        return renderer.render(params)
+
+    def render_coverages(self, coverages, decoder, request):
+        """ Render the given coverages and yield tuples of the result item and 
+            its location within the package in the order of the coverages. 
+            Depending on the configuration, the coverages are rendered 
+            concurrently by a pool of worker processes.
+        """
+        reader = WCSEOConfigReader(get_eoxserver_config())
+        concurrency = min(reader.render_concurrency, len(coverages))
+        processes = 0
+        if concurrency > 1:
+            limit = reader.render_concurrency_limit
+            if limit is None:
+                limit = multiprocessing.cpu_count()
+            processes = render_slots.acquire(concurrency, limit)
+
+        try:
+            if processes > 1:
+                result_sets = render_parallel(
+                    self, coverages, decoder, request, processes,
+                    reader.package_chunk_size
+                )
+            else:
+                result_sets = (
+                    self.render_coverage(coverage, decoder, request)
+                    for coverage in coverages
+                )
+
+            for coverage, result_set in izip(coverages, result_sets):
+                all_filenames = set()
+                for result_item in result_set:
+                    if not result_item.filename:
+                        ext = mimetypes.guess_extension(
+                            result_item.content_type
+                        )
+                        filename = coverage.identifier + ext
+                    else:
+                        filename = result_item.filename
+                    if filename in all_filenames:
+                        continue # TODO: create new filename
+                    all_filenames.add(filename)
+                    location = "%s/%s" % (coverage.identifier, filename)
+                    yield result_item, location
+        finally:
+            render_slots.release(processes)
+
+    def stream_package(self, writer, package, coverages, decoder, request,
+                       chunksize):
+        """ Generator to encode the package while the coverages are rendered.
+            Each member is sent as soon as it is rendered, so only the current
+            member has to be kept. Small pieces of encoded data (like headers)
+            are joined to chunks of about `chunksize` bytes.
+        """
+        def iter_encoded():
+            for result_item, location in self.render_coverages(
+                    coverages, decoder, request):
+                try:
+                    for data in writer.stream_to_package(
+                            package, result_item.data_file, result_item.size,
+                            location):
+                        yield data
+                finally:
+                    result_item.delete()
+
+            for data in writer.stream_cleanup(package):
+                yield data
+
+        # the coverages are rendered after the response was returned, thus
+        # after the cache session of the request was detached
+        try:
+            get_cache_context()
+            own_cache_session = False
+        except CacheException:
+            setup_cache_session()
+            own_cache_session = True
+
+        buffered = []
+        buffered_size = 0
+        try:
+            for data in iter_encoded():
+                if not data:
+                    continue
+                buffered.append(data)
+                buffered_size += len(data)
+                if buffered_size >= chunksize:
+                    yield "".join(buffered)
+                    buffered = []
+                    buffered_size = 0
+        finally:
+            if own_cache_session:
+                shutdown_cache_session()
+
+        if buffered:
+            yield "".join(buffered)
+
 
 def tempfile_iterator(filename, chunksize=2048, delete=True):
     with open(filename) as file_obj:
@@ -282,6 +371,134 @@ def tempfile_iterator(filename, chunksize=2048, delete=True):
         os.remove(filename)
 
 
+class RenderSlots(object):
+    """ Process wide account of the worker processes used to render coverages,
+        so that concurrent requests do not exceed a common limit.
+    """
+
+    def __init__(self):
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, requested, limit):
+        """ Reserves up to `requested` worker processes without exceeding 
+            `limit` processes in total and returns the number of reserved 
+            processes. As a single worker process would not render faster than
+            the request itself, 0 is returned if less than two are available.
+        """
+        with self._lock:
+            granted = min(requested, limit - self._used)
+            if granted < 2:
+                return 0
+            self._used += granted
+            return granted
+
+    def release(self, count):
+        """ Releases `count` worker processes reserved with :meth:`acquire`.
+        """
+        with self._lock:
+            self._used -= count
+
+
+render_slots = RenderSlots()
+
+
+# the render job inherited by the worker processes forked in render_parallel()
+_render_job = None
+_render_job_lock = threading.Lock()
+
+
+def _render_worker(index):
+    """ Renders the coverage with the given index of the inherited render job 
+        in a worker process and stores the result items as files in the 
+        directory of the job. Returns a list of tuples (path, content type, 
+        filename, identifier) and an error message, if rendering failed.
+    """
+    handler, coverages, decoder, request, directory, chunksize = _render_job
+
+    # the cache context of the forking thread was inherited and must not be
+    # cleaned up by the worker
+    set_cache_context(None)
+    setup_cache_session()
+    try:
+        results = []
+        result_set = handler.render_coverage(coverages[index], decoder, request)
+        for result_item in result_set:
+            path = os.path.join(directory, uuid4().hex)
+            with open(path, "wb") as f:
+                for data in result_item.chunked(chunksize):
+                    f.write(data)
+            results.append((
+                path, result_item.content_type, result_item.filename, 
+                result_item.identifier
+            ))
+            result_item.delete()
+        return results, None
+
+    except Exception, e:
+        logger.exception(
+            "Failed to render coverage '%s'." % coverages[index].identifier
+        )
+        return None, str(e)
+
+    finally:
+        shutdown_cache_session()
+
+
+def render_parallel(handler, coverages, decoder, request, processes, 
+                    chunksize=262144):
+    """ Renders the coverages with a pool of `processes` forked worker 
+        processes and yields the result sets of the coverages in their order.
+        At most twice as many coverages as processes are rendered ahead. The 
+        result items are files in a temporary directory, which is removed once
+        the generator is exhausted or closed.
+
+        The pool is forked from the calling thread. The workers inherit all 
+        locks held by other threads at that time, so this must only be used 
+        in single-threaded server processes (see the `render_concurrency` 
+        option).
+    """
+    global _render_job
+
+    directory = tempfile.mkdtemp(prefix="eoxs_render")
+
+    # the workers must not share the database connections of this process
+    for connection in connections.all():
+        connection.close()
+
+    with _render_job_lock:
+        _render_job = (
+            handler, coverages, decoder, request, directory, chunksize
+        )
+        try:
+            pool = multiprocessing.Pool(processes)
+        finally:
+            _render_job = None
+
+    try:
+        indices = iter(xrange(len(coverages)))
+        pending = deque(
+            pool.apply_async(_render_worker, (index,))
+            for index in islice(indices, 2 * processes)
+        )
+        while pending:
+            results, error = pending.popleft().get()
+            for index in islice(indices, 1):
+                pending.append(pool.apply_async(_render_worker, (index,)))
+
+            if error is not None:
+                raise RenderException(error, "coverage")
+
+            yield [
+                ResultFile(path, content_type, filename, identifier)
+                for path, content_type, filename, identifier in results
+            ]
+    finally:
+        pool.terminate()
+        pool.join()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
 def pos_int(value):
     value = int(value)
     if value < 0:
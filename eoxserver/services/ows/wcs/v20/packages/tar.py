@@ -28,6 +28,8 @@
 
 
 import tarfile
+import zlib
+import bz2
 
 from eoxserver.core import Component, implements
 from eoxserver.services.ows.wcs.interfaces import (
@@ -59,14 +61,30 @@ class TarPackageWriter(Component):
 
         return tarfile.open(filename, mode)
 
+    def create_stream(self, format, params, chunksize):
+        if format in gzip_mimes:
+            compression = "gz"
+        elif format in bzip_mimes:
+            compression = "bz2"
+        else:
+            compression = None
+
+        return TarStream(compression, chunksize)
+
     def cleanup(self, package):
         package.close()
 
+    def stream_cleanup(self, package):
+        return package.close()
+
     def add_to_package(self, package, file_obj, size, location):
         info = tarfile.TarInfo(location)
         info.size = size
         package.addfile(info, file_obj)
 
+    def stream_to_package(self, package, file_obj, size, location):
+        return package.add(file_obj, size, location)
+
     def get_mime_type(self, package, format, params):
         return "application/x-compressed-tar"
 
@@ -78,3 +96,61 @@ class TarPackageWriter(Component):
             return ".tar.bz2"
 
         return ".tar"
+
+
+class TarStream(object):
+    """ Encoder for tar packages in streaming mode. Each member is encoded as
+        soon as it is added, without seeking in the output. The encoded data 
+        is yielded in chunks of at most (uncompressed) `chunksize` bytes.
+    """
+
+    def __init__(self, compression=None, chunksize=65536):
+        if compression == "gz":
+            self._compressor = zlib.compressobj(
+                9, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+            )
+        elif compression == "bz2":
+            self._compressor = bz2.BZ2Compressor()
+        else:
+            self._compressor = None
+
+        self._chunksize = chunksize
+        self._offset = 0
+
+    def add(self, file_obj, size, location):
+        """ Yields the encoded header and content of the member. 
+        """
+        info = tarfile.TarInfo(location)
+        info.size = size
+        yield self._encode(info.tobuf())
+
+        remaining = size
+        while remaining > 0:
+            data = file_obj.read(min(self._chunksize, remaining))
+            if not data:
+                raise IOError("Unexpected end of data for '%s'." % location)
+            remaining -= len(data)
+            yield self._encode(data)
+
+        rest = size % tarfile.BLOCKSIZE
+        if rest:
+            yield self._encode(tarfile.NUL * (tarfile.BLOCKSIZE - rest))
+
+    def close(self):
+        """ Yields the end-of-archive marker and flushes the compressor.
+        """
+        # two empty blocks, padded to a full record
+        data = tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+        rest = (self._offset + len(data)) % tarfile.RECORDSIZE
+        if rest:
+            data += tarfile.NUL * (tarfile.RECORDSIZE - rest)
+        yield self._encode(data)
+
+        if self._compressor is not None:
+            yield self._compressor.flush()
+
+    def _encode(self, data):
+        self._offset += len(data)
+        if self._compressor is not None:
+            return self._compressor.compress(data)
+        return data
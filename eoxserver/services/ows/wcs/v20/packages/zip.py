@@ -28,8 +28,12 @@
 
 
 import zipfile
+import zlib
+import struct
+import time
 
 from eoxserver.core import Component, implements
+from eoxserver.core.decoders import InvalidParameterException
 from eoxserver.services.ows.wcs.interfaces import (
     PackageWriterInterface
 )
@@ -41,20 +45,242 @@ class ZipPackageWriter(Component):
         return format.lower() == "application/zip"
 
     def create_package(self, filename, format, params):
-        compression = zipfile.ZIP_STORED
-        if params.get("compression", "").upper() == "DEFLATED":
-            print compression
-            compression = zipfile.ZIP_DEFLATED
-        return zipfile.ZipFile(filename, "a", compression)
+        return ZipPackage(
+            filename, self._get_compression(params), 
+            compresslevel=self._get_compresslevel(params)
+        )
+
+    def create_stream(self, format, params, chunksize):
+        return ZipStream(
+            self._get_compression(params), chunksize, 
+            self._get_compresslevel(params)
+        )
 
     def cleanup(self, package):
         package.close()
 
+    def stream_cleanup(self, package):
+        return package.close()
+
     def add_to_package(self, package, file_obj, size, location):
-        package.writestr(location, file_obj.read())
+        package.add(file_obj, size, location)
+
+    def stream_to_package(self, package, file_obj, size, location):
+        return package.add(file_obj, size, location)
 
     def get_mime_type(self, package, format, params):
         return "application/zip"
 
     def get_file_extension(self, package, format, params):
-        return ".zip"
\ No newline at end of file
+        return ".zip"
+
+    def _get_compression(self, params):
+        if params.get("compression", "").upper() == "DEFLATED":
+            return zipfile.ZIP_DEFLATED
+        return zipfile.ZIP_STORED
+
+    def _get_compresslevel(self, params):
+        level = params.get("level")
+        if level is None:
+            return zlib.Z_DEFAULT_COMPRESSION
+
+        try:
+            level = int(level)
+        except ValueError:
+            level = None
+
+        if level is None or not 0 <= level <= 9:
+            raise InvalidParameterException(
+                "Invalid compression level '%s'." % params["level"], "format"
+            )
+        return level
+
+
+class ZipPackage(object):
+    """ A ZIP package written to a file. Members are read and compressed in 
+        chunks, so that the memory usage does not depend on their size. 
+        ZIP64 extensions are used when required.
+    """
+
+    def __init__(self, filename, compression=zipfile.ZIP_STORED, 
+                 chunksize=1024*1024, compresslevel=zlib.Z_DEFAULT_COMPRESSION):
+        self._file = open(filename, "wb")
+        self._stream = ZipStream(compression, chunksize, compresslevel)
+
+    def add(self, file_obj, size, location):
+        for data in self._stream.add(file_obj, size, location):
+            self._file.write(data)
+
+    def close(self):
+        if self._file.closed:
+            return
+
+        for data in self._stream.close():
+            self._file.write(data)
+        self._file.close()
+
+
+# data descriptor signature and the ZIP64 extra field header ID
+DATA_DESCRIPTOR_SIGNATURE = "PK\x07\x08"
+ZIP64_EXTRA_ID = 0x0001
+ZIP64_MAX_SIZE = 0xFFFFFFFF
+ZIP64_MAX_ENTRIES = 0xFFFF
+
+
+class ZipStream(object):
+    """ Encoder for ZIP packages in streaming mode. Each member is written with
+        a local file header without size information, followed by its data and
+        a data descriptor, so that no seeking in the output is required. ZIP64
+        extensions are used when sizes, offsets or the number of members exceed
+        the limits of the classic format. The encoded data is yielded in chunks
+        of at most (uncompressed) `chunksize` bytes.
+    """
+
+    def __init__(self, compression=zipfile.ZIP_STORED, chunksize=65536, 
+                 compresslevel=zlib.Z_DEFAULT_COMPRESSION):
+        self._compression = compression
+        self._compresslevel = compresslevel
+        self._chunksize = chunksize
+        self._offset = 0
+        self._members = []
+
+    def add(self, file_obj, size, location):
+        """ Yields the local file header, the (compressed) content and the data
+            descriptor of the member.
+        """
+        filename = location.encode("utf-8") \
+            if isinstance(location, unicode) else location
+        flags = 0x08
+        if isinstance(location, unicode):
+            flags |= 0x800
+
+        date_time = time.localtime(time.time())[:6]
+        dosdate = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+        dostime = date_time[3] << 11 | date_time[4] << 5 | (date_time[5] // 2)
+
+        # the compressed size is not known beforehand, so leave some margin
+        zip64 = size * 1.05 > ZIP64_MAX_SIZE
+        if zip64:
+            version = 45
+            extra = struct.pack("<HHQQ", ZIP64_EXTRA_ID, 16, 0, 0)
+            header_size = ZIP64_MAX_SIZE
+        else:
+            version = 20
+            extra = ""
+            header_size = 0
+
+        header_offset = self._offset
+        yield self._write(struct.pack(
+            zipfile.structFileHeader, zipfile.stringFileHeader, version, 0,
+            flags, self._compression, dostime, dosdate, 0, header_size, 
+            header_size, len(filename), len(extra)
+        ) + filename + extra)
+
+        if self._compression == zipfile.ZIP_DEFLATED:
+            compressor = zlib.compressobj(
+                self._compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS
+            )
+        else:
+            compressor = None
+
+        crc = 0
+        file_size = 0
+        compress_size = 0
+        remaining = size
+        while remaining > 0:
+            data = file_obj.read(min(self._chunksize, remaining))
+            if not data:
+                raise IOError("Unexpected end of data for '%s'." % location)
+            remaining -= len(data)
+            file_size += len(data)
+            crc = zlib.crc32(data, crc)
+            if compressor is not None:
+                data = compressor.compress(data)
+            compress_size += len(data)
+            yield self._write(data)
+
+        if compressor is not None:
+            data = compressor.flush()
+            compress_size += len(data)
+            yield self._write(data)
+
+        crc &= 0xFFFFFFFF
+        if zip64:
+            descriptor = struct.pack(
+                "<4sLQQ", DATA_DESCRIPTOR_SIGNATURE, crc, compress_size, 
+                file_size
+            )
+        elif compress_size > ZIP64_MAX_SIZE:
+            raise IOError("Compressed size of '%s' exceeds limit." % location)
+        else:
+            descriptor = struct.pack(
+                "<4sLLL", DATA_DESCRIPTOR_SIGNATURE, crc, compress_size, 
+                file_size
+            )
+        yield self._write(descriptor)
+
+        self._members.append((
+            filename, flags, version, dostime, dosdate, crc, compress_size,
+            file_size, header_offset
+        ))
+
+    def close(self):
+        """ Yields the central directory and the end of central directory 
+            records.
+        """
+        start_offset = self._offset
+        for (filename, flags, version, dostime, dosdate, crc, compress_size,
+             file_size, header_offset) in self._members:
+
+            extra_values = []
+            if file_size > ZIP64_MAX_SIZE:
+                extra_values.append(file_size)
+                file_size = ZIP64_MAX_SIZE
+            if compress_size > ZIP64_MAX_SIZE:
+                extra_values.append(compress_size)
+                compress_size = ZIP64_MAX_SIZE
+            if header_offset > ZIP64_MAX_SIZE:
+                extra_values.append(header_offset)
+                header_offset = ZIP64_MAX_SIZE
+
+            if extra_values:
+                version = 45
+                extra = struct.pack(
+                    "<HH" + "Q" * len(extra_values), ZIP64_EXTRA_ID, 
+                    8 * len(extra_values), *extra_values
+                )
+            else:
+                extra = ""
+
+            yield self._write(struct.pack(
+                zipfile.structCentralDir, zipfile.stringCentralDir, version, 
+                3, version, 0, flags, self._compression, dostime, dosdate, crc,
+                compress_size, file_size, len(filename), len(extra), 0, 0, 0,
+                0644 << 16, header_offset
+            ) + filename + extra)
+
+        count = len(self._members)
+        end_offset = self._offset
+        size = end_offset - start_offset
+
+        if (count > ZIP64_MAX_ENTRIES or start_offset > ZIP64_MAX_SIZE 
+                or size > ZIP64_MAX_SIZE):
+            yield self._write(struct.pack(
+                zipfile.structEndArchive64, zipfile.stringEndArchive64, 44,
+                45, 45, 0, 0, count, count, size, start_offset
+            ) + struct.pack(
+                zipfile.structEndArchive64Locator, 
+                zipfile.stringEndArchive64Locator, 0, end_offset, 1
+            ))
+            count = min(count, ZIP64_MAX_ENTRIES)
+            size = min(size, ZIP64_MAX_SIZE)
+            start_offset = min(start_offset, ZIP64_MAX_SIZE)
+
+        yield self._write(struct.pack(
+            zipfile.structEndArchive, zipfile.stringEndArchive, 0, 0, count,
+            count, size, start_offset, 0
+        ))
+
+    def _write(self, data):
+        self._offset += len(data)
+        return data
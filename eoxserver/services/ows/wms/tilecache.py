@@ -0,0 +1,615 @@
+#-------------------------------------------------------------------------------
+# $Id$
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+
+""" A server side tile cache for WMS GetMap requests. Requests that match a
+    regular tile grid are rendered as metatiles of N x N tiles, which are 
+    sliced and stored on disk.
+"""
+
+import os
+from os import path
+import errno
+import time
+import shutil
+import fcntl
+import sqlite3
+import logging
+from hashlib import sha1
+from itertools import chain
+from urllib import quote, unquote
+from uuid import uuid4
+
+from django.db.models.signals import post_save, post_delete
+
+from eoxserver.core import Component, ExtensionPoint, env
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
+from eoxserver.contrib import gdal, vsi
+from eoxserver.backends.models import DataItem
+from eoxserver.resources.coverages import models, crss, lookup
+from eoxserver.resources.coverages.formats import getFormatRegistry
+from eoxserver.services.ows.wms.interfaces import WMSMapRendererInterface
+
+
+logger = logging.getLogger(__name__)
+
+
+class TileCacheConfigReader(config.Reader):
+    section = "services.ows.wms"
+    tile_cache_directory = config.Option(default=None)
+    tile_size = config.Option(type=int, default=256)
+    metatile_size = config.Option(type=int, default=4)
+    tile_cache_max_size = config.Option(type=int, default=None)
+    tile_cache_retention_time = config.Option(type=int, default=None)
+
+
+def get_tile_cache(config=None):
+    """ Returns the configured ``TileCache`` or None, if no tile cache 
+        directory is configured.
+    """
+    reader = TileCacheConfigReader(config or get_eoxserver_config())
+    if not reader.tile_cache_directory:
+        return None
+
+    return TileCache(
+        reader.tile_cache_directory, reader.tile_size, reader.metatile_size,
+        reader.tile_cache_max_size, reader.tile_cache_retention_time
+    )
+
+
+class Tile(object):
+    """ A tile of a regular grid, identified by its size in CRS units and its
+        column and row, counted from the upper left corner of the CRS bounds.
+    """
+
+    def __init__(self, srid, origin, tile_width, tile_height, column, row):
+        self.srid = srid
+        self.origin = origin
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.column = column
+        self.row = row
+
+    @property
+    def level(self):
+        return "%.12g_%.12g" % (self.tile_width, self.tile_height)
+
+    def metatile(self, metatile_size):
+        """ Returns the column and row of the metatile containing this tile.
+        """
+        return self.column // metatile_size, self.row // metatile_size
+
+    def metatile_bbox(self, metatile_size):
+        """ Returns the bounding box of the metatile containing this tile.
+        """
+        column, row = self.metatile(metatile_size)
+        minx = self.origin[0] + column * metatile_size * self.tile_width
+        maxy = self.origin[1] - row * metatile_size * self.tile_height
+        return (
+            minx, maxy - metatile_size * self.tile_height,
+            minx + metatile_size * self.tile_width, maxy
+        )
+
+
+class TileCache(object):
+    """ Tiles are stored in a directory per requested layers and request 
+        parameters. Each metatile is rendered only once, even when requested
+        concurrently: rendering is guarded by a lock file per metatile.
+
+        The modification time of a tile file is its last access. When the 
+        total size of the tiles exceeds `max_size` bytes, the least recently
+        accessed tiles are pruned until the size is below `PRUNE_RATIO` times
+        `max_size`. Tiles that were not accessed within `retention_time` 
+        seconds are removed whenever the cache is pruned, e.g: periodically 
+        by the ``eoxs_tilecache_prune`` command.
+    """
+
+    COUNTERS = ("hits", "misses", "tiles", "render_time", "size")
+    STATISTICS_FILENAME = ".statistics.sqlite"
+    PRUNE_LOCK_FILENAME = ".prune.lock"
+    PRUNE_RATIO = 0.9
+
+    def __init__(self, cache_directory, tile_size=256, metatile_size=4,
+                 max_size=None, retention_time=None):
+        self.cache_directory = cache_directory
+        self.tile_size = tile_size
+        self.metatile_size = metatile_size
+        self.max_size = max_size
+        self.retention_time = retention_time
+
+
+    def match(self, srid, bbox, width, height):
+        """ Returns the ``Tile`` matching the given request or None, if the 
+            request is not aligned to the tile grid.
+        """
+        if width != self.tile_size or height != self.tile_size:
+            return None
+
+        minx, miny, maxx, maxy = bbox
+        tile_width = maxx - minx
+        tile_height = maxy - miny
+        if tile_width <= 0 or tile_height <= 0:
+            return None
+
+        bounds = crss.crs_bounds(srid)
+        origin = bounds[0], bounds[3]
+
+        column = (minx - origin[0]) / tile_width
+        row = (origin[1] - maxy) / tile_height
+
+        # allow a small relative tolerance for rounding errors of the client
+        if abs(column - round(column)) > 1e-6 or abs(row - round(row)) > 1e-6:
+            return None
+
+        column, row = int(round(column)), int(round(row))
+        if column < 0 or row < 0:
+            return None
+
+        return Tile(srid, origin, tile_width, tile_height, column, row)
+
+
+    def get(self, layers, params, tile, render):
+        """ Returns the data and the content type of the given tile. The tile 
+            is sliced from its metatile which is rendered with the `render` 
+            callable if not yet cached. `render` is invoked with the bounding
+            box, width and height of the metatile and must return a tuple of 
+            the image data and the content type. Returns None if the result of
+            `render` is not an image that can be sliced.
+        """
+        directory = self.tile_directory(layers, params, tile)
+        tile_path = self.tile_path(directory, tile.column, tile.row)
+
+        cached = self._read(tile_path)
+        if cached is not None:
+            self._touch(tile_path)
+            self._count(hits=1)
+            return cached
+
+        column, row = tile.metatile(self.metatile_size)
+        lock_filename = path.join(directory, ".%d_%d.lock" % (column, row))
+
+        with _file_lock(lock_filename):
+            # the metatile might have been rendered by a concurrent request
+            cached = self._read(tile_path)
+            if cached is not None:
+                self._count(hits=1)
+                return cached
+
+            size = self.metatile_size * self.tile_size
+            start = time.time()
+            metatile, content_type = render(
+                tile.metatile_bbox(self.metatile_size), size, size
+            )
+
+            driver_name = _get_driver_name(content_type)
+            if not driver_name:
+                return None
+
+            data = None
+            tiles = 0
+            size = 0
+            for i, j, tile_data in slice_image(
+                    metatile, driver_name, self.tile_size, 
+                    self.metatile_size, self.metatile_size):
+                
+                tile_column = column * self.metatile_size + i
+                tile_row = row * self.metatile_size + j
+                size += self._write(
+                    self.tile_path(directory, tile_column, tile_row), 
+                    tile_data, content_type
+                )
+                if (tile_column, tile_row) == (tile.column, tile.row):
+                    data = tile_data
+                tiles += 1
+
+            render_time = time.time() - start
+            logger.debug(
+                "Rendered metatile %d/%d (%d tiles) in %f seconds." 
+                % (column, row, tiles, render_time)
+            )
+            self._count(
+                misses=1, tiles=tiles, render_time=int(render_time * 1000),
+                size=size
+            )
+
+        if self.max_size and self._counter("size") > self.max_size:
+            self.prune(int(self.max_size * self.PRUNE_RATIO))
+
+        return data, content_type
+
+
+    def tile_directory(self, layers, params, tile):
+        """ Returns the directory for the tiles of the given layers, request 
+            parameters and tile level.
+        """
+        params_hash = sha1(repr(sorted(params))).hexdigest()
+        return path.join(
+            self.cache_directory, quote(",".join(layers), safe=""), 
+            params_hash, str(tile.srid), tile.level
+        )
+
+
+    def tile_path(self, directory, column, row):
+        return path.join(directory, str(column), str(row))
+
+
+    def invalidate(self, identifiers, suffixes=(None,)):
+        """ Removes all tiles of layers referring to one of the given EO object
+            identifiers, either directly or with one of the given layer 
+            suffixes. Only whole layer names are matched.
+        """
+        names = set(
+            identifier + (suffix or "")
+            for identifier in identifiers for suffix in suffixes
+        )
+        if not names or not path.isdir(self.cache_directory):
+            return
+
+        for name in os.listdir(self.cache_directory):
+            if name.startswith("."):
+                continue
+
+            if names.intersection(unquote(name).split(",")):
+                # move the directory out of the way first, so that no 
+                # requests read from it while it is removed
+                trash = path.join(self.cache_directory, ".%s" % uuid4().hex)
+                try:
+                    os.rename(path.join(self.cache_directory, name), trash)
+                except OSError:
+                    continue
+                size = sum(size for _, size, _ in _iter_tiles(trash))
+                shutil.rmtree(trash, True)
+                self._count(size=-size)
+                logger.debug("Invalidated tiles of layer(s) '%s'." % name)
+
+
+    def prune(self, max_size=None, retention_time=None):
+        """ Removes all tiles that were not accessed within the last 
+            `retention_time` seconds and then the least recently accessed 
+            tiles until their total size is below `max_size` bytes. Both 
+            default to the configured values. Returns the number and the total
+            size of the removed tiles. If the cache is already pruned 
+            concurrently, nothing is removed.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        if retention_time is None:
+            retention_time = self.retention_time
+
+        if not path.isdir(self.cache_directory):
+            return 0, 0
+
+        lock_filename = path.join(
+            self.cache_directory, self.PRUNE_LOCK_FILENAME
+        )
+        with open(lock_filename, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError, e:
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    return 0, 0
+                raise
+
+            tiles = sorted(_iter_tiles(self.cache_directory))
+            total = sum(size for _, size, _ in tiles)
+            limit = time.time() - retention_time if retention_time else None
+
+            count = 0
+            removed = 0
+            for mtime, size, filename in tiles:
+                expired = limit is not None and mtime < limit
+                if not expired and (max_size is None or total <= max_size):
+                    break
+                try:
+                    os.remove(filename)
+                except OSError:
+                    # removed concurrently
+                    pass
+                total -= size
+                removed += size
+                count += 1
+
+            self._set_counter("size", total)
+
+        if count:
+            logger.debug("Pruned %d tiles (%d bytes)." % (count, removed))
+        return count, removed
+
+
+    def statistics(self):
+        """ Returns a dictionary with the hit and miss counters, the number of
+            rendered tiles and the accumulated render time in seconds, as well
+            as the hit rate and the estimated render time saved by cache hits.
+        """
+        connection = self._connection()
+        statistics = dict(
+            connection.execute("SELECT name, value FROM counters").fetchall()
+        )
+        connection.close()
+        statistics["render_time"] /= 1000.0
+
+        requests = statistics["hits"] + statistics["misses"]
+        statistics["hit_rate"] = (
+            float(statistics["hits"]) / requests if requests else 0.0
+        )
+        statistics["render_time_saved"] = (
+            statistics["hits"] * statistics["render_time"] / statistics["tiles"]
+            if statistics["tiles"] else 0.0
+        )
+        return statistics
+
+
+    def _read(self, filename):
+        try:
+            with open(filename, "rb") as f:
+                content_type = f.readline().strip()
+                return f.read(), content_type
+        except IOError:
+            return None
+
+
+    def _write(self, filename, data, content_type):
+        """ Writes the tile file and returns its size.
+        """
+        _makedirs(path.dirname(filename))
+        tmp_filename = "%s.%s.tmp" % (filename, uuid4().hex)
+        with open(tmp_filename, "wb") as f:
+            f.write(content_type + "\n")
+            f.write(data)
+        os.rename(tmp_filename, filename)
+        return len(content_type) + 1 + len(data)
+
+
+    def _touch(self, filename):
+        """ Marks the tile as accessed.
+        """
+        try:
+            os.utime(filename, None)
+        except OSError:
+            # removed concurrently
+            pass
+
+
+    def _connection(self):
+        filename = path.join(self.cache_directory, self.STATISTICS_FILENAME)
+        initialized = filename in _initialized_statistics
+        if not initialized:
+            _makedirs(self.cache_directory)
+
+        connection = sqlite3.connect(filename, timeout=60, isolation_level=None)
+        if not initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)"
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO counters (name) VALUES (?)",
+                [(name,) for name in self.COUNTERS]
+            )
+            _initialized_statistics.add(filename)
+        return connection
+
+
+    def _count(self, **counters):
+        try:
+            connection = self._connection()
+            connection.executemany(
+                "UPDATE counters SET value = value + ? WHERE name = ?", 
+                [(value, name) for name, value in counters.items()]
+            )
+            connection.close()
+        except sqlite3.Error, e:
+            # statistics must never break a request
+            logger.warning("Could not update tile cache statistics: %s" % e)
+
+
+    def _counter(self, name):
+        try:
+            connection = self._connection()
+            value, = connection.execute(
+                "SELECT value FROM counters WHERE name = ?", (name,)
+            ).fetchone()
+            connection.close()
+            return value
+        except sqlite3.Error, e:
+            logger.warning("Could not read tile cache statistics: %s" % e)
+            return 0
+
+
+    def _set_counter(self, name, value):
+        try:
+            connection = self._connection()
+            connection.execute(
+                "UPDATE counters SET value = ? WHERE name = ?", (value, name)
+            )
+            connection.close()
+        except sqlite3.Error, e:
+            logger.warning("Could not update tile cache statistics: %s" % e)
+
+
+_initialized_statistics = set()
+
+
+def _iter_tiles(directory):
+    """ Yields the modification time, the size and the path of all tile files
+        within the given directory. Hidden files and directories (statistics,
+        locks, invalidated layers) and temporary files are skipped.
+    """
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for filename in filenames:
+            if filename.startswith(".") or filename.endswith(".tmp"):
+                continue
+            filename = path.join(dirpath, filename)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            yield stat.st_mtime, stat.st_size, filename
+
+
+def slice_image(data, driver_name, tile_size, columns, rows):
+    """ Slices the given image data into `columns` x `rows` tiles of 
+        `tile_size` pixels. Yields tuples of the column, row and the encoded 
+        data of each tile.
+    """
+    src_filename = "/vsimem/%s" % uuid4().hex
+    gdal.FileFromMemBuffer(src_filename, data)
+    try:
+        src_ds = gdal.Open(src_filename)
+        driver = gdal.GetDriverByName(driver_name)
+        mem_driver = gdal.GetDriverByName("MEM")
+        data_type = src_ds.GetRasterBand(1).DataType
+
+        for j in xrange(rows):
+            for i in xrange(columns):
+                tile_ds = mem_driver.Create(
+                    "", tile_size, tile_size, src_ds.RasterCount, data_type
+                )
+                for index in xrange(1, src_ds.RasterCount + 1):
+                    src_band = src_ds.GetRasterBand(index)
+                    tile_band = tile_ds.GetRasterBand(index)
+                    tile_band.WriteRaster(
+                        0, 0, tile_size, tile_size, src_band.ReadRaster(
+                            i * tile_size, j * tile_size, tile_size, tile_size
+                        )
+                    )
+                    tile_band.SetColorInterpretation(
+                        src_band.GetColorInterpretation()
+                    )
+                    color_table = src_band.GetColorTable()
+                    if color_table:
+                        tile_band.SetColorTable(color_table)
+
+                tile_filename = "/vsimem/%s" % uuid4().hex
+                driver.CreateCopy(tile_filename, tile_ds)
+                tile_ds = None
+                try:
+                    with vsi.open(tile_filename) as f:
+                        tile_data = f.read()
+                finally:
+                    # also remove auxiliary files created by some drivers
+                    vsi.remove(tile_filename)
+                    if gdal.VSIStatL(tile_filename + ".aux.xml"):
+                        vsi.remove(tile_filename + ".aux.xml")
+
+                yield i, j, tile_data
+
+        src_ds = None
+    finally:
+        vsi.remove(src_filename)
+
+
+def _get_driver_name(content_type):
+    """ Returns the name of the GDAL driver for the given content type or None
+        if the content type is not an image format supported by GDAL.
+    """
+    content_type = (content_type or "").split(";")[0].strip()
+    if not content_type.startswith("image/"):
+        return None
+
+    frmt = getFormatRegistry().getFormatByMIME(content_type)
+    if not frmt or not frmt.driver.startswith("GDAL/"):
+        return None
+    return frmt.driver.split("/", 1)[1]
+
+
+def _makedirs(directory):
+    try:
+        os.makedirs(directory)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+class _file_lock(object):
+    """ Exclusive lock on the given file for `with` statements.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.f = None
+
+    def __enter__(self):
+        _makedirs(path.dirname(self.filename))
+        self.f = open(self.filename, "a")
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+class LayerSuffixes(Component):
+    """ Helper component to collect the layer suffixes of all WMS map 
+        renderers.
+    """
+    renderers = ExtensionPoint(WMSMapRendererInterface)
+
+    @property
+    def suffixes(self):
+        return set(chain(
+            [None], *[renderer.suffixes or () for renderer in self.renderers]
+        ))
+
+
+def invalidate_tiles(sender, instance, **kwargs):
+    """ Signal handler to invalidate the cached tiles of all layers affected by
+        a change of an EO object, a collection relation or a data item.
+    """
+    if isinstance(instance, models.EOObject):
+        eo_object_ids = [instance.pk]
+    elif isinstance(instance, models.EOObjectToCollectionThrough):
+        eo_object_ids = [instance.collection_id, instance.eo_object_id]
+    elif isinstance(instance, DataItem):
+        eo_object_ids = list(models.Coverage.objects.filter(
+            dataset_ptr=instance.dataset_id
+        ).values_list("pk", flat=True))
+    else:
+        return
+
+    tile_cache = get_tile_cache()
+    if not tile_cache:
+        return
+
+    identifiers = set()
+    if isinstance(instance, models.EOObject):
+        identifiers.add(instance.identifier)
+
+    eo_object_ids = set(eo_object_ids) | lookup.collection_ancestors(
+        eo_object_ids
+    )
+    identifiers.update(models.EOObject.objects.filter(
+        pk__in=eo_object_ids
+    ).values_list("identifier", flat=True))
+
+    tile_cache.invalidate(identifiers, LayerSuffixes(env).suffixes)
+
+post_save.connect(invalidate_tiles, dispatch_uid="invalidate_tiles_save")
+post_delete.connect(invalidate_tiles, dispatch_uid="invalidate_tiles_delete")
@@ -29,7 +29,8 @@
 
 import logging
 
-from eoxserver.resources.coverages import models
+from eoxserver.resources.coverages import models, lookup
+from eoxserver.services.models import WMSRenderOptions
 from eoxserver.core.decoders import InvalidParameterException
 from eoxserver.core.util.timetools import parse_iso8601
 from eoxserver.services.subset import Trim, Slice
@@ -77,67 +78,96 @@ def lookup_layers(layers, subsets, suffixes=None):
     """ Performs a layer lookup for the given layer names. Applies the given 
         subsets and looks up all layers with the given suffixes. Returns a 
         hierarchy of ``LayerSelection`` objects.
+
+        The number of database queries is independent of the number of 
+        layers, collections and coverages involved: the layer objects are 
+        resolved at once, the (sub-)collection hierarchies are expanded with a
+        single recursive query and the coverages are cast and prefetched in 
+        bulk.
     """
     suffix_related_ids = {}
     root_group = LayerSelection(None)
     suffixes = suffixes or (None,)
     logger.debug(str(suffixes))
 
-
+    # resolve all layer names with all possible suffixes in a single query
+    candidates = []
     for layer_name in layers:
         for suffix in suffixes:
             if not suffix:
-                identifier = layer_name
+                candidates.append((layer_name, suffix, layer_name))
             elif layer_name.endswith(suffix):
-                identifier = layer_name[:-len(suffix)]
-            else:
-                continue
-            
-            # TODO: nasty, nasty bug... dunno where
-            eo_objects = models.EOObject.objects.filter(
-                identifier=identifier
-            )
-            if len(eo_objects):
-                eo_object = eo_objects[0]
+                candidates.append(
+                    (layer_name, suffix, layer_name[:-len(suffix)])
+                )
+
+    eo_objects_by_identifier = {}
+    identifiers = set(identifier for _, _, identifier in candidates)
+    for batch in lookup.batched(identifiers):
+        for eo_object in models.EOObject.objects.filter(identifier__in=batch):
+            eo_objects_by_identifier.setdefault(eo_object.identifier, eo_object)
+
+    resolved = []
+    for layer_name in layers:
+        for name, suffix, identifier in candidates:
+            if name == layer_name and identifier in eo_objects_by_identifier:
+                resolved.append((eo_objects_by_identifier[identifier], suffix))
                 break
         else:
             raise LayerNotDefined(layer_name)
 
+    # expand all collection hierarchies at once: get the (subsetted) members 
+    # of each collection, ordered by time
+    root_ids = set(
+        eo_object.pk for eo_object, _ in resolved 
+        if models.iscollection(eo_object)
+    )
+    parents = {}
+    for collection_id, eo_object_id in lookup.collection_members(root_ids):
+        parents.setdefault(eo_object_id, []).append(collection_id)
+
+    members = {}
+    if root_ids:
+        eo_objects = subsets.filter(lookup.filter_members(
+            models.EOObject.objects.all(), root_ids
+        ).order_by("begin_time", "end_time"))
+
+        for eo_object in eo_objects:
+            for collection_id in parents.get(eo_object.pk, ()):
+                members.setdefault(collection_id, []).append(eo_object)
+
+    def recursive_lookup(collection, suffix, used_ids, subsets):
+        # get all EO objects related to this collection, excluding 
+        # those already searched
+        eo_objects = [
+            eo_object for eo_object in members.get(collection.pk, ())
+            if eo_object.pk not in used_ids
+        ]
+
+        selection = LayerSelection()
+
+        # append all retrived EO objects, either as a coverage of 
+        # the real type, or as a subgroup.
+        for eo_object in eo_objects:
+            used_ids.add(eo_object.pk)
+
+            if models.iscoverage(eo_object):
+                selection.append(eo_object, eo_object.identifier)
+            elif models.iscollection(eo_object):
+                selection.extend(recursive_lookup(
+                    eo_object, suffix, used_ids, subsets
+                ))
+            else: 
+                pass
+
+        return selection
+
+    for eo_object, suffix in resolved:
         if models.iscollection(eo_object):
             # recursively iterate over all sub-collections and collect all
             # coverages
-
             used_ids = suffix_related_ids.setdefault(suffix, set())
 
-            def recursive_lookup(collection, suffix, used_ids, subsets):
-                # get all EO objects related to this collection, excluding 
-                # those already searched
-                eo_objects = models.EOObject.objects.filter(
-                    collections__in=[collection.pk]
-                ).exclude(
-                    pk__in=used_ids
-                ).order_by("begin_time", "end_time")
-                # apply subsets
-                eo_objects = subsets.filter(eo_objects)
-
-                selection = LayerSelection()
-
-                # append all retrived EO objects, either as a coverage of 
-                # the real type, or as a subgroup.
-                for eo_object in eo_objects:
-                    used_ids.add(eo_object.pk)
-
-                    if models.iscoverage(eo_object):
-                        selection.append(eo_object.cast(), eo_object.identifier)
-                    elif models.iscollection(eo_object):
-                        selection.extend(recursive_lookup(
-                            eo_object, suffix, used_ids, subsets
-                        ))
-                    else: 
-                        pass
-
-                return selection
-
             root_group.append(
                 LayerSelection(
                     eo_object, suffix,
@@ -149,12 +179,30 @@ def lookup_layers(layers, subsets, suffixes=None):
             # Add a layer selection for the coverage with the suffix
             selection = LayerSelection(None, suffix=suffix)
             if subsets.matches(eo_object):
-                selection.append(eo_object.cast(), eo_object.identifier)
+                selection.append(eo_object, eo_object.identifier)
             else:
                 selection.append(None, eo_object.identifier)
 
             root_group.append(selection)
 
+    # cast all selected coverages to their real type and fetch their related 
+    # objects in bulk
+    coverages = lookup.cast_eo_objects(
+        eo_object for _, eo_object, _, _ in root_group.walk() 
+        if eo_object is not None
+    )
+    cast = dict((coverage.pk, coverage) for coverage in coverages)
+    root_group.replace(cast)
+
+    coverages = lookup.prefetch_coverages(cast.values())
+    render_options = {}
+    for batch in lookup.batched([coverage.pk for coverage in coverages]):
+        for options in WMSRenderOptions.objects.filter(coverage__in=batch):
+            render_options[options.coverage_id] = options
+
+    for coverage in coverages:
+        coverage.cached_render_options = render_options.get(coverage.pk)
+
     return root_group
 
 
@@ -190,6 +238,17 @@ class LayerSelection(list):
             super(LayerSelection, self).append(eo_object_or_selection)
         else:
             super(LayerSelection, self).append((eo_object_or_selection, name))
+
+
+    def replace(self, eo_objects):
+        """ Recursively replaces the EO objects in this selection with the 
+            ones of the given dict (mapping primary keys to EO objects).
+        """
+        for i, item in enumerate(self):
+            if isinstance(item, LayerSelection):
+                item.replace(eo_objects)
+            elif item[0] is not None and item[0].pk in eo_objects:
+                self[i] = (eo_objects[item[0].pk], item[1])
         
 
     def walk(self, depth_first=True):
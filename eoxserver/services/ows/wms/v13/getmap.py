@@ -38,7 +38,8 @@ from eoxserver.services.ows.wms.util import (
     lookup_layers, parse_bbox, parse_time, int_or_str
 )
 from eoxserver.services.ows.wms.interfaces import WMSMapRendererInterface
-from eoxserver.services.result import to_http_response
+from eoxserver.services.result import to_http_response, ResultBuffer
+from eoxserver.services.ows.wms.tilecache import get_tile_cache
 from eoxserver.services.ows.wms.exceptions import InvalidCRS
 
 
@@ -56,7 +57,6 @@ class WMS13GetMapHandler(Component):
         decoder = WMS13GetMapDecoder(request.GET)
 
         bbox = decoder.bbox
-        time = decoder.time
         crs = decoder.crs
         layers = decoder.layers
 
@@ -69,28 +69,79 @@ class WMS13GetMapHandler(Component):
         if srid is None:
             raise InvalidCRS(crs, "crs")
 
-        if crss.hasSwappedAxes(srid):
+        swapped_axes = crss.hasSwappedAxes(srid)
+        if swapped_axes:
             miny, minx, maxy, maxx = bbox
         else:
             minx, miny, maxx, maxy = bbox
 
+        # serve grid aligned requests from the tile cache, if configured
+        tile_cache = get_tile_cache()
+        if tile_cache:
+            try:
+                width, height = int(decoder.width), int(decoder.height)
+            except ValueError:
+                width = height = None
+
+            tile = tile_cache.match(
+                srid, (minx, miny, maxx, maxy), width, height
+            )
+            if tile:
+                def render(bbox, width, height):
+                    minx, miny, maxx, maxy = bbox
+                    if swapped_axes:
+                        bbox = (miny, minx, maxy, maxx)
+
+                    request_values = [
+                        (key, value) for key, value in request.GET.items()
+                        if key.lower() not in ("bbox", "width", "height")
+                    ] + [
+                        ("bbox", ",".join(map(repr, bbox))),
+                        ("width", str(width)), ("height", str(height))
+                    ]
+                    result, content_type = self.render(
+                        decoder, layers, crs, (minx, miny, maxx, maxy),
+                        request_values
+                    )
+                    if not result:
+                        return None, None
+                    return result[0].data, content_type
+
+                params = [
+                    (key.lower(), value) for key, value in request.GET.items()
+                    if key.lower() not in ("bbox", "width", "height", "layers")
+                ]
+                cached = tile_cache.get(layers, params, tile, render)
+                if cached:
+                    data, content_type = cached
+                    return to_http_response(
+                        [ResultBuffer(data, content_type)]
+                    )
+
+        result, _ = self.render(
+            decoder, layers, crs, (minx, miny, maxx, maxy), 
+            request.GET.items()
+        )
+        return to_http_response(result)
+
+
+    def render(self, decoder, layers, crs, bbox, request_values):
+        minx, miny, maxx, maxy = bbox
         subsets = Subsets((
             Trim("x", minx, maxx),
             Trim("y", miny, maxy),
         ), crs=crs)
-        if time: 
-            subsets.append(time)
+        if decoder.time: 
+            subsets.append(decoder.time)
         
         renderer = self.renderer
         root_group = lookup_layers(layers, subsets, renderer.suffixes)
 
-        result, _ = renderer.render(
-            root_group, request.GET.items(), 
+        return renderer.render(
+            root_group, request_values, 
             time=decoder.time, bands=decoder.dim_bands
         )
 
-        return to_http_response(result)
-
 
 class WMS13GetMapDecoder(kvp.Decoder):
     layers = kvp.Parameter(type=typelist(str, ","), num=1)
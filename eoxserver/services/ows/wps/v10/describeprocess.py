@@ -28,6 +28,7 @@
 
 from eoxserver.core import Component, ExtensionPoint, implements
 from eoxserver.core.decoders import kvp, xml, typelist
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface,
     PostServiceHandlerInterface
@@ -57,7 +58,7 @@ class WPS10DescribeProcessHandler(Component):
         if request.method == "GET":
             return WPS10DescribeProcessKVPDecoder(request.GET)
         else:
-            return WPS10DescribeProcessXMLDecoder(request.body)
+            return WPS10DescribeProcessXMLDecoder(get_xml_tree(request))
 
 
     def handle(self, request):
@@ -38,6 +38,7 @@ import logging
 
 from eoxserver.core import Component, implements, ExtensionPoint
 from eoxserver.core.util import multiparttools as mp
+from eoxserver.services.ows.decoders import get_xml_tree
 from eoxserver.services.ows.interfaces import (
     ServiceHandlerInterface, GetServiceHandlerInterface,
     PostServiceHandlerInterface
@@ -85,7 +86,7 @@ class WPS10ExcecuteHandler(Component):
             if request.META["CONTENT_TYPE"].startswith("multipart/"):
                 _, data = next(mp.iterate(request.body))
                 return WPS10ExecuteXMLDecoder(data)
-            return WPS10ExecuteXMLDecoder(request.body)
+            return WPS10ExecuteXMLDecoder(get_xml_tree(request))
 
     def get_process(self, identifier):
         for process in self.processes:
@@ -32,8 +32,14 @@ from cStringIO import StringIO
 from uuid import uuid4
 
 from django.http import HttpResponse
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:
+    StreamingHttpResponse = None
 from django.utils.datastructures import SortedDict
 
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import config
 from eoxserver.core.util import multiparttools as mp
 
 
@@ -124,26 +130,76 @@ class ResultBuffer(ResultItem):
 
     @property
     def data_file(self):
-        return StringIO(self.buf)
+        return BufferFile(self.buf)
 
     def __len__(self):
         return len(self.buf)
 
     def chunked(self, chunksize):
+        """ Yields chunks of the buffer as ``buffer`` objects referencing the
+            original data, so no data is copied. Chunks of memoryviews are 
+            copied one at a time, as the ``buffer`` type of Python 2 cannot 
+            reference them.
+        """
         if chunksize < 0:
             raise ValueError
         
         size = len(self.buf)
+        i = 0
+        if isinstance(self.buf, memoryview):
+            while i < size:
+                yield self.buf[i:i+chunksize].tobytes()
+                i += chunksize
+            return
+
         if chunksize >= size:
             yield self.buf
             return
         
-        i = 0
         while i < size:
-            yield self.buf[i:i+chunksize]
+            yield buffer(self.buf, i, chunksize)
             i += chunksize
 
 
+class BufferFile(object):
+    """ Read-only file-like object for a string, buffer or memoryview. Unlike
+        ``StringIO`` the buffer is not copied; only the data of each `read` 
+        is.
+    """
+
+    def __init__(self, buf):
+        self._buf = buf
+        self._pos = 0
+        self.closed = False
+
+    def read(self, size=-1):
+        end = len(self._buf) if size is None or size < 0 else self._pos + size
+        data = self._buf[self._pos:end]
+        self._pos += len(data)
+        if isinstance(data, memoryview):
+            return data.tobytes()
+        return str(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += len(self._buf)
+        self._pos = min(max(offset, 0), len(self._buf))
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 def get_content_type(result_set):
     """ Returns the content type of a result set. If only one item is included 
         its content type is used.
@@ -172,10 +228,34 @@ def get_headers(result_item):
 
 
 
-def to_http_response(result_set, response_type=HttpResponse, boundary=None):
+class ResponseConfigReader(config.Reader):
+    section = "services.ows"
+    streaming_threshold = config.Option(type=int, default=1048576)
+    response_chunk_size = config.Option(type=int, default=1048576)
+
+
+def to_http_response(result_set, response_type=None, boundary=None, 
+                     streaming=False):
     """ Returns a response for a given result set. The ``response_type`` is the 
-        class to be used. It must be capable to work with iterators.
+        class to be used. It must be capable to work with iterators. By 
+        default, an ``HttpResponse`` is returned. With ``streaming`` enabled, 
+        results larger than the configured streaming threshold are streamed 
+        in chunks, referencing the result data without copying it.
     """
+    reader = ResponseConfigReader(get_eoxserver_config())
+    chunksize = reader.response_chunk_size or 1048576
+
+    if response_type is None:
+        response_type = HttpResponse
+        threshold = reader.streaming_threshold
+        if (streaming and StreamingHttpResponse is not None 
+                and threshold is not None):
+            try:
+                size = sum(len(item) for item in result_set)
+            except (TypeError, NotImplementedError):
+                size = None
+            if size is None or size > threshold:
+                response_type = StreamingHttpResponse
     
     # if more than one item is contained in the result set, the content type is
     # multipart
@@ -204,7 +284,8 @@ def to_http_response(result_set, response_type=HttpResponse, boundary=None):
                         "%s: %s" % (key, value) 
                         for key, value in get_headers(item)
                     ) + mp.CRLFCRLF
-                yield item.data
+                for chunk in item.chunked(chunksize):
+                    yield chunk
             if boundary:
                 yield boundary_str_end
         finally:
@@ -26,12 +26,49 @@
 # THE SOFTWARE.
 #-------------------------------------------------------------------------------
 
+import os
+import shutil
+import tempfile
+import time
 from textwrap import dedent
+from cStringIO import StringIO
+import tarfile
+import zipfile
 
-from django.test import TestCase
+from django.http import HttpResponse
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase
+from django.test.client import RequestFactory
+from django.contrib.gis.geos import GEOSGeometry
+from django.utils.dateparse import parse_datetime
 
+from eoxserver.core import env
+from eoxserver.core.component import ComponentMeta
+from eoxserver.core.config import get_eoxserver_config
+from eoxserver.core.decoders import xml
 from eoxserver.core.util import multiparttools as mp
-from eoxserver.services.result import result_set_from_raw_data
+from eoxserver.backends.models import DataItem
+from eoxserver.resources.coverages.models import RangeType, RectifiedDataset
+from eoxserver.services.result import (
+    result_set_from_raw_data, to_http_response, ResultBuffer, BufferFile,
+    StreamingHttpResponse
+)
+from eoxserver.services.ows.wcs.v20.packages.tar import TarStream
+from eoxserver.services.ows.wcs.v20.packages.zip import ZipStream, ZipPackage
+from eoxserver.services.ows.wms.tilecache import TileCache
+from eoxserver.services.ows.wms.util import LayerSelection
+from eoxserver.services.mapserver.wms.util import (
+    MapServerWMSBaseComponent, ConnectorSession, map_templates
+)
+from eoxserver.services.ows.component import (
+    ServiceComponent, version_key, get_services
+)
+from eoxserver.services.ows.version import parse_version_string
+from eoxserver.services.ows.decoders import get_decoder, get_xml_tree
+from eoxserver.services.views import ows
+from eoxserver.services.ows.wcs.v20.geteocoverageset import (
+    WCS20GetEOCoverageSetHandler
+)
 
 
 class MultipartTest(TestCase):
@@ -103,3 +140,483 @@ class ResultSetTestCase(TestCase):
         self.assertEqual(first.identifier, "message-part")
         self.assertEqual(str(second.data), "PGh0bWw+CiAgPGhlYWQ+CiAgPC9oZWFkPgogIDxib2R5PgogICAgPHA+VGhpcyBpcyB0aGUgYm9keSBvZiB0aGUgbWVzc2FnZS48L3A+CiAgPC9ib2R5Pgo8L2h0bWw+Cg==")
 
+    def test_result_buffer_chunked(self):
+        result_set = result_set_from_raw_data(self.example_multipart)
+        chunks = list(result_set[0].chunked(10))
+        self.assertTrue(all(isinstance(chunk, buffer) for chunk in chunks))
+        self.assertEqual(
+            "".join(map(str, chunks)), "This is the body of the message."
+        )
+
+        chunks = list(ResultBuffer(memoryview("0123456789")).chunked(4))
+        self.assertEqual(chunks, ["0123", "4567", "89"])
+
+    def test_to_http_response(self):
+        config = get_eoxserver_config()
+        if not config.has_section("services.ows"):
+            config.add_section("services.ows")
+        config.set("services.ows", "streaming_threshold", "10")
+        try:
+            response = to_http_response([ResultBuffer("x" * 100, "text/plain")])
+            self.assertTrue(type(response) is HttpResponse)
+            self.assertEqual(response.content, "x" * 100)
+
+            # streaming is opt-in
+            if StreamingHttpResponse is not None:
+                response = to_http_response(
+                    [ResultBuffer("x" * 100, "text/plain")], streaming=True
+                )
+                self.assertTrue(type(response) is StreamingHttpResponse)
+                self.assertEqual(
+                    "".join(response.streaming_content), "x" * 100
+                )
+        finally:
+            config.remove_option("services.ows", "streaming_threshold")
+
+
+class PackageStreamTestCase(TestCase):
+    """ Test class for the streaming package encoders.
+    """
+
+    members = [
+        ("coverage_a/coverage_a.tif", "a" * 10000),
+        ("coverage_b/coverage_b.tif", ""),
+        ("coverage_c/coverage_c.xml", "<xml/>"),
+    ]
+
+    def encode(self, stream):
+        data = []
+        for location, content in self.members:
+            data.extend(
+                stream.add(StringIO(content), len(content), location)
+            )
+        data.extend(stream.close())
+        return StringIO("".join(data))
+
+    def test_tar_stream(self):
+        for compression in (None, "gz", "bz2"):
+            package = tarfile.open(
+                fileobj=self.encode(TarStream(compression, 1024))
+            )
+            self.assertEqual([
+                    (member.name, package.extractfile(member).read())
+                    for member in package.getmembers()
+                ], self.members
+            )
+
+    def test_zip_stream(self):
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            package = zipfile.ZipFile(
+                self.encode(ZipStream(compression, 1024))
+            )
+            self.assertEqual(package.testzip(), None)
+            self.assertEqual([
+                    (name, package.read(name)) 
+                    for name in package.namelist()
+                ], self.members
+            )
+
+    def test_zip_package(self):
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            package = ZipPackage(filename, zipfile.ZIP_DEFLATED, 1024, 9)
+            for location, content in self.members:
+                package.add(BufferFile(content), len(content), location)
+            package.close()
+
+            package = zipfile.ZipFile(filename)
+            self.assertEqual(package.testzip(), None)
+            self.assertEqual([
+                    (name, package.read(name)) 
+                    for name in package.namelist()
+                ], self.members
+            )
+        finally:
+            os.remove(filename)
+
+    def test_buffer_file(self):
+        f = BufferFile(memoryview("0123456789"))
+        self.assertEqual(f.read(4), "0123")
+        self.assertEqual(f.read(), "456789")
+        f.seek(-2, os.SEEK_END)
+        self.assertEqual(f.read(10), "89")
+
+
+class TileCacheTestCase(TestCase):
+    """ Test class for the WMS tile cache.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tile_cache = TileCache(self.directory, 256, 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_match(self):
+        tile = self.tile_cache.match(4326, (0, 0, 45, 45), 256, 256)
+        self.assertEqual((tile.column, tile.row), (4, 1))
+        self.assertEqual(tile.metatile(2), (2, 0))
+        self.assertEqual(tile.metatile_bbox(2), (0, 0, 90, 90))
+
+        self.assertEqual(
+            self.tile_cache.match(4326, (1, 0, 46, 45), 256, 256), None
+        )
+        self.assertEqual(
+            self.tile_cache.match(4326, (0, 0, 45, 45), 512, 256), None
+        )
+
+    def test_get(self):
+        rendered = []
+        def render(bbox, width, height):
+            rendered.append((bbox, width, height))
+            return "no image", "text/xml"
+
+        tile = self.tile_cache.match(4326, (0, 0, 45, 45), 256, 256)
+        self.assertEqual(
+            self.tile_cache.get(["layer"], [], tile, render), None
+        )
+        self.assertEqual(rendered, [((0, 0, 90, 90), 512, 512)])
+
+    def test_invalidate(self):
+        tile = self.tile_cache.match(4326, (0, 0, 45, 45), 256, 256)
+        for layers in (["coverage"], ["coverage_outlines", "other"], ["other"],
+                       ["coverage2"], ["coverage_unknown"]):
+            directory = self.tile_cache.tile_directory(layers, [], tile)
+            self.tile_cache._write(
+                self.tile_cache.tile_path(directory, 4, 1), "data", "image/png"
+            )
+
+        self.tile_cache.invalidate(["coverage"], (None, "_outlines"))
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory) 
+                   if not name.startswith(".")), 
+            ["coverage2", "coverage_unknown", "other"]
+        )
+
+    def write_tiles(self, count, age=0):
+        tile = self.tile_cache.match(4326, (0, 0, 45, 45), 256, 256)
+        directory = self.tile_cache.tile_directory(["layer"], [], tile)
+        paths = []
+        for row in range(count):
+            tile_path = self.tile_cache.tile_path(directory, 0, row)
+            # 10 bytes with the content type line
+            self.tile_cache._write(tile_path, "data", "image")
+            accessed = time.time() - age - count + row
+            os.utime(tile_path, (accessed, accessed))
+            paths.append(tile_path)
+        return paths
+
+    def test_prune(self):
+        paths = self.write_tiles(4)
+        self.assertEqual(self.tile_cache.prune(25), (2, 20))
+        self.assertEqual(
+            [os.path.exists(tile_path) for tile_path in paths], 
+            [False, False, True, True]
+        )
+        self.assertEqual(self.tile_cache.statistics()["size"], 20)
+
+    def test_prune_retention_time(self):
+        old = self.write_tiles(2, age=1000)
+        self.tile_cache.retention_time = 500
+        self.assertEqual(self.tile_cache.prune(), (2, 20))
+        self.assertFalse(any(os.path.exists(tile_path) for tile_path in old))
+
+    def test_prune_accessed(self):
+        paths = self.write_tiles(2)
+        tile = self.tile_cache.match(4326, (0, 0, 45, 45), 256, 256)
+        tile.column, tile.row = 0, 0
+        self.assertEqual(
+            self.tile_cache.get(["layer"], [], tile, None), ("data", "image")
+        )
+
+        # the accessed tile is the most recent one now
+        self.assertEqual(self.tile_cache.prune(10), (1, 10))
+        self.assertEqual(
+            [os.path.exists(tile_path) for tile_path in paths], [True, False]
+        )
+
+
+class DummyMap(object):
+    def clone(self):
+        return DummyMap()
+
+
+class DummyWMSRenderer(MapServerWMSBaseComponent):
+    """ WMS renderer recording the maps it sets up.
+    """
+
+    def create_map(self):
+        return DummyMap()
+
+    def setup_map(self, layer_selection, map_, options):
+        self.setups.append(layer_selection)
+        return ConnectorSession()
+
+
+class MapTemplateTestCase(TestCase):
+    """ Test class for the WMS map templates.
+    """
+
+    def setUp(self):
+        map_templates.clear()
+        self.renderer = DummyWMSRenderer(env)
+        self.renderer.setups = []
+
+    def tearDown(self):
+        map_templates.clear()
+
+    def create_coverage(self, pk, identifier, size=100):
+        range_type = RangeType(name="RGB")
+        range_type._cached_bands = []
+        coverage = RectifiedDataset(
+            pk=pk, identifier=identifier,
+            footprint=GEOSGeometry(
+                "MULTIPOLYGON (((10 10, 20 10, 20 20, 10 20, 10 10)))"
+            ),
+            min_x=10, min_y=10, max_x=20, max_y=20, srid=4326, 
+            size_x=size, size_y=size
+        )
+        coverage.range_type = range_type
+        coverage.cached_data_items = []
+        coverage.cached_render_options = None
+        return coverage
+
+    def select(self, coverage):
+        selection = LayerSelection(None)
+        selection.append(coverage, coverage.identifier)
+        root = LayerSelection(None)
+        root.append(selection)
+        return root
+
+    def get_map(self, coverage):
+        return self.renderer.get_map(self.select(coverage), {})
+
+    def test_hit(self):
+        coverage = self.create_coverage(1, "coverage")
+        self.get_map(coverage)
+        self.get_map(self.create_coverage(1, "coverage"))
+        self.assertEqual(len(self.renderer.setups), 1)
+
+        self.get_map(self.create_coverage(2, "other"))
+        self.assertEqual(len(self.renderer.setups), 2)
+
+    def test_invalidate(self):
+        coverage = self.create_coverage(1, "coverage")
+        self.get_map(coverage)
+
+        post_save.send(
+            sender=RectifiedDataset, instance=coverage, created=False
+        )
+        self.get_map(coverage)
+        self.assertEqual(len(self.renderer.setups), 2)
+
+    def test_stamp(self):
+        # changes that are not signalled to this process, e.g: a coverage 
+        # registered anew with the primary key of a deleted one
+        self.get_map(self.create_coverage(1, "coverage"))
+        self.get_map(self.create_coverage(1, "coverage", size=200))
+
+        coverage = self.create_coverage(1, "coverage")
+        coverage.max_x = 30
+        self.get_map(coverage)
+
+        coverage = self.create_coverage(1, "coverage")
+        coverage.cached_data_items = [
+            DataItem(pk=1, location="data.tif", format="GTiff", 
+                     semantic="bands[1:3]")
+        ]
+        self.get_map(coverage)
+        self.assertEqual(len(self.renderer.setups), 4)
+
+
+class DispatchIndexTestCase(TestCase):
+    """ Checks that the dispatch index selects the same service handlers as
+        the lookup by filtering.
+    """
+
+    class Decoder(object):
+        def __init__(self, service, version, request):
+            self.service = service
+            self.version = parse_version_string(version)
+            self.request = request
+
+    def test_handlers(self):
+        component = ServiceComponent(env)
+        index = component.get_dispatch_index()
+
+        checked = 0
+        for method, handlers in index.handlers_by_method.items():
+            for handler in handlers:
+                request = handler.request.upper()
+                for service in get_services([handler]):
+                    for version in handler.versions:
+                        decoder = self.Decoder(service, version, request)
+                        key = (
+                            method, service, version_key(version), request
+                        )
+                        self.assertIs(
+                            index.handlers[key],
+                            component.lookup_service_handler(handlers, decoder)
+                        )
+                        checked += 1
+
+        self.assertTrue(checked > 0)
+
+    def test_generation(self):
+        component = ServiceComponent(env)
+        index = component.get_dispatch_index()
+        self.assertIs(component.get_dispatch_index(), index)
+
+        # changes of the component registry rebuild the index
+        ComponentMeta._generation += 1
+        rebuilt = component.get_dispatch_index()
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(rebuilt.generation, ComponentMeta._generation)
+        self.assertIs(component.get_dispatch_index(), rebuilt)
+
+
+class XMLRequestTestCase(TestCase):
+    """ Checks that the body of XML POST requests is parsed only once.
+    """
+
+    describe_coverage = dedent("""\
+        <wcs:DescribeCoverage xmlns:wcs="http://www.opengis.net/wcs/2.0"
+            service="WCS" version="2.0.1">
+          <wcs:CoverageId>no-such-coverage</wcs:CoverageId>
+        </wcs:DescribeCoverage>
+    """)
+
+    def setUp(self):
+        self.parsed = []
+        self.parse = xml.parse
+        def parse(data):
+            self.parsed.append(data)
+            return self.parse(data)
+        xml.parse = parse
+
+    def tearDown(self):
+        xml.parse = self.parse
+
+    def post(self, data):
+        return RequestFactory().post(
+            "/ows", data=data, content_type="text/xml"
+        )
+
+    def test_parsed_once(self):
+        request = self.post(self.describe_coverage)
+
+        # the dispatch, the handler and the exception handler all decode
+        # the request
+        response = ows(request)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("NoSuchCoverage", response.content)
+
+        self.assertIs(get_decoder(request)._tree, get_xml_tree(request))
+        self.assertEqual(self.parsed, [self.describe_coverage])
+
+    def test_malformed(self):
+        request = self.post("<wcs:DescribeCoverage")
+
+        self.assertRaises(ValueError, get_xml_tree, request)
+
+        response = ows(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Malformed XML document!", response.content)
+
+
+class DummyCoverageRenderer(object):
+    def render(self, params):
+        identifier = params.coverage.identifier
+        return [ResultBuffer(
+            "data of %s" % identifier, "image/tiff", 
+            filename="%s.tif" % identifier
+        )]
+
+
+class GetEOCoverageSetTestCase(TransactionTestCase):
+    """ Test class for the GetEOCoverageSet request handler, with a dummy 
+        coverage renderer.
+    """
+
+    identifiers = ["coverage-a", "coverage-b", "coverage-c"]
+
+    def setUp(self):
+        range_type = RangeType(name="RGB")
+        range_type.full_clean()
+        range_type.save()
+
+        for identifier in self.identifiers:
+            coverage = RectifiedDataset(
+                identifier=identifier,
+                footprint=GEOSGeometry(
+                    "MULTIPOLYGON (((10 10, 20 10, 20 20, 10 20, 10 10)))"
+                ),
+                begin_time=parse_datetime("2013-06-11T14:55:23Z"), 
+                end_time=parse_datetime("2013-06-11T14:55:23Z"),
+                min_x=10, min_y=10, max_x=20, max_y=20, srid=4326, 
+                size_x=100, size_y=100, range_type=range_type
+            )
+            coverage.full_clean()
+            coverage.save()
+
+        self.handler = WCS20GetEOCoverageSetHandler(env)
+        self.handler.get_renderer = lambda params: DummyCoverageRenderer()
+
+        self.config = get_eoxserver_config()
+        if not self.config.has_section("services.ows.wcs20"):
+            self.config.add_section("services.ows.wcs20")
+        self.options = dict(
+            (option, self.config.get("services.ows.wcs20", option))
+            for option in self.config.options("services.ows.wcs20")
+        )
+
+    def tearDown(self):
+        del self.handler.get_renderer
+        for option in self.config.options("services.ows.wcs20"):
+            self.config.remove_option("services.ows.wcs20", option)
+        for option, value in self.options.items():
+            self.config.set("services.ows.wcs20", option, value)
+
+    def request(self, **options):
+        for option, value in options.items():
+            self.config.set("services.ows.wcs20", option, value)
+
+        request = RequestFactory().get("/ows", {
+            "service": "WCS", "version": "2.0.1", 
+            "request": "GetEOCoverageSet", "eoid": ",".join(self.identifiers),
+            "format": "application/x-tar"
+        })
+        response = self.handler.handle(request)
+        package = tarfile.open(fileobj=StringIO("".join(response)))
+        return dict(
+            (member.name, package.extractfile(member).read())
+            for member in package.getmembers()
+        )
+
+    def expected(self):
+        return dict(
+            ("%s/%s.tif" % (identifier, identifier), "data of %s" % identifier)
+            for identifier in self.identifiers
+        )
+
+    def test_stream(self):
+        self.assertEqual(
+            self.request(stream_packages="true"), self.expected()
+        )
+
+    def test_temporary_file(self):
+        self.assertEqual(
+            self.request(stream_packages="false"), self.expected()
+        )
+
+    def test_parallel(self):
+        for stream_packages in ("true", "false"):
+            self.assertEqual(
+                self.request(
+                    stream_packages=stream_packages, render_concurrency="2",
+                    render_concurrency_limit="2"
+                ), self.expected()
+            )
+
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Usage: benchmark_collection_closure.py [<fan-out>] [<depth>]
+
+    Compares the expansion of a synthetic dataset series hierarchy with the 
+    former per-collection lookup against the single query of 
+    ``lookup.closure_collections`` on the collection closure table. Requires 
+    ``DJANGO_SETTINGS_MODULE`` to point to the settings of a configured 
+    instance. With the defaults, a tree of 11111 dataset series is created 
+    and removed afterwards.
+"""
+
+import sys
+import time
+
+
+def create_hierarchy(fan_out, depth):
+    from eoxserver.resources.coverages import models
+
+    # the through model is bulk created to keep the setup time low, the 
+    # closure is rebuilt afterwards. The metadata of the series is irrelevant
+    # for the benchmark
+    root = models.DatasetSeries.objects.create(identifier="benchmark-0")
+    level = [root]
+    count = 1
+    for _ in range(depth):
+        next_level = []
+        relations = []
+        for parent in level:
+            for _ in range(fan_out):
+                child = models.DatasetSeries.objects.create(
+                    identifier="benchmark-%d" % count
+                )
+                count += 1
+                next_level.append(child)
+                relations.append(models.EOObjectToCollectionThrough(
+                    eo_object_id=child.pk, collection_id=parent.pk
+                ))
+        models.EOObjectToCollectionThrough.objects.bulk_create(relations)
+        level = next_level
+
+    models.CollectionClosure.rebuild()
+    return count
+
+
+def legacy_lookup(identifiers):
+    from eoxserver.resources.coverages import models
+
+    def recursive_lookup(super_collection, collection_set):
+        sub_collections = models.Collection.objects.filter(
+            collections__in=[super_collection.pk]
+        ).exclude(
+            pk__in=map(lambda c: c.pk, collection_set)
+        )
+        collection_set |= set(sub_collections)
+
+        for sub_collection in sub_collections:
+            recursive_lookup(sub_collection, collection_set)
+
+    collection_set = set(
+        models.Collection.objects.filter(identifier__in=identifiers)
+    )
+    for collection in set(collection_set):
+        recursive_lookup(collection, collection_set)
+    return collection_set
+
+
+def closure_lookup(identifiers):
+    from eoxserver.resources.coverages import lookup
+    return set(lookup.closure_collections(identifiers))
+
+
+def measure(name, function):
+    from django.db import connection, reset_queries
+
+    reset_queries()
+    start = time.time()
+    result = function(["benchmark-0"])
+    duration = time.time() - start
+    print "%-8s %6d collections, %6d queries, %8.3f s" % (
+        name, len(result), len(connection.queries), duration
+    )
+
+
+def main(fan_out, depth):
+    from django.conf import settings
+    from eoxserver.resources.coverages import models
+
+    settings.DEBUG = True
+    try:
+        count = create_hierarchy(fan_out, depth)
+        print "hierarchy: %d dataset series (fan-out %d, depth %d)" % (
+            count, fan_out, depth
+        )
+        measure("closure", closure_lookup)
+        measure("legacy", legacy_lookup)
+    finally:
+        models.EOObject.objects.filter(
+            identifier__startswith="benchmark-"
+        ).delete()
+
+
+if __name__ == "__main__":
+    fan_out = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    main(fan_out, depth)
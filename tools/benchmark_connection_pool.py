@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Benchmark of the retrieval of many files from the same HTTP server with and
+# without pooled connections.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Usage: benchmark_connection_pool.py [<count>] [<latency>]
+
+    Serves <count> small files (default 200) from a local keep-alive HTTP 
+    server that delays every new connection by <latency> milliseconds 
+    (default 50) to simulate the handshake with a remote archive. The files 
+    are retrieved once with ``urllib.urlretrieve()``, which opens a new 
+    connection per file, and once with ``HTTPStorage.retrieve()``, which uses 
+    the process wide connection pool. The time taken and the number of 
+    connections opened are reported for both. Requires 
+    ``DJANGO_SETTINGS_MODULE`` to point to the settings of a configured 
+    instance.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+from os.path import join
+from urllib import urlretrieve
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+
+
+class KeepAliveRequestHandler(SimpleHTTPRequestHandler):
+    """ Serves files from the current directory using HTTP/1.1 keep-alive 
+        connections and counts the connections opened.
+    """
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        with self.lock:
+            KeepAliveRequestHandler.connections += 1
+        time.sleep(self.latency)
+        SimpleHTTPRequestHandler.setup(self)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def measure(name, function, count):
+    KeepAliveRequestHandler.connections = 0
+    start = time.time()
+    function()
+    duration = time.time() - start
+    print "%-12s %8.3f s %8.2f ms/file %6d connections" % (
+        name, duration, duration * 1000 / count,
+        KeepAliveRequestHandler.connections
+    )
+
+
+def main(count, latency):
+    from eoxserver.backends.storages.http import HTTPStorage
+
+    KeepAliveRequestHandler.latency = latency / 1000.
+    directory = tempfile.mkdtemp(prefix="benchmark_connection_pool_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(directory)
+        names = ["file%d" % i for i in range(count)]
+        for name in names:
+            with open(name, "wb") as f:
+                f.write(os.urandom(4096))
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveRequestHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        url = "http://127.0.0.1:%d/" % server.server_address[1]
+        storage = HTTPStorage.__new__(HTTPStorage)
+        output = tempfile.mkdtemp(dir=directory)
+
+        def unpooled():
+            for name in names:
+                urlretrieve(url + name, join(output, name))
+
+        def pooled():
+            for name in names:
+                storage.retrieve(url, name, join(output, name))
+
+        measure("urlretrieve", unpooled, count)
+        measure("pooled", pooled, count)
+        server.shutdown()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    main(count, latency)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Microbenchmark of the OWS request dispatch.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Usage: benchmark_dispatch.py [<iterations>]
+
+    Measures the time to find the service handler of typical requests with 
+    the compiled dispatch index of the ``ServiceComponent`` and with the 
+    former filtering of all handlers. The requests are only dispatched, not
+    handled. Requires ``DJANGO_SETTINGS_MODULE`` to point to the settings of 
+    a configured instance.
+"""
+
+import sys
+import time
+
+
+REQUESTS = [
+    "service=WCS&version=2.0.1&request=GetCapabilities",
+    "service=WCS&version=2.0.1&request=DescribeCoverage&coverageid=a",
+    "service=WCS&version=1.1.2&request=GetCoverage&identifier=a",
+    "service=WMS&version=1.3.0&request=GetMap",
+    "service=WCS&request=GetCapabilities",
+]
+
+
+def main(iterations):
+    from django.test.client import RequestFactory
+
+    import eoxserver.core
+    from eoxserver.services.ows.component import (
+        ServiceComponent, env, filter_handlers
+    )
+    from eoxserver.services.ows.decoders import get_decoder
+
+    eoxserver.core.initialize()
+    component = ServiceComponent(env)
+    factory = RequestFactory()
+
+    start = time.time()
+    component.get_dispatch_index()
+    print "compiling the index: %.3f ms" % ((time.time() - start) * 1000)
+
+    def indexed(request):
+        return component.query_service_handler(request)
+
+    def legacy(request):
+        # the extension point activates and lists all handlers on each access
+        decoder = get_decoder(request)
+        handlers = component.get_service_handlers
+        if decoder.version is None:
+            handlers = filter_handlers(
+                handlers, decoder.service, decoder.acceptversions, 
+                decoder.request
+            )
+            return component.version_negotiation(
+                handlers, decoder.acceptversions
+            )
+        return component.lookup_service_handler(handlers, decoder)
+
+    for query in REQUESTS:
+        request = factory.get("/ows?" + query)
+        for name, function in (("indexed", indexed), ("legacy", legacy)):
+            start = time.time()
+            try:
+                for _ in xrange(iterations):
+                    function(request)
+            except Exception, e:
+                print "%-8s %s: %s" % (name, query, e)
+                continue
+            duration = (time.time() - start) / iterations
+            print "%-8s %-64s %8.1f us" % (name, query, duration * 1000000)
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    main(iterations)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Benchmark of the footprint extraction of the pre-processor at full and
+# at decimated resolution.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Usage: benchmark_footprint.py [<size>] [<simplification-factor>]
+
+    Compares the footprint extraction at full resolution with the decimated 
+    extraction of ``PreProcessor``. A synthetic raster of <size> x <size> 
+    pixels (default 10000) with a rotated valid area is created in a 
+    temporary directory. Each extraction runs in a separate process to 
+    report its peak memory. The deviation of the footprints is given as the 
+    area of their symmetric difference divided by the boundary length, in 
+    pixels. Requires ``DJANGO_SETTINGS_MODULE`` to point to the settings of a
+    configured instance.
+"""
+
+import sys
+import time
+import shutil
+import resource
+import tempfile
+import multiprocessing
+from os.path import join
+
+import numpy
+
+
+def create_raster(filename, size):
+    from eoxserver.contrib import gdal, osr
+
+    driver = gdal.GetDriverByName("GTiff")
+    ds = driver.Create(filename, size, size, 3, gdal.GDT_Byte, ["TILED=YES"])
+    sr = osr.SpatialReference(); sr.ImportFromEPSG(4326)
+    ds.SetProjection(sr.ExportToWkt())
+    ds.SetGeoTransform([10.0, 1.0 / size, 0, 50.0, 0, -1.0 / size])
+
+    # a diamond shaped valid area with a ragged border
+    center = size / 2.0
+    radius = size * 0.45
+    rows = 256
+    x = numpy.arange(size)
+    for yoff in range(0, size, rows):
+        y = numpy.arange(yoff, min(yoff + rows, size))[:, numpy.newaxis]
+        ragged = 5 * numpy.sin(x / 7.0) * numpy.cos(y / 11.0)
+        valid = (abs(x - center) + abs(y - center)) < radius + ragged
+        data = (valid * 200).astype(numpy.uint8)
+        for index in range(1, 4):
+            ds.GetRasterBand(index).WriteArray(data, 0, yoff)
+    ds = None
+
+
+def extract(filename, decimation, simplification_factor, queue):
+    from eoxserver.contrib import gdal
+    from eoxserver.processing.preprocessing import (
+        PreProcessor, DEFAULT_WINDOW_BUDGET
+    )
+    from eoxserver.processing.preprocessing.util import DatasetFactory
+
+    preprocessor = PreProcessor(
+        None, simplification_factor=simplification_factor,
+        footprint_decimation=decimation
+    )
+    ds = gdal.Open(filename)
+    factory = DatasetFactory(DEFAULT_WINDOW_BUDGET)
+    start = time.time()
+    try:
+        wkt = preprocessor._generate_footprint_wkt(ds, factory)
+    finally:
+        factory.close()
+    duration = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((wkt, duration, peak))
+
+
+def measure(name, filename, decimation, simplification_factor):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=extract, 
+        args=(filename, decimation, simplification_factor, queue)
+    )
+    process.start()
+    wkt, duration, peak = queue.get()
+    process.join()
+    print "%-10s decimation %2s: %8.3f s, peak RSS %8d KiB" % (
+        name, decimation or "auto", duration, peak
+    )
+    return wkt
+
+
+def main(size, simplification_factor):
+    from eoxserver.contrib import ogr
+
+    directory = tempfile.mkdtemp(prefix="benchmark_footprint_")
+    try:
+        filename = join(directory, "input.tif")
+        create_raster(filename, size)
+        print "raster: %d x %d pixels, 3 bands, simplification factor %s" % (
+            size, size, simplification_factor
+        )
+
+        full_wkt = measure("full", filename, 1, simplification_factor)
+        decimated_wkt = measure(
+            "decimated", filename, None, simplification_factor
+        )
+
+        full = ogr.CreateGeometryFromWkt(full_wkt)
+        decimated = ogr.CreateGeometryFromWkt(decimated_wkt)
+        difference = full.SymDifference(decimated).GetArea()
+        boundary = full.Boundary().Length()
+        print "mean deviation: %.3f pixels (tolerance %s pixels)" % (
+            difference / boundary * size, simplification_factor
+        )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    simplification_factor = (
+        float(sys.argv[2]) if len(sys.argv) > 2 else 2
+    )
+    main(size, simplification_factor)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Benchmark of the extraction of members from a large TAR package with and
+# without the member index.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Usage: benchmark_package_index.py [<size>] [<members>] [<extracted>]
+                                      [<directory>]
+
+    Writes a TAR package of <size> MiB (default 10240, i.e: 10 GiB) with 
+    <members> members of equal size (default 100) to a temporary directory 
+    within <directory> (default: the system's temporary directory). Then 
+    <extracted> members (default 10), spread evenly across the package, are 
+    extracted once by opening the package with ``tarfile`` for each member, 
+    as done before the member index was introduced, and once with 
+    ``TARPackage.extract()``, which builds the index on the first call and 
+    then seeks to the members directly. Note that the page cache of the 
+    operating system may hold large parts of the package; for cold cache 
+    measurements it needs to be dropped before each run. Requires 
+    ``DJANGO_SETTINGS_MODULE`` to point to the settings of a configured 
+    instance.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tarfile
+import tempfile
+from os.path import join
+
+
+BLOCK_SIZE = 1048576
+
+
+def create_package(package_filename, size, members):
+    member_size = size * BLOCK_SIZE // members
+    block = os.urandom(BLOCK_SIZE)
+    names = []
+    with tarfile.open(package_filename, "w") as tar:
+        for i in range(members):
+            name = "member%05d.tif" % i
+            filename = join(os.path.dirname(package_filename), name)
+            with open(filename, "wb") as f:
+                remaining = member_size
+                while remaining > 0:
+                    f.write(block[:min(BLOCK_SIZE, remaining)])
+                    remaining -= BLOCK_SIZE
+            tar.add(filename, name)
+            os.remove(filename)
+            names.append(name)
+    return names
+
+
+def extract_scan(package_filename, name, path):
+    with tarfile.open(package_filename, "r") as tar:
+        member_file = tar.extractfile(name)
+        with open(path, "wb") as out_file:
+            shutil.copyfileobj(member_file, out_file)
+
+
+def measure(name, function, names):
+    start = time.time()
+    first = None
+    for location in names:
+        function(location)
+        if first is None:
+            first = time.time() - start
+    duration = time.time() - start
+    print "%-16s %10.3f s total %10.3f s first %10.3f s per member" % (
+        name, duration, first, duration / len(names)
+    )
+
+
+def main(size, members, extracted, directory):
+    from eoxserver.backends.packages.tar import TARPackage
+
+    directory = tempfile.mkdtemp(
+        prefix="benchmark_package_index_", dir=directory
+    )
+    try:
+        package_filename = join(directory, "package.tar")
+        start = time.time()
+        names = create_package(package_filename, size, members)
+        print "created %d MiB package with %d members in %.1f s" % (
+            size, members, time.time() - start
+        )
+
+        step = max(1, members // extracted)
+        names = names[step - 1::step][:extracted]
+        path = join(directory, "extracted")
+        component = TARPackage.__new__(TARPackage)
+
+        measure(
+            "tarfile scan", 
+            lambda name: extract_scan(package_filename, name, path), names
+        )
+        measure(
+            "member index", 
+            lambda name: component.extract(package_filename, name, path), 
+            names
+        )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10240
+    members = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    extracted = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    directory = sys.argv[4] if len(sys.argv) > 4 else None
+    main(size, members, extracted, directory)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Memory benchmark of the result pipeline: parses a multipart MapServer-like
+# response of the given size and writes it to /dev/null the way a streamed 
+# response would, reporting the peak RSS relative to the payload size.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Usage: benchmark_result_memory.py [<size in MiB>] [chunked|copy]
+
+    "chunked" (default) streams the result items with ``chunked()``, "copy" 
+    converts the whole data of each item to a string, as done previously.
+"""
+
+import sys
+import resource
+import tempfile
+
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main(size, mode):
+    from eoxserver.services.result import result_set_from_raw_data
+
+    # write the raw response to a file first, so that reading it is the only
+    # allocation of the payload
+    boundary = "wcs"
+    with tempfile.TemporaryFile() as f:
+        f.write("Content-Type: multipart/mixed; boundary=%s\r\n\r\n" % boundary)
+        f.write("--%s\r\nContent-Type: text/xml\r\n\r\n<xml/>\r\n" % boundary)
+        f.write("--%s\r\nContent-Type: image/tiff\r\n\r\n" % boundary)
+        chunk = "\0" * (1024 * 1024)
+        for _ in xrange(size // len(chunk)):
+            f.write(chunk)
+        f.write("\r\n--%s--\r\n" % boundary)
+        f.seek(0)
+
+        baseline = peak_rss()
+        raw = f.read()
+
+    with open("/dev/null", "wb") as devnull:
+        for item in result_set_from_raw_data(raw):
+            if mode == "copy":
+                devnull.write(str(item.data))
+            else:
+                for chunk in item.chunked(1024 * 1024):
+                    devnull.write(chunk)
+
+    peak = peak_rss() - baseline
+    print "payload: %d MiB, mode: %s, peak RSS: %d MiB (%.2fx payload)" % (
+        size / 1024 / 1024, mode, peak / 1024 / 1024, float(peak) / size
+    )
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    mode = sys.argv[2] if len(sys.argv) > 2 else "chunked"
+    main(size * 1024 * 1024, mode)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Benchmark of the start-up time of EOxServer worker processes.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Usage: benchmark_startup.py [<repetitions>]
+
+    Measures the time of ``eoxserver.core.initialize()`` and of the first 
+    dispatched request in fresh interpreters, importing all components on 
+    start-up and deferring the imports with a component manifest. Requires 
+    ``DJANGO_SETTINGS_MODULE`` to point to the settings of a configured 
+    instance.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+
+CHILD = """
+import sys, time, json
+start = time.time()
+from django.conf import settings
+settings.COMPONENTS_MANIFEST = sys.argv[1] or None
+import eoxserver.core
+eoxserver.core.initialize()
+initialized = time.time()
+
+from django.test.client import RequestFactory
+from eoxserver.services.ows.component import ServiceComponent, env
+request = RequestFactory().get(
+    "/ows?service=WCS&version=2.0.1&request=GetCapabilities"
+)
+ServiceComponent(env).query_service_handler(request)
+dispatched = time.time()
+
+print json.dumps([initialized - start, dispatched - initialized, 
+                  len(sys.modules)])
+"""
+
+
+def run(manifest):
+    output = subprocess.check_output(
+        [sys.executable, "-c", CHILD, manifest or ""]
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(repetitions):
+    directory = tempfile.mkdtemp(prefix="benchmark_startup_")
+    manifest = os.path.join(directory, "components.json")
+    try:
+        # the first run writes the manifest
+        run(manifest)
+
+        for name, filename in (("eager", None), ("manifest", manifest)):
+            results = [run(filename) for _ in range(repetitions)]
+            initialize = min(result[0] for result in results)
+            dispatch = min(result[1] for result in results)
+            print "%-9s initialize %8.3f s, first dispatch %8.3f s, " \
+                  "%5d modules loaded" % (
+                      name, initialize, dispatch, results[-1][2]
+                  )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    main(repetitions)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+#-------------------------------------------------------------------------------
+#
+# Project: EOxServer <http://eoxserver.org>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+#-------------------------------------------------------------------------------
+# Copyright (C) 2014 EOX IT Services GmbH
+#
+# Benchmark of the bytes transferred to read a window of remote raster data.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+# copies of the Software, and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-------------------------------------------------------------------------------
+
+""" Usage: benchmark_streaming.py [<size>] [<window>]
+
+    Serves a tiled GeoTIFF of <size> x <size> pixels (default 8192) and a TAR
+    package containing it from a local HTTP server supporting range requests.
+    It then reads a window of <window> x <window> pixels (default 256) after
+    retrieving the whole file, as done by ``backends.access.retrieve()``, and
+    in place through the ``/vsicurl/`` and ``/vsitar/`` paths of the HTTP
+    storage and TAR package components. The bytes served by the HTTP server
+    are reported for each case. Requires ``DJANGO_SETTINGS_MODULE`` to point 
+    to the settings of a configured instance.
+"""
+
+import os
+import re
+import sys
+import shutil
+import tarfile
+import tempfile
+import threading
+from os.path import join
+from urllib import urlretrieve
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+
+import numpy
+from osgeo import gdal
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """ Serves files from the current directory, supporting single byte
+        ranges, and counts the bytes sent.
+    """
+
+    bytes_sent = 0
+    lock = threading.Lock()
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), size - 1)
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", "bytes %d-%d/%d" % (start, end, size)
+            )
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        self.range = (start, end)
+        return open(path, "rb")
+
+    def copyfile(self, source, outputfile):
+        start, end = self.range
+        source.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = source.read(min(65536, remaining))
+            if not data:
+                break
+            outputfile.write(data)
+            remaining -= len(data)
+            with self.lock:
+                RangeRequestHandler.bytes_sent += len(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def create_files(directory, size):
+    filename = join(directory, "image.tif")
+    driver = gdal.GetDriverByName("GTiff")
+    ds = driver.Create(
+        filename, size, size, 3, gdal.GDT_Byte, ["TILED=YES"]
+    )
+    rows = 512
+    for yoff in range(0, size, rows):
+        data = numpy.random.randint(
+            0, 255, (min(rows, size - yoff), size)
+        ).astype(numpy.uint8)
+        for index in range(1, 4):
+            ds.GetRasterBand(index).WriteArray(data, 0, yoff)
+    ds = None
+
+    with tarfile.open(join(directory, "package.tar"), "w") as tar:
+        tar.add(filename, "image.tif")
+
+
+def read_window(path, window):
+    ds = gdal.Open(path)
+    ds.ReadAsArray(0, 0, window, window)
+    ds = None
+
+
+def measure(name, function):
+    gdal.VSICurlClearCache()
+    RangeRequestHandler.bytes_sent = 0
+    function()
+    print "%-22s %12d bytes" % (name, RangeRequestHandler.bytes_sent)
+
+
+def main(size, window):
+    from eoxserver.backends.storages.http import HTTPStorage
+    from eoxserver.backends.packages.tar import TARPackage
+
+    gdal.SetConfigOption("GDAL_DISABLE_READDIR_ON_OPEN", "EMPTY_DIR")
+    directory = tempfile.mkdtemp(prefix="benchmark_streaming_")
+    cwd = os.getcwd()
+    try:
+        create_files(directory, size)
+        os.chdir(directory)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        url = "http://127.0.0.1:%d/" % server.server_address[1]
+        storage = HTTPStorage.__new__(HTTPStorage)
+        package = TARPackage.__new__(TARPackage)
+        print "file size: %d bytes, window %d x %d" % (
+            os.path.getsize("image.tif"), window, window
+        )
+
+        def retrieve():
+            urlretrieve(url + "image.tif", join(directory, "retrieved.tif"))
+            read_window(join(directory, "retrieved.tif"), window)
+
+        def stream():
+            read_window(storage.get_vsi_path(url, "image.tif"), window)
+
+        def retrieve_package():
+            urlretrieve(url + "package.tar", join(directory, "retrieved.tar"))
+            tar = tarfile.open(join(directory, "retrieved.tar"))
+            tar.extract("image.tif", join(directory, "extracted"))
+            read_window(join(directory, "extracted", "image.tif"), window)
+
+        def stream_package():
+            read_window(package.get_vsi_path(
+                storage.get_vsi_path(url, "package.tar"), "image.tif"
+            ), window)
+
+        measure("retrieve", retrieve)
+        measure("/vsicurl/", stream)
+        measure("retrieve and extract", retrieve_package)
+        measure("/vsitar//vsicurl/", stream_package)
+        server.shutdown()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 8192
+    window = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    main(size, window)
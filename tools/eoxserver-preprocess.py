@@ -28,11 +28,16 @@
 #-------------------------------------------------------------------------------
 
 import sys
+import os
 import re
+import time
 import argparse
 import traceback
 import textwrap
-from os.path import splitext
+import multiprocessing
+from itertools import imap
+from fnmatch import fnmatch
+from os.path import splitext, join, isdir, isfile, exists, basename, dirname
 import logging
 
 from eoxserver.core.util.timetools import getDateTime
@@ -99,6 +104,14 @@ def main(args):
                             
     # reading arguments from a file (1 line per argument), with overrides
     eoxserver-preprocess.py @args.txt --crs=3035 --no-tiling input.tif
+
+    # batch mode: all TIFFs of a directory, using 4 processes
+    eoxserver-preprocess.py --batch --processes 4 --pattern "*.tif" \\
+                            --no-metadata input_dir/ output_dir/
+
+    # batch mode with a manifest (one 'infile [coverage_id begin_time 
+    # end_time]' per line)
+    eoxserver-preprocess.py --batch manifest.txt output_dir/
     """)
     
     #===========================================================================
@@ -221,11 +234,40 @@ def main(args):
                         type=_parse_nodata_values,
                         help="Either one, or a list of no-data values.")
     
+    parser.add_argument("--window-budget", dest="window_budget", type=int,
+                        help="The memory budget in MiB for processing windows "
+                             "and intermediate datasets. Larger intermediate "
+                             "datasets are stored in temporary files. "
+                             "Default is 64.")
+    
     parser.add_argument("--co", dest="creation_options", type=int, 
                         action="append",
                         help="Additional GDAL dataset creation options. "
                              "See http://www.gdal.org/frmt_gtiff.html")
     
+    parser.add_argument("--threads", dest="num_threads", type=int,
+                        help="The number of threads to use for warping and "
+                             "overview computation.")
+    
+    #===========================================================================
+    # Batch group
+    #===========================================================================
+    
+    parser.add_argument("--batch", dest="batch", action="store_true",
+                        default=False,
+                        help="Batch mode: <infile> is either a directory or a "
+                             "manifest file listing one 'infile [coverage_id "
+                             "begin_time end_time]' per line. "
+                             "<outfiles_basename> is the output directory. "
+                             "Completed outputs are skipped unless --force "
+                             "is given.")
+    parser.add_argument("--pattern", dest="pattern", default="*",
+                        help="In batch mode, only process the files of the "
+                             "input directory matching this pattern.")
+    parser.add_argument("--processes", dest="processes", type=int,
+                        help="In batch mode, the number of files to process "
+                             "in parallel. Default is the number of CPUs.")
+    
     parser.add_argument("--traceback", action="store_true", default=False)
     
     parser.add_argument("--force", "-f", dest="force", action="store_true",
@@ -245,6 +287,9 @@ def main(args):
     
     values = vars(parser.parse_args(args))
     
+    batch = values.pop("batch")
+    pattern = values.pop("pattern")
+    processes = values.pop("processes", None)
     
     # check metadata values
     if "generate_metadata" in values and ("begin_time" in values 
@@ -253,12 +298,16 @@ def main(args):
         parser.error("--no-metadata is mutually exclusive with --begin-time, "
                      "--end-time and --coverage-id.")
 
-    elif "generate_metadata" not in values and not ("begin_time" in values 
-                                                    and "end_time" in values
-                                                    and "coverage_id" in values):
+    # in batch mode, the metadata is checked for each file
+    elif not batch and "generate_metadata" not in values and not (
+            "begin_time" in values and "end_time" in values
+            and "coverage_id" in values):
         parser.error("Enter the full metadata with --begin-time, --end-time "
                      "and --coverage-id.")
     
+    if batch and not values.get("output_basename"):
+        parser.error("The output directory is required in batch mode.")
+    
     # hack to flatten the list
     values["input_filename"] = values["input_filename"][0]
     
@@ -270,6 +319,9 @@ def main(args):
     if "gcps" in values:
         values["geo_reference"] = GCPList(values.pop("gcps"), georef_crs or 4326)
     
+    if "window_budget" in values:
+        values["window_budget"] *= 1024 * 1024
+    
     if "palette_file" in values and not "color_index" in values:
         parser.error("--pct can only be used with --indexed")
     
@@ -299,7 +351,15 @@ def main(args):
     try:
         # create a format selection
         format_selection = get_format_selection("GTiff", **format_values)
-
+        generate_metadata = exec_values.get("generate_metadata", True)
+        
+        if batch:
+            jobs = _get_batch_jobs(input_filename, output_basename, pattern,
+                                   metadata_values)
+            context = (format_selection, values, exec_values.get("geo_reference"),
+                       generate_metadata, force, other_values["traceback"])
+            _run_batch(jobs, processes, context)
+            return
 
         # TODO: make 'tif' dependant on format selection
         # check files exist
@@ -313,25 +373,12 @@ def main(args):
 
         if not force:
             check_file_existence(output_filename)
-
-        exec_values["output_filename"] = output_filename
-
-        # create and run the preprocessor
-        preprocessor = WMSPreProcessor(format_selection, **values)
-        result = preprocessor.process(**exec_values)
-
-        if exec_values.get("generate_metadata", True):
-            if not force:
+            if generate_metadata:
                 check_file_existence(output_md_filename)
 
-            encoder = NativeMetadataFormatEncoder()
-            xml = DOMElementToXML(encoder.encodeMetadata(metadata_values["coverage_id"],
-                                                         metadata_values["begin_time"],
-                                                         metadata_values["end_time"],
-                                                         result.footprint_raw))
-            
-            with open(output_md_filename, "w+") as f:
-                f.write(xml)
+        _preprocess(format_selection, values, input_filename, output_filename,
+                    output_md_filename, exec_values.get("geo_reference"),
+                    generate_metadata, metadata_values)
         
     except Exception, e:
         # error wrapping
@@ -340,6 +387,167 @@ def main(args):
         sys.stderr.write("%s: %s\n" % (type(e).__name__, str(e)))
 
 
+def _preprocess(format_selection, values, input_filename, output_filename,
+                output_md_filename, geo_reference, generate_metadata, 
+                metadata_values):
+    """ Pre-processes a single file and writes its metadata file.
+    """
+    
+    # create and run the preprocessor
+    preprocessor = WMSPreProcessor(format_selection, **values)
+    result = preprocessor.process(input_filename, output_filename, 
+                                  geo_reference, generate_metadata)
+
+    if generate_metadata:
+        encoder = NativeMetadataFormatEncoder()
+        xml = DOMElementToXML(encoder.encodeMetadata(metadata_values["coverage_id"],
+                                                     metadata_values["begin_time"],
+                                                     metadata_values["end_time"],
+                                                     result.footprint_raw))
+        
+        with open(output_md_filename, "w+") as f:
+            f.write(xml)
+
+
+#===============================================================================
+# Batch mode
+#===============================================================================
+
+# the batch settings shared by all files, set in each worker process
+_batch_context = None
+
+
+def _get_batch_jobs(source, output_dir, pattern, metadata_values):
+    """ Returns the jobs as tuples (input_filename, output_basename, 
+        metadata_values) for all files of a directory or listed in a manifest
+        file. The coverage ID defaults to the basename of the file.
+    """
+    
+    entries = []
+    if isdir(source):
+        for name in sorted(os.listdir(source)):
+            filename = join(source, name)
+            if fnmatch(name, pattern) and isfile(filename):
+                entries.append((filename, {}))
+    else:
+        with open(source) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                
+                parts = line.split()
+                if len(parts) not in (1, 4):
+                    raise ValueError("Invalid manifest line '%s'." % line)
+                
+                entries.append((
+                    join(dirname(source), parts[0]),
+                    dict(zip(("coverage_id", "begin_time", "end_time"), 
+                             parts[1:]))
+                ))
+    
+    if not isdir(output_dir):
+        os.makedirs(output_dir)
+    
+    jobs = []
+    for input_filename, entry_metadata_values in entries:
+        name = splitext(basename(input_filename))[0]
+        job_metadata_values = dict(metadata_values, coverage_id=name)
+        job_metadata_values.update(entry_metadata_values)
+        jobs.append((input_filename, join(output_dir, name), job_metadata_values))
+    
+    return jobs
+
+
+def _init_batch_worker(context):
+    global _batch_context
+    _batch_context = context
+
+
+def _run_batch_job(job):
+    """ Pre-processes a single file of a batch. The outputs are written under
+        temporary names and renamed when complete, so that an interrupted 
+        batch can be resumed by skipping the completed outputs. Returns a 
+        tuple (input_filename, status, seconds, message).
+    """
+    
+    (format_selection, values, geo_reference, generate_metadata, force,
+     print_traceback) = _batch_context
+    input_filename, output_basename, metadata_values = job
+    
+    output_filename = output_basename + format_selection.extension
+    output_md_filename = output_basename + ".xml"
+    
+    if not force and exists(output_filename) and (
+            not generate_metadata or exists(output_md_filename)):
+        return input_filename, "skipped", 0.0, ""
+    
+    start = time.time()
+    try:
+        if generate_metadata:
+            if not ("begin_time" in metadata_values 
+                    and "end_time" in metadata_values):
+                raise ValueError("No begin and end time given.")
+            _parse_coverage_id(metadata_values["coverage_id"])
+            _parse_datetime(metadata_values["begin_time"])
+            _parse_datetime(metadata_values["end_time"])
+        
+        part_filename = output_basename + ".part" + format_selection.extension
+        part_md_filename = output_basename + ".part.xml"
+        
+        _preprocess(format_selection, dict(values), input_filename, 
+                    part_filename, part_md_filename, geo_reference,
+                    generate_metadata, metadata_values)
+        
+        # the raster is renamed last, as its existence marks completion
+        if generate_metadata:
+            os.rename(part_md_filename, output_md_filename)
+        os.rename(part_filename, output_filename)
+    
+    except Exception, e:
+        if print_traceback:
+            traceback.print_exc()
+        return (input_filename, "failed", time.time() - start, 
+                "%s: %s" % (type(e).__name__, str(e)))
+    
+    return input_filename, "done", time.time() - start, ""
+
+
+def _run_batch(jobs, processes, context):
+    """ Runs the batch jobs in a pool of worker processes and prints a timing
+        summary.
+    """
+    
+    start = time.time()
+    if processes == 1:
+        _init_batch_worker(context)
+        pool = None
+        results = imap(_run_batch_job, jobs)
+    else:
+        pool = multiprocessing.Pool(processes, _init_batch_worker, (context,))
+        results = pool.imap_unordered(_run_batch_job, jobs)
+    
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+    try:
+        for input_filename, status, seconds, message in results:
+            counts[status] += 1
+            sys.stdout.write("%-60s %-8s %9.2fs %s\n" 
+                             % (input_filename, status, seconds, message))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        if pool:
+            pool.terminate()
+        raise
+    
+    if pool:
+        pool.close()
+        pool.join()
+    
+    sys.stdout.write("Processed %d files in %.2fs: %d done, %d skipped, "
+                     "%d failed.\n" % (len(jobs), time.time() - start, 
+                     counts["done"], counts["skipped"], counts["failed"]))
+
+
 def _parse_datetime(input_str):
     """ Helper callback function to check if a given datetime is correct.
     """